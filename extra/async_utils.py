@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import subprocess
+import sys
+from concurrent.futures import Executor
+from typing import Callable, Dict, Iterable, List, Set, Union
+
+from extra.extra_utils import get_requirements_graph
+from extra.graph_utils import get_graph_leaves
+from extra.importlib_utils import ImportUtils, DistributionInfo, DistributionsDelta
+
+
+def _write_output(line: str):
+    sys.stdout.write(line)
+    sys.stdout.flush()
+
+
+class AsyncImportUtils(object):
+    """
+    Coroutines over ImportUtils for asyncio applications. Scanning and graph
+    building run in the executor (the default one of the loop if not given),
+    pip runs as asyncio subprocess. Calls on one environment are serialized,
+    ImportUtils caches are not thread-safe, calls on different environments
+    run concurrently.
+    """
+
+    def __init__(self, import_utils_lib: ImportUtils = None,
+                 executor: Executor = None, python: str = None):
+        """
+        :param import_utils_lib: environment, the current one by default.
+        :param python: interpreter running pip of the environment, required
+            for uninstall if the environment is not the running one.
+        """
+        if import_utils_lib is None:
+            from pip_autoremove import get_import_utils_lib
+            import_utils_lib = get_import_utils_lib()
+        self.import_utils_lib = import_utils_lib
+        if python is None and import_utils_lib.is_running_environment:
+            python = sys.executable
+        self.python = python  # type: Union[str, None]
+        self._executor = executor
+        self._lock = None  # type: Union[asyncio.Lock, None]
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _run_locked(self, func: Callable, *args, **kwargs):
+        # the caller holds the lock
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _run(self, func: Callable, *args, **kwargs):
+        async with self._get_lock():
+            return await self._run_locked(func, *args, **kwargs)
+
+    async def get_installed_distributions(self) -> List[DistributionInfo]:
+        return await self._run(self.import_utils_lib.get_installed_distributions)
+
+    async def get_distribution(self, name: str) -> DistributionInfo:
+        return await self._run(self.import_utils_lib.get_distribution, name)
+
+    async def get_requirements_graph(self, include_extras: bool = False) \
+            -> Dict[DistributionInfo, Set[DistributionInfo]]:
+        return await self._run(get_requirements_graph, self.import_utils_lib,
+                               include_extras)
+
+    async def get_leaves(self, include_extras: bool = False) -> List[DistributionInfo]:
+        graph = await self.get_requirements_graph(include_extras)
+        return sorted(get_graph_leaves(graph), key=lambda d: d.name_general)
+
+    async def refresh(self) -> DistributionsDelta:
+        return await self._run(self.import_utils_lib.refresh_known_distributions)
+
+    async def list_dead(self, names: Iterable[str],
+                        remove_extras: bool = False) -> Set[DistributionInfo]:
+        """
+        Returns distributions freed by removal of the named ones (whitelisted
+        ones excluded). Raises InstalledDependencyNotFound for unknown name.
+        """
+        from pip_autoremove import get_dead
+
+        def list_dead():
+            lib = self.import_utils_lib
+            start = set(lib.get_distribution(name) for name in names)
+            return get_dead(start, remove_extras, lib=lib)
+
+        return await self._run(list_dead)
+
+    async def uninstall(self, dists: Iterable[DistributionInfo],
+                        on_output: Callable[[str], None] = None) -> int:
+        """
+        Uninstalls distributions by pip, its output is streamed line by line
+        to on_output (stdout by default). Known distributions are refreshed
+        afterwards, other calls wait until then, so they never see
+        a half-uninstalled environment. Raises CalledProcessError if pip
+        fails and ValueError if python of the environment is not known.
+        """
+        from pip_autoremove import get_uninstall_command
+        if self.python is None:
+            raise ValueError("Python of the environment %s must be given to "
+                             "uninstall from it." % self.import_utils_lib.paths)
+        command = get_uninstall_command(dists, self.python)
+        on_output = on_output or _write_output
+        async with self._get_lock():
+            process = await asyncio.create_subprocess_exec(
+                *command, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT)
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                on_output(line.decode('utf-8', 'replace'))
+            return_code = await process.wait()
+            await self._run_locked(self.import_utils_lib.refresh_known_distributions)
+        if return_code != 0:
+            raise subprocess.CalledProcessError(return_code, command)
+        return return_code
+
+    async def autoremove(self, names: Iterable[str], remove_extras: bool = False,
+                         on_output: Callable[[str], None] = None) \
+            -> Set[DistributionInfo]:
+        """
+        Uninstalls the named distributions with all freed ones.
+        Returns uninstalled distributions.
+        """
+        dead = await self.list_dead(names, remove_extras)
+        if dead:
+            await self.uninstall(sorted(dead, key=lambda d: d.name_general), on_output)
+        return dead
@@ -0,0 +1,71 @@
+import json
+from typing import Dict, FrozenSet, List, Set
+
+from extra.extra_utils import get_requirements_graph
+from extra.graph_utils import DeadNodesIndex
+from extra.importlib_utils import ImportUtils, DistributionInfo
+
+
+def load_manifest(path: str) -> Dict[str, List[str]]:
+    """
+    Reads the JSON manifest of root sets: {"set name": ["package", ...], ...}.
+    Raises ValueError if the file has another format.
+    """
+    with open(path, mode='r') as f:
+        try:
+            manifest = json.load(f)
+        except ValueError as e:
+            raise ValueError("Invalid manifest %s: %s" % (path, e))
+    if not isinstance(manifest, dict):
+        raise ValueError("Invalid manifest %s: expected an object of root sets" % path)
+    for name, packages in manifest.items():
+        if not isinstance(packages, list) or \
+                not all(isinstance(package, str) for package in packages):
+            raise ValueError("Invalid manifest %s: root set %s is not a list of "
+                             "package names" % (path, name))
+    return manifest
+
+
+class RootSetResult(object):
+    """
+    Distributions freed by removal of one root set of the manifest.
+    """
+
+    def __init__(self, name: str, start: Set[DistributionInfo], missing: List[str],
+                 dead: Set[DistributionInfo]):
+        self.name = name
+        self.start = start
+        # names of the root set which are not installed
+        self.missing = missing
+        self.dead = dead
+
+    def __str__(self):
+        return ("RootSetResult(name=" + self.name +
+                ", start=" + str(len(self.start)) +
+                ", dead=" + str(len(self.dead)) + ")")
+
+
+def evaluate_manifest(import_utils_lib: ImportUtils, manifest: Dict[str, List[str]],
+                      extra_required: bool = False) -> List[RootSetResult]:
+    """
+    Returns freed distributions of every root set of the manifest in its
+    order. The requirements graph and its index are built once, root sets
+    with the same distributions are evaluated once.
+    """
+    graph = get_requirements_graph(import_utils_lib, extra_required)
+    index = DeadNodesIndex(graph)
+    evaluated = dict()  # type: Dict[FrozenSet[DistributionInfo], Set[DistributionInfo]]
+    res = list()
+    for name, packages in manifest.items():
+        start = set()
+        missing = list()
+        for package in packages:
+            try:
+                start.add(import_utils_lib.get_distribution(package))
+            except import_utils_lib.InstalledDependencyNotFound:
+                missing.append(package)
+        key = frozenset(start)
+        if key not in evaluated:
+            evaluated[key] = index.find_dead(key)
+        res.append(RootSetResult(name, start, missing, evaluated[key]))
+    return res
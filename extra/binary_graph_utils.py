@@ -0,0 +1,365 @@
+"""
+Compact binary encoding of the requirements graph which is read through
+mmap without parsing.
+
+Layout (native byte order, all integers are uint32)::
+
+    header      magic, version, byte order mark and section sizes
+    strings     offsets[string_count + 1], utf-8 blob (interned strings)
+    nodes       (name, version, location)[node_count] string ids
+    extras      CSR of available extras per node (string ids)
+    base        CSR of users per node, graph of get_requirements_graph()
+    extras_req  CSR of users added by extras, parallel array of extra ids
+
+Edges have the same direction as in get_requirements_graph:
+row of the node lists distributions which require it.
+"""
+import mmap
+import os
+import struct
+from array import array
+from typing import Dict, Set, List, Iterable, Sequence, Union, Any
+
+from extra.importlib_utils import ImportUtils, DistributionInfo, FrozenDistributionInfo
+
+MAGIC = b'PARGRAPH'
+FORMAT_VERSION = 1
+_BYTE_ORDER_MARK = 0x01020304
+_HEADER = struct.Struct('=8s11I')
+_NO_STRING = 0  # string id 0 is always the empty string
+
+if array('I').itemsize != 4:  # pragma: no cover
+    raise ImportError("uint32 array type is required for binary graphs.")
+
+
+class _StringTable(object):
+    def __init__(self):
+        self._ids = {'': _NO_STRING}
+        self._strings = ['']
+
+    def intern(self, value: Union[str, None]) -> int:
+        if value is None:
+            return _NO_STRING
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._ids[value] = string_id
+            self._strings.append(value)
+        return string_id
+
+    def encode(self):
+        offsets = array('I', [0])
+        blob = bytearray()
+        for value in self._strings:
+            blob += value.encode('utf-8')
+            offsets.append(len(blob))
+        return offsets, bytes(blob)
+
+
+def _make_csr(rows: Sequence[Sequence[int]]):
+    indptr = array('I', [0])
+    indices = array('I')
+    for row in rows:
+        indices.extend(row)
+        indptr.append(len(indices))
+    return indptr, indices
+
+
+def _padding(size: int) -> bytes:
+    return b'\0' * (-size % 4)
+
+
+def write_binary_graph(import_utils_lib: ImportUtils, path: str,
+                       base_graph: Dict[DistributionInfo, Set[DistributionInfo]] = None,
+                       extras_graph: Dict[DistributionInfo, Set[DistributionInfo]] = None):
+    """
+    Encodes graphs of get_requirements_graph (without and with extras)
+    and writes them to the file atomically.
+    """
+    from extra.extra_utils import get_requirements_graph
+    if base_graph is None:
+        base_graph = get_requirements_graph(import_utils_lib, False)
+    if extras_graph is None:
+        extras_graph = get_requirements_graph(import_utils_lib, True)
+    strings = _StringTable()
+    nodes = sorted(base_graph, key=lambda d: d.name_general)
+    ids = dict((dist.name_general, node_id) for node_id, dist in enumerate(nodes))
+    node_table = array('I')
+    for dist in nodes:
+        node_table.extend((strings.intern(dist.name), strings.intern(dist.version),
+                           strings.intern(dist.lib_path_location)))
+    extras_rows = [[strings.intern(e) for e in dist.available_extras or []]
+                   for dist in nodes]
+    base_rows = list()
+    extras_req_rows = list()
+    extras_labels = array('I')
+    for dist in nodes:
+        base_users = set(u.name_general for u in base_graph[dist])
+        base_rows.append(sorted(ids[name] for name in base_users))
+        extra_users = list()
+        for user in extras_graph.get(dist, ()):
+            if user.name_general in base_users or user.name_general not in ids:
+                continue
+            extra_users.append((ids[user.name_general], user))
+        extra_users.sort(key=lambda x: x[0])
+        extras_req_rows.append([user_id for user_id, _ in extra_users])
+        for _, user in extra_users:
+            extras_labels.append(strings.intern(_find_condition_extra(user, dist)))
+    string_offsets, string_blob = strings.encode()
+    extras_indptr, extras_indices = _make_csr(extras_rows)
+    base_indptr, base_indices = _make_csr(base_rows)
+    extras_req_indptr, extras_req_indices = _make_csr(extras_req_rows)
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, _BYTE_ORDER_MARK, len(nodes),
+        len(string_offsets) - 1, len(string_blob), len(extras_indices),
+        len(base_indices), len(extras_req_indices), 0, 0, 0)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(string_offsets.tobytes())
+        f.write(string_blob + _padding(len(string_blob)))
+        for arr in (node_table, extras_indptr, extras_indices,
+                    base_indptr, base_indices,
+                    extras_req_indptr, extras_req_indices, extras_labels):
+            f.write(arr.tobytes())
+    os.replace(tmp_path, path)
+
+
+def _find_condition_extra(user: DistributionInfo, dist: DistributionInfo) -> str:
+    for req in user.requirements or []:
+        if req.name_general == dist.name_general and req.condition_extra:
+            return req.condition_extra
+    return ''
+
+
+def is_binary_graph(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class BinaryGraph(object):
+    """
+    Read-only view of the file written by write_binary_graph.
+    Arrays are zero-copy views over the memory mapped file,
+    so pages are shared between processes reading the same file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        try:
+            self.__load()
+        except Exception:
+            self.close()
+            raise
+        self._strings_cache = dict()
+        self._ids = None
+        self._requirements_indptr = None
+        self._requirements_indices = None
+
+    def __load(self):
+        if len(self._view) < _HEADER.size:
+            raise ValueError("File \"%s\" is not a binary graph." % self.path)
+        (magic, version, byte_order, node_count, string_count, blob_size,
+         extras_count, base_count, extras_req_count, _, _, _) = \
+            _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise ValueError("File \"%s\" is not a binary graph." % self.path)
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported binary graph version %s in \"%s\"." % (
+                version, self.path))
+        if byte_order != _BYTE_ORDER_MARK:
+            raise ValueError("Binary graph \"%s\" has foreign byte order." % self.path)
+        self.node_count = node_count
+        offset = _HEADER.size
+
+        def take(count):
+            nonlocal offset
+            res = self._view[offset:offset + count * 4].cast('I')
+            offset += count * 4
+            return res
+
+        self._string_offsets = take(string_count + 1)
+        self._string_blob = self._view[offset:offset + blob_size]
+        offset += blob_size + len(_padding(blob_size))
+        self._nodes = take(node_count * 3)
+        self._extras_indptr = take(node_count + 1)
+        self._extras_indices = take(extras_count)
+        self._base_indptr = take(node_count + 1)
+        self._base_indices = take(base_count)
+        self._extras_req_indptr = take(node_count + 1)
+        self._extras_req_indices = take(extras_req_count)
+        self._extras_labels = take(extras_req_count)
+        if offset > len(self._view):
+            raise ValueError("Binary graph \"%s\" is truncated." % self.path)
+
+    def close(self):
+        for name in ('_string_offsets', '_string_blob', '_nodes', '_extras_indptr',
+                     '_extras_indices', '_base_indptr', '_base_indices',
+                     '_extras_req_indptr', '_extras_req_indices', '_extras_labels'):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def string(self, string_id: int) -> str:
+        res = self._strings_cache.get(string_id)
+        if res is None:
+            start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+            res = str(self._string_blob[start:end], 'utf-8')
+            self._strings_cache[string_id] = res
+        return res
+
+    def node_name(self, node_id: int) -> str:
+        return self.string(self._nodes[node_id * 3])
+
+    def node_version(self, node_id: int) -> str:
+        return self.string(self._nodes[node_id * 3 + 1])
+
+    def node_location(self, node_id: int) -> str:
+        return self.string(self._nodes[node_id * 3 + 2])
+
+    def node_extras(self, node_id: int) -> List[str]:
+        start, end = self._extras_indptr[node_id], self._extras_indptr[node_id + 1]
+        return [self.string(i) for i in self._extras_indices[start:end]]
+
+    def node_id(self, name: str) -> int:
+        """
+        Returns id of the node by the package name. Raises KeyError.
+        """
+        from extra.importlib_utils import get_package_general_name
+        if self._ids is None:
+            self._ids = dict((get_package_general_name(self.node_name(i)), i)
+                             for i in range(self.node_count))
+        return self._ids[get_package_general_name(name)]
+
+    def users(self, node_id: int, include_extras: bool = False) -> List[int]:
+        """
+        Returns ids of nodes which require the node.
+        """
+        res = self._base_indices[
+              self._base_indptr[node_id]:self._base_indptr[node_id + 1]].tolist()
+        if include_extras:
+            res += self._extras_req_indices[
+                   self._extras_req_indptr[node_id]:
+                   self._extras_req_indptr[node_id + 1]].tolist()
+        return res
+
+    def extras_users(self, node_id: int) -> List[Any]:
+        """
+        Returns (user id, extra name) pairs of edges added by extras.
+        """
+        start = self._extras_req_indptr[node_id]
+        end = self._extras_req_indptr[node_id + 1]
+        return [(user_id, self.string(label)) for user_id, label in zip(
+            self._extras_req_indices[start:end].tolist(),
+            self._extras_labels[start:end].tolist())]
+
+    def __users_counts(self, include_extras: bool) -> List[int]:
+        indptr = self._base_indptr.tolist()
+        counts = [indptr[i + 1] - indptr[i] for i in range(self.node_count)]
+        if include_extras:
+            indptr = self._extras_req_indptr.tolist()
+            counts = [c + indptr[i + 1] - indptr[i] for i, c in enumerate(counts)]
+        return counts
+
+    def leaves(self, include_extras: bool = False) -> Set[int]:
+        """
+        Returns ids of nodes which are not required by any other node,
+        same as get_graph_leaves.
+        """
+        counts = self.__users_counts(include_extras)
+        return set(i for i, count in enumerate(counts) if count < 1)
+
+    def __requirements(self, include_extras: bool):
+        # requirements are the transposed users rows, built once per reader
+        if self._requirements_indptr is None:
+            self._requirements_indptr = dict()
+            self._requirements_indices = dict()
+        if include_extras not in self._requirements_indptr:
+            rows = [[] for _ in range(self.node_count)]
+            for node_id in range(self.node_count):
+                for user_id in self.users(node_id, include_extras):
+                    rows[user_id].append(node_id)
+            indptr, indices = _make_csr(rows)
+            self._requirements_indptr[include_extras] = indptr
+            self._requirements_indices[include_extras] = indices
+        return (self._requirements_indptr[include_extras],
+                self._requirements_indices[include_extras])
+
+    def find_all_dead(self, start: Iterable[int], include_extras: bool = False) \
+            -> Set[int]:
+        """
+        Same as pip_autoremove.find_all_dead over node ids: the node is dead
+        when it is required by someone and all its users are dead.
+        """
+        remaining = self.__users_counts(include_extras)
+        indptr, indices = self.__requirements(include_extras)
+        dead = set(start)
+        stack = list(dead)
+        while stack:
+            node_id = stack.pop()
+            for req_id in indices[indptr[node_id]:indptr[node_id + 1]]:
+                remaining[req_id] -= 1
+                if remaining[req_id] == 0 and req_id not in dead:
+                    dead.add(req_id)
+                    stack.append(req_id)
+        return dead
+
+    def to_graph(self, include_extras: bool = False) \
+            -> Dict[DistributionInfo, Set[DistributionInfo]]:
+        """
+        Decodes the graph to the form returned by get_requirements_graph.
+        """
+        dists = [FrozenDistributionInfo(
+            self.node_name(i), self.node_version(i) or None,
+            self.node_location(i) or None, self.node_extras(i))
+            for i in range(self.node_count)]
+        return dict((dists[i], set(dists[u] for u in self.users(i, include_extras)))
+                    for i in range(self.node_count))
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """
+        Decodes the graph to the snapshot format of snapshot_utils.
+        Requirements are restored from edges, so cycle edges cut
+        by get_requirements_graph are not present. Extras edges with
+        an empty label keep condition_extra '' and are skipped
+        by ImportUtilsSnapshot as malformed.
+        """
+        from extra.snapshot_utils import SNAPSHOT_FORMAT, SNAPSHOT_FORMAT_VERSION
+        requirements = [[] for _ in range(self.node_count)]
+        for node_id in range(self.node_count):
+            name = self.node_name(node_id)
+            for user_id in self.users(node_id):
+                requirements[user_id].append(
+                    {'name': name, 'enabled_extras': [], 'condition_extra': None})
+            for user_id, extra in self.extras_users(node_id):
+                requirements[user_id].append(
+                    {'name': name, 'enabled_extras': [],
+                     'condition_extra': extra})
+        return {
+            'format': SNAPSHOT_FORMAT,
+            'version': SNAPSHOT_FORMAT_VERSION,
+            'paths': [],
+            'distributions': [{
+                'name': self.node_name(i),
+                'version': self.node_version(i) or None,
+                'location': self.node_location(i) or None,
+                'extras': self.node_extras(i),
+                'requires': None,
+                'requirements': requirements[i],
+            } for i in range(self.node_count)],
+        }
@@ -0,0 +1,220 @@
+import time
+from typing import Callable, Collection, Dict, List, Set, Tuple, Union
+
+from extra.extra_utils import get_extras_index, remove_cycles, _add_extras_edges
+from extra.graph_utils import get_graph_leaves, find_dead_nodes
+from extra.importlib_utils import ImportUtils, DistributionInfo
+
+PHASE_SCAN = 'scan'
+PHASE_EDGES = 'edges'
+PHASE_CYCLES = 'cycles'
+PHASE_EXTRAS = 'extras'
+# phases of get_requirements_graph in the order they run
+PHASES = (PHASE_SCAN, PHASE_EDGES, PHASE_CYCLES, PHASE_EXTRAS)
+
+
+class TimeBudget(object):
+    """
+    Deadline of the analysis, None seconds means unlimited.
+    """
+
+    def __init__(self, seconds: Union[float, None],
+                 clock: Callable[[], float] = time.monotonic):
+        self.seconds = seconds
+        self._clock = clock
+        self._start = clock()
+        # start of the analysis for phase durations (independent of the clock)
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return self._clock() - self._start
+
+    def expired(self) -> bool:
+        return self.seconds is not None and self.elapsed >= self.seconds
+
+
+class BudgetedAnalysis(object):
+    """
+    Result of analyze_with_budget. If a phase was cut, the answer is partial
+    but conservative: every listed leaf is a leaf of the full analysis and
+    every listed dead distribution is freed by the full analysis too.
+    """
+
+    def __init__(self):
+        self.completed_phases = list()  # type: List[str]
+        # phase interrupted by the budget, None if the analysis is complete
+        self.cut_phase = None  # type: Union[str, None]
+        self.elapsed = 0.0
+        # seconds spent in completed phases and in the cut one,
+        # the scan includes everything since the budget was created
+        self.phase_durations = dict()  # type: Dict[str, float]
+        self.leaves = set()  # type: Set[DistributionInfo]
+        self.dead = set()  # type: Set[DistributionInfo]
+        # the requirements graph, None if the analysis is not complete
+        self.graph = None  # type: Union[Dict[DistributionInfo, Set[DistributionInfo]], None]
+
+    @property
+    def complete(self) -> bool:
+        return self.cut_phase is None
+
+    def __str__(self):
+        return ("BudgetedAnalysis(cut_phase=" + str(self.cut_phase) +
+                ", leaves=" + str(len(self.leaves)) +
+                ", dead=" + str(len(self.dead)) + ")")
+
+
+def _get_mentioned_names(dists: Collection[DistributionInfo]) -> Union[Set[str], None]:
+    """
+    Returns names which the distributions may require (by any extra or
+    marker) or None if any of them cannot tell it.
+    """
+    res = set()
+    for dist in dists:
+        names = dist.raw_requirement_names()
+        if names is None:
+            return None
+        res.update(names)
+    return res
+
+
+def _find_dead_conservative(graph: Dict[DistributionInfo, Set[DistributionInfo]],
+                            requirements: Dict[DistributionInfo, Set[DistributionInfo]],
+                            start: Set[DistributionInfo],
+                            pending: List[DistributionInfo]) -> Set[DistributionInfo]:
+    """
+    Returns distributions freed by removal of the start ones when requirements
+    of the pending distributions are unknown: they are assumed to require
+    every package their raw metadata mentions.
+    """
+    mentioned_by = dict()  # type: Dict[str, List[DistributionInfo]]
+    unknown = list()
+    for dist in pending:
+        names = dist.raw_requirement_names()
+        if names is None:
+            unknown.append(dist)
+            continue
+        for name in names:
+            mentioned_by.setdefault(name, list()).append(dist)
+    if any(dist not in start for dist in unknown):
+        return set(start)
+    dead = set(start)
+    stack = list(start)
+    while stack:
+        dist = stack.pop()
+        # unprocessed ones have unknown requirements, so they free nothing
+        for req in requirements.get(dist, ()):
+            if req in dead or not graph[req] <= dead:
+                continue
+            if any(user not in dead for user in mentioned_by.get(req.name_general, ())):
+                continue
+            dead.add(req)
+            stack.append(req)
+    return dead
+
+
+def analyze_with_budget(import_utils_lib: ImportUtils,
+                        start: Collection[DistributionInfo] = (),
+                        extra_required: bool = False,
+                        budget: TimeBudget = None,
+                        cut_edges: List[Tuple[DistributionInfo, DistributionInfo]] = None) \
+        -> BudgetedAnalysis:
+    """
+    Builds the requirements graph like get_requirements_graph in phases
+    (see PHASES) and finds leaves and distributions freed by removal of
+    the start ones. The budget is checked between steps of every phase, the
+    pipeline stops at the first expired check. The scan is one step.
+    """
+    budget = budget or TimeBudget(None)
+    res = BudgetedAnalysis()
+    start = set(start)
+    phase_started = [budget.started]
+
+    def end_phase(phase: str):
+        now = time.perf_counter()
+        res.phase_durations[phase] = now - phase_started[0]
+        phase_started[0] = now
+        res.completed_phases.append(phase)
+
+    def finish(cut_phase: Union[str, None]) -> BudgetedAnalysis:
+        if cut_phase is not None:
+            res.phase_durations[cut_phase] = time.perf_counter() - phase_started[0]
+        res.cut_phase = cut_phase
+        res.elapsed = budget.elapsed
+        return res
+
+    # scan
+    installed_distributions = import_utils_lib.get_installed_distributions()
+    if budget.expired():
+        res.dead = start
+        return finish(PHASE_SCAN)
+    end_phase(PHASE_SCAN)
+
+    # edges, requirements of the start closure first, so partial dead is useful
+    index = get_extras_index(import_utils_lib)
+    requirements = dict()  # type: Dict[DistributionInfo, Set[DistributionInfo]]
+    closure = sorted(start, key=lambda d: d.name_general)
+    in_closure = set(closure)
+    cut = False
+    for dist in closure + list(installed_distributions):
+        if dist in requirements:
+            continue
+        if budget.expired():
+            cut = True
+            break
+        requirements[dist] = index.base_required(dist)
+        if dist in in_closure:
+            for req in requirements[dist]:
+                if req not in in_closure:
+                    in_closure.add(req)
+                    closure.append(req)
+    # the same insertion order as get_requirements_graph
+    graph = dict((dist, set()) for dist in installed_distributions)
+    for dist in installed_distributions:
+        for req in requirements.get(dist, ()):
+            graph[req].add(dist)
+    if cut:
+        pending = [dist for dist in installed_distributions if dist not in requirements]
+        # with extras any distribution may still add users to leaves
+        mentioned = _get_mentioned_names(
+            installed_distributions if extra_required else pending)
+        if mentioned is not None:
+            res.leaves = set(dist for dist in get_graph_leaves(graph)
+                             if dist.name_general not in mentioned)
+        res.dead = _find_dead_conservative(graph, requirements, start, pending)
+        return finish(PHASE_EDGES)
+    end_phase(PHASE_EDGES)
+
+    def partial_result(pending: Collection[DistributionInfo]):
+        # extras edges of the pending ones may still give users to leaves
+        mentioned = _get_mentioned_names(pending) if extra_required else set()
+        if mentioned is not None:
+            res.leaves = set(dist for dist in get_graph_leaves(graph)
+                             if dist.name_general not in mentioned)
+        # cutting more cycles or adding extras edges only frees more
+        res.dead = find_dead_nodes(graph, start)
+
+    # cycles
+    while True:
+        if budget.expired():
+            partial_result(installed_distributions)
+            return finish(PHASE_CYCLES)
+        if not remove_cycles(graph, cut_edges):
+            break
+    end_phase(PHASE_CYCLES)
+
+    # extras
+    if extra_required:
+        dist_map = dict((dist.name_general, dist) for dist in installed_distributions)
+        dists = list(graph.keys())
+        processed = _add_extras_edges(import_utils_lib, graph, dist_map, dists,
+                                      budget.expired)
+        if processed < len(dists):
+            partial_result(dists[processed:])
+            return finish(PHASE_EXTRAS)
+    end_phase(PHASE_EXTRAS)
+
+    res.graph = graph
+    res.leaves = get_graph_leaves(graph)
+    res.dead = find_dead_nodes(graph, start)
+    return finish(None)
@@ -0,0 +1,169 @@
+from typing import Dict, List, Set, Tuple, Union, Any, Collection
+
+from extra.binary_graph_utils import BinaryGraph, is_binary_graph
+from extra.graph_utils import DeadNodesIndex, get_graph_leaves
+from extra.importlib_utils import get_package_general_name
+
+
+class InternedGraph(object):
+    """
+    Requirements graph of a captured environment over ids of general
+    package names. Graphs interned with the same ids table are compared
+    with set operations on integers.
+    """
+
+    def __init__(self, ids: Dict[str, int]):
+        self.ids = ids
+        # node id -> (name, version)
+        self.nodes = dict()  # type: Dict[int, Tuple[str, Union[str, None]]]
+        # node id -> ids of its users, like get_requirements_graph
+        self.users = dict()  # type: Dict[int, Set[int]]
+
+    def intern(self, name: str) -> int:
+        name_general = get_package_general_name(name)
+        node_id = self.ids.get(name_general)
+        if node_id is None:
+            node_id = len(self.ids)
+            self.ids[name_general] = node_id
+        return node_id
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def load_interned_graph(path: str, include_extras: bool = False,
+                        ids: Dict[str, int] = None) -> InternedGraph:
+    """
+    Loads the graph of the snapshot file or the binary graph file.
+    Binary graphs are read without building distributions.
+    """
+    res = InternedGraph(ids if ids is not None else dict())
+    if is_binary_graph(path):
+        with BinaryGraph(path) as graph:
+            node_ids = [res.intern(graph.node_name(i)) for i in range(graph.node_count)]
+            for i, node_id in enumerate(node_ids):
+                res.nodes[node_id] = (graph.node_name(i), graph.node_version(i) or None)
+                res.users[node_id] = set(
+                    node_ids[u] for u in graph.users(i, include_extras))
+        return res
+    from extra.extra_utils import get_requirements_graph
+    from extra.snapshot_utils import ImportUtilsSnapshot
+    graph = get_requirements_graph(ImportUtilsSnapshot(path), include_extras)
+    node_ids = dict((dist, res.intern(dist.name_general)) for dist in graph)
+    for dist, users in graph.items():
+        res.nodes[node_ids[dist]] = (dist.name, dist.version)
+        res.users[node_ids[dist]] = set(node_ids[user] for user in users)
+    return res
+
+
+def _compare_versions(old: str, new: str) -> Union[int, None]:
+    """
+    Returns the sign of new - old or None if versions cannot be compared.
+    """
+    from extra.marker_utils import _import_packaging
+    version = _import_packaging().version
+    try:
+        old_version, new_version = version.Version(old), version.Version(new)
+    except (version.InvalidVersion, TypeError):
+        return None
+    return (new_version > old_version) - (new_version < old_version)
+
+
+class SnapshotDiff(object):
+    """
+    Changes between two captured environments found by diff_graphs.
+    Lists contain package names sorted by general name.
+    """
+
+    def __init__(self):
+        self.added = list()  # type: List[str]
+        self.removed = list()  # type: List[str]
+        # (name, old version, new version)
+        self.upgraded = list()  # type: List[Tuple[str, str, str]]
+        self.downgraded = list()  # type: List[Tuple[str, str, str]]
+        # versions which cannot be compared (not PEP 440)
+        self.changed = list()  # type: List[Tuple[str, str, str]]
+        # leaves which were not leaves before (added ones too)
+        self.new_leaves = list()  # type: List[str]
+        # new leaves which were required before
+        self.orphaned = list()  # type: List[str]
+        # packages freed by removal of orphaned ones
+        self.dead = list()  # type: List[str]
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.upgraded or self.downgraded or
+                    self.changed or self.new_leaves or self.dead)
+
+    def to_dict(self) -> Dict[str, Any]:
+        def versions(changes):
+            return [{'name': name, 'old': old, 'new': new} for name, old, new in changes]
+
+        return {
+            'added': self.added,
+            'removed': self.removed,
+            'upgraded': versions(self.upgraded),
+            'downgraded': versions(self.downgraded),
+            'changed': versions(self.changed),
+            'new_leaves': self.new_leaves,
+            'orphaned': self.orphaned,
+            'dead': self.dead,
+        }
+
+    def __str__(self):
+        return ("SnapshotDiff(added=" + str(self.added) +
+                ", removed=" + str(self.removed) +
+                ", upgraded=" + str([c[0] for c in self.upgraded]) +
+                ", downgraded=" + str([c[0] for c in self.downgraded]) +
+                ", new_leaves=" + str(self.new_leaves) +
+                ", dead=" + str(self.dead) + ")")
+
+
+def diff_graphs(old: InternedGraph, new: InternedGraph,
+                exclude: Collection[str] = ()) -> SnapshotDiff:
+    """
+    Compares graphs interned with the same ids table in time linear
+    in their sizes.
+    :param exclude: general names never reported as dead (like whitelist).
+    """
+    if old.ids is not new.ids:
+        raise ValueError("Graphs are interned with different ids tables.")
+    names = dict((node_id, name) for name, node_id in new.ids.items())
+    res = SnapshotDiff()
+
+    def sort_names(node_ids):
+        return [new.nodes.get(i, old.nodes.get(i))[0]
+                for i in sorted(node_ids, key=names.get)]
+
+    old_ids, new_ids = set(old.nodes), set(new.nodes)
+    res.added = sort_names(new_ids - old_ids)
+    res.removed = sort_names(old_ids - new_ids)
+    for node_id in sorted(old_ids & new_ids, key=names.get):
+        name, new_version = new.nodes[node_id]
+        old_version = old.nodes[node_id][1]
+        if old_version == new_version:
+            continue
+        sign = _compare_versions(old_version, new_version)
+        changes = res.changed if not sign else res.upgraded if sign > 0 else res.downgraded
+        changes.append((name, old_version, new_version))
+    old_leaves = get_graph_leaves(old.users)
+    new_leaves = get_graph_leaves(new.users)
+    became_leaves = new_leaves - old_leaves
+    orphaned = became_leaves & old_ids
+    exclude = set(new.ids[name] for name in exclude if name in new.ids)
+    dead = DeadNodesIndex(new.users).find_dead(orphaned) - orphaned - exclude
+    res.new_leaves = sort_names(became_leaves)
+    res.orphaned = sort_names(orphaned)
+    res.dead = sort_names(dead)
+    return res
+
+
+def diff_snapshots(old_path: str, new_path: str, include_extras: bool = False,
+                   exclude: Collection[str] = ()) -> SnapshotDiff:
+    """
+    Returns changes between environments captured by --export-snapshot
+    or --export-graph, the environments are not read.
+    """
+    ids = dict()  # type: Dict[str, int]
+    old = load_interned_graph(old_path, include_extras, ids)
+    new = load_interned_graph(new_path, include_extras, ids)
+    return diff_graphs(old, new, exclude)
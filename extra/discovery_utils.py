@@ -0,0 +1,177 @@
+import os
+import re
+from typing import List, Sequence, Set, Dict, Union
+
+DIST_INFO_SUFFIX = '.dist-info'
+EGG_INFO_SUFFIX = '.egg-info'
+
+_normalize_regex = re.compile(r'[-_.]+')
+
+
+def normalize_name(name: str) -> str:
+    """
+    Returns PEP 503 normalized name, dist-info directories may escape
+    the project name differently from its metadata.
+    """
+    return _normalize_regex.sub('-', name).lower()
+
+
+def is_vendor_path(path: str) -> bool:
+    return 'vendor' in path
+
+
+class DistributionPath(object):
+    """
+    Metadata location of the distribution found without reading any file.
+    """
+    # the metadata directory or file of the distribution
+    KIND_METADATA = 'metadata'
+    # the path entry which is not a directory (zip, egg)
+    # and must be searched by the backend itself
+    KIND_ARCHIVE = 'archive'
+
+    def __init__(self, path: str, location: str, kind: str = KIND_METADATA,
+                 name: str = None):
+        self.path = path
+        self.location = location
+        self.kind = kind
+        self.name = name
+
+    def __str__(self):
+        return ("DistributionPath(path=" + str(self.path) +
+                ", kind=" + str(self.kind) +
+                (", name=" + str(self.name) if self.name else "") + ")")
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def parse_metadata_name(file_name: str) -> str:
+    """
+    Returns normalized project name from "name-version.dist-info"
+    or "name-version-pyX.Y.egg-info" file name.
+    """
+    for suffix in (DIST_INFO_SUFFIX, EGG_INFO_SUFFIX):
+        if file_name.lower().endswith(suffix):
+            file_name = file_name[:-len(suffix)]
+            break
+    return normalize_name(file_name.split('-', 1)[0])
+
+
+def scan_path_entry(entry: str) -> List[DistributionPath]:
+    """
+    Lists distributions of one sys.path entry with os.scandir.
+    """
+    location = entry or '.'
+    if os.path.isdir(location) and location.lower().endswith('.egg'):
+        egg_info = os.path.join(location, 'EGG-INFO')
+        if os.path.isdir(egg_info):
+            name = parse_metadata_name(os.path.basename(location)[:-len('.egg')])
+            return [DistributionPath(egg_info, entry, name=name)]
+    try:
+        scanner = os.scandir(location)
+    except NotADirectoryError:
+        return [DistributionPath(entry, entry, DistributionPath.KIND_ARCHIVE)]
+    except OSError:
+        return []
+    res = list()
+    with scanner:
+        for dir_entry in scanner:
+            file_name = dir_entry.name
+            lower = file_name.lower()
+            if not (lower.endswith(DIST_INFO_SUFFIX) or lower.endswith(EGG_INFO_SUFFIX)):
+                continue
+            res.append(DistributionPath(
+                os.path.join(location, file_name), entry,
+                name=parse_metadata_name(file_name)))
+    # os.scandir order is arbitrary, dist-info wins over egg-info of the same name
+    res.sort(key=lambda x: (x.name, not x.path.lower().endswith(DIST_INFO_SUFFIX),
+                            x.path))
+    return res
+
+
+# METADATA headers end with the first blank line, long description follows
+_HEADER_END = (b'\n\n', b'\r\n\r\n')
+_HEADER_CHUNK_SIZE = 8192
+
+
+def parse_metadata_header(text: str) -> Dict[str, List[str]]:
+    """
+    Returns fields of the METADATA header by lowercase names.
+    """
+    res = dict()  # type: Dict[str, List[str]]
+    last = None
+    for line in text.splitlines():
+        if not line:
+            break
+        if line[0] in ' \t':
+            # folded value of the previous field
+            if last is not None and line.strip():
+                res[last][-1] += ' ' + line.strip()
+            continue
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        last = key.strip().lower()
+        res.setdefault(last, []).append(value.strip())
+    return res
+
+
+def read_metadata_header(metadata_file: str) -> Union[Dict[str, List[str]], None]:
+    """
+    Reads only the header of the METADATA file, so the long description
+    is neither read nor parsed. Returns None if the file is not readable.
+    """
+    data = read_metadata_header_bytes(metadata_file)
+    if data is None:
+        return None
+    return parse_metadata_header(data.decode('utf-8', 'replace'))
+
+
+def read_metadata_header_bytes(metadata_file: str) -> Union[bytes, None]:
+    """
+    Returns bytes of the METADATA header (without the long description).
+    Returns None if the file is not readable.
+    """
+    data = b''
+    try:
+        with open(metadata_file, 'rb') as f:
+            while True:
+                chunk = f.read(_HEADER_CHUNK_SIZE)
+                if not chunk:
+                    break
+                # the separator may be split between chunks
+                search_from = max(len(data) - 3, 0)
+                data += chunk
+                ends = [index for index in (data.find(end, search_from)
+                                            for end in _HEADER_END) if index >= 0]
+                if ends:
+                    return data[:min(ends)]
+    except OSError:
+        return None
+    return data
+
+
+def discover_distributions(paths: Sequence[str], skip_vendor: bool = True) \
+        -> List[DistributionPath]:
+    """
+    Finds distributions in the paths (like sys.path) by names of metadata
+    directories. Vendored entries and distributions shadowed by an earlier
+    path entry are rejected before reading any file.
+    """
+    res = list()
+    seen_names = set()  # type: Set[str]
+    seen_entries = set()
+    for entry in paths:
+        if entry in seen_entries:
+            continue
+        seen_entries.add(entry)
+        if skip_vendor and is_vendor_path(entry):
+            continue
+        for dist_path in scan_path_entry(entry):
+            if dist_path.kind == DistributionPath.KIND_METADATA:
+                if dist_path.name in seen_names:
+                    continue
+                seen_names.add(dist_path.name)
+            res.append(dist_path)
+    return res
@@ -0,0 +1,173 @@
+from typing import Dict, Set, List, Tuple, Callable, Collection, Union, TypeVar
+
+T = TypeVar('T')
+
+
+class DominatorIndex(object):
+    """
+    Dominator tree of the requirements graph (node -> set of its users,
+    like get_requirements_graph returns). The virtual root uses all leaves
+    and every package uses its requirements, so the packages freed by
+    removing a package are exactly the ones it dominates: the result of
+    find_all_dead for a single start node is its subtree.
+
+    The graph is expected to be acyclic (get_requirements_graph removes
+    cycles). Nodes unreachable from the leaves are attached to the root,
+    so they are never freed by others.
+    """
+
+    def __init__(self, graph: Dict[T, Collection[T]]):
+        self._graph = graph
+        # node ids in reverse post order, the root is -1
+        self._nodes = list()  # type: List[T]
+        self._ids = dict()  # type: Dict[T, int]
+        self._idom = list()  # type: List[int]
+        self._children = None  # type: Union[List[List[int]], None]
+        self.__build()
+
+    def __build(self):
+        graph = self._graph
+        requirements = dict((node, list()) for node in graph)
+        for node, users in graph.items():
+            for user in users:
+                if user in requirements and user != node:
+                    requirements[user].append(node)
+        # requirements are visited in stable order to keep ids reproducible
+        for node in requirements:
+            requirements[node].sort(key=_sort_key)
+        roots = sorted((node for node, users in graph.items() if not users),
+                       key=_sort_key)
+        post_order = list()
+        visited = set()
+
+        def dfs(start):
+            # iterative DFS, chains of requirements may be deep
+            visited.add(start)
+            stack = [(start, iter(requirements[start]))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if child not in visited:
+                        visited.add(child)
+                        stack.append((child, iter(requirements[child])))
+                        break
+                else:
+                    stack.pop()
+                    post_order.append(node)
+
+        for root in roots:
+            if root not in visited:
+                dfs(root)
+        unreachable = list()
+        for node in sorted(graph, key=_sort_key):
+            if node not in visited:
+                unreachable.append(node)
+                dfs(node)
+        self._nodes = list(reversed(post_order))
+        self._ids = dict((node, i) for i, node in enumerate(self._nodes))
+        ids = self._ids
+        root_users = set(roots) | set(unreachable)
+        predecessors = list()
+        for node in self._nodes:
+            if node in root_users:
+                predecessors.append([-1])
+            else:
+                predecessors.append([ids[user] for user in graph[node]
+                                     if user in ids and user != node])
+        self._idom = self.__compute_idom(predecessors)
+
+    @staticmethod
+    def __compute_idom(predecessors: List[List[int]]) -> List[int]:
+        """
+        Cooper, Harvey, Kennedy "A Simple, Fast Dominance Algorithm"
+        over ids in reverse post order.
+        """
+        undefined = -2
+        idom = [undefined] * len(predecessors)
+
+        def intersect(a, b):
+            while a != b:
+                while a > b:
+                    a = idom[a]
+                while b > a:
+                    b = idom[b]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for node, node_predecessors in enumerate(predecessors):
+                new_idom = undefined
+                for pred in node_predecessors:
+                    if pred != -1 and idom[pred] == undefined:
+                        continue
+                    new_idom = pred if new_idom == undefined \
+                        else intersect(pred, new_idom)
+                if new_idom != idom[node]:
+                    idom[node] = new_idom
+                    changed = True
+        return idom
+
+    def __contains__(self, node) -> bool:
+        return node in self._ids
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @property
+    def children(self) -> List[List[int]]:
+        if self._children is None:
+            children = [list() for _ in self._nodes]
+            for node, parent in enumerate(self._idom):
+                if parent >= 0:
+                    children[parent].append(node)
+            self._children = children
+        return self._children
+
+    def immediate_dominator(self, node: T) -> Union[T, None]:
+        """
+        Returns the package whose removal is the nearest one to free the node
+        or None if only the node itself frees it.
+        """
+        parent = self._idom[self._ids[node]]
+        return self._nodes[parent] if parent >= 0 else None
+
+    def dominated(self, node: T) -> Set[T]:
+        """
+        Returns packages freed by removal of the node (the node included).
+        """
+        children = self.children
+        res = set()
+        stack = [self._ids[node]]
+        while stack:
+            i = stack.pop()
+            res.add(self._nodes[i])
+            stack.extend(children[i])
+        return res
+
+    def impact(self, size_of: Callable[[T], Union[int, None]] = None,
+               exclude: Collection[T] = ()) -> List[Tuple[T, int, int]]:
+        """
+        Returns (node, freed packages count, freed bytes) for all nodes sorted
+        by impact, the most expensive first. Excluded nodes (like whitelist)
+        are not counted as freed.
+        """
+        children = self.children
+        count = [0] * len(self._nodes)
+        size = [0] * len(self._nodes)
+        # children always follow the parent in reverse post order
+        for i in range(len(self._nodes) - 1, -1, -1):
+            node = self._nodes[i]
+            if node not in exclude:
+                count[i] += 1
+                size[i] += (size_of(node) if size_of else None) or 0
+            for child in children[i]:
+                count[i] += count[child]
+                size[i] += size[child]
+        res = [(node, count[i], size[i]) for i, node in enumerate(self._nodes)]
+        res.sort(key=lambda x: (-x[1], -x[2], _sort_key(x[0])))
+        return res
+
+
+def _sort_key(node):
+    return getattr(node, 'name_general', None) or str(node)
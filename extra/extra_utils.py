@@ -1,8 +1,8 @@
-from typing import Set, Dict, List, Sequence
+from typing import Set, Dict, List, Sequence, Collection, Tuple, Callable
 
 from extra import graph_utils
 from extra.graph_utils import get_graph_leaves, test_graph_loops
-from extra.importlib_utils import DistributionInfo, ImportUtils
+from extra.importlib_utils import DistributionInfo, ImportUtils, DistributionsDelta
 
 restricted_extras_like = ['dev', 'test', 'doc']
 
@@ -33,19 +33,98 @@ def distributions_required(import_utils_lib: ImportUtils, dist: DistributionInfo
     return required_distributions
 
 
+class ExtrasIndex(object):
+    """
+    Index of installed distributions required by each distribution:
+    base ones and ones added by every extra. Requirements of a distribution
+    are resolved once, restricted extras are classified once per name.
+    Use get_extras_index to share it while known distributions do not change.
+    """
+
+    def __init__(self, import_utils_lib: ImportUtils):
+        self._import_utils_lib = import_utils_lib
+        self._dist_map = dict(
+            (dist.name_general, dist)
+            for dist in import_utils_lib.get_installed_distributions())
+        # dist -> (base distributions, extra -> distributions of the extra)
+        self._edges = dict()  # type: Dict[DistributionInfo, Tuple[Set, Dict[str, Set]]]
+        self._restricted = dict()  # type: Dict[str, bool]
+
+    def __get_edges(self, dist: DistributionInfo) -> Tuple[Set, Dict[str, Set]]:
+        edges = self._edges.get(dist)
+        if edges is None:
+            base = set()
+            by_extra = dict()
+            for req in dist.requirements or ():
+                required_dist = self._dist_map.get(req.name_general)
+                if required_dist is None:
+                    continue
+                if req.condition_extra:
+                    by_extra.setdefault(req.condition_extra, set()).add(required_dist)
+                else:
+                    base.add(required_dist)
+            edges = (base, by_extra)
+            self._edges[dist] = edges
+        return edges
+
+    def is_restricted_extra(self, extra: str) -> bool:
+        restricted = self._restricted.get(extra)
+        if restricted is None:
+            restricted = _is_restricted_extra(extra)
+            self._restricted[extra] = restricted
+        return restricted
+
+    def allowed_extras(self, dist: DistributionInfo) -> List[str]:
+        """
+        Returns extras of the distribution which are not restricted
+        (like "dev" or "test").
+        """
+        return [extra for extra in dist.available_extras or ()
+                if not self.is_restricted_extra(extra)]
+
+    def base_required(self, dist: DistributionInfo) -> Set[DistributionInfo]:
+        return self.__get_edges(dist)[0]
+
+    def extra_required(self, dist: DistributionInfo, extra: str) \
+            -> Set[DistributionInfo]:
+        """
+        Returns distributions required by the extra only.
+        """
+        base, by_extra = self.__get_edges(dist)
+        return by_extra.get(extra, set()) - base
+
+    def optional_required(self, dist: DistributionInfo, extras: List[str] = None) \
+            -> Set[DistributionInfo]:
+        """
+        Returns distributions required by the extras (allowed ones by default)
+        and not by the distribution itself.
+        """
+        base, by_extra = self.__get_edges(dist)
+        if extras is None:
+            extras = self.allowed_extras(dist)
+        res = set()
+        for extra in extras or ():
+            res.update(by_extra.get(extra, ()))
+        return res - base
+
+
+def get_extras_index(import_utils_lib: ImportUtils) -> ExtrasIndex:
+    """
+    Returns ExtrasIndex of the current known distributions of the ImportUtils.
+    """
+    index = import_utils_lib._derived_caches.get('extras_index')
+    if index is None:
+        index = ExtrasIndex(import_utils_lib)
+        import_utils_lib._derived_caches['extras_index'] = index
+    return index
+
+
 def optional_distributions_required(
         import_utils_lib: ImportUtils,
         dist: DistributionInfo,
         extras: List[str] = None
 ):
-    required_base_distributions = distributions_required(import_utils_lib, dist)
-    required_base_with_extra_distributions = distributions_required(
-        import_utils_lib, dist, extras)
-    required_optional_distributions = set()
-    for dist in required_base_with_extra_distributions:
-        if dist not in required_base_distributions:
-            required_optional_distributions.add(dist)
-    return required_optional_distributions
+    return get_extras_index(import_utils_lib).optional_required(dist, extras or [])
 
 
 def delete_cycles(graph: Dict[DistributionInfo, Set[DistributionInfo]]):
@@ -74,37 +153,147 @@ def delete_cycles(graph: Dict[DistributionInfo, Set[DistributionInfo]]):
 
 
 def get_requirements_graph(import_utils_lib: ImportUtils,
-                           extra_required=False):
+                           extra_required=False,
+                           cut_edges: List[Tuple[DistributionInfo, DistributionInfo]] = None):
+    """
+    :param cut_edges: if given, (requirement, user) edges removed
+        to break cycles are appended to it.
+    """
     installed_distributions = import_utils_lib.get_installed_distributions()
     dist_map = dict(
         (dist.name_general, dist) for dist in installed_distributions)
     g = dict(
         (dist, set([dist][:0])) for dist in dist_map.values())
     # set([dist][:0]) is used for typing help for 2.7. It marks as 'set' of 'dist type'
+    index = get_extras_index(import_utils_lib)
     for dist in g.keys():
-        for req in distributions_required(import_utils_lib, dist):
+        for req in index.base_required(dist):
             g[dist_map[req.name_general]].add(dist)
     # delete cycles
     while True:
-        if remove_cycles(g):
+        if remove_cycles(g, cut_edges):
             continue
         break
     #
     if extra_required:
-        for dist in g.keys():
-            extras = list(filter(
-                lambda e: not _is_restricted_extra(e), dist.available_extras))
-            for req in optional_distributions_required(import_utils_lib, dist, extras):
-                if len(g[dist_map[req.name_general]]) > 0:
-                    continue
-                g[dist_map[req.name_general]].add(dist)
-                if test_graph_loops(g):
-                    g[dist_map[req.name_general]].remove(dist)
+        _add_extras_edges(import_utils_lib, g, dist_map, g.keys())
     # delete cycles
 
     return g
 
 
+def get_partial_requirements_graph(import_utils_lib: ImportUtils,
+                                   start: Collection[DistributionInfo],
+                                   extra_required=False):
+    """
+    Returns the part of get_requirements_graph which decides what is freed
+    by removal of the start distributions: their requirements closure with
+    all users of it. Users outside the closure are kept as leaves.
+    Requirements are parsed only for the closure and for distributions whose
+    raw requirement names (read from METADATA headers) mention the closure.
+    Falls back to the full graph when the result depends on the whole
+    environment: extras edges and cycles inside the closure.
+    """
+    if extra_required:
+        return get_requirements_graph(import_utils_lib, extra_required)
+    installed_distributions = import_utils_lib.get_installed_distributions()
+    dist_map = dict(
+        (dist.name_general, dist) for dist in installed_distributions)
+    closure = set()  # type: Set[DistributionInfo]
+    stack = list(start)
+    while stack:
+        dist = stack.pop()
+        if dist in closure:
+            continue
+        closure.add(dist)
+        for req in get_extras_index(import_utils_lib).base_required(dist):
+            if req not in closure:
+                stack.append(req)
+    closure_names = set(dist.name_general for dist in closure)
+    index = get_extras_index(import_utils_lib)
+    g = dict((dist, set()) for dist in closure)
+    for dist in dist_map.values():
+        mentioned_names = dist.raw_requirement_names()
+        if mentioned_names is not None and not mentioned_names & closure_names:
+            continue
+        for req in index.base_required(dist):
+            if req.name_general in closure_names:
+                g[dist_map[req.name_general]].add(dist)
+                g.setdefault(dist, set())
+    # users outside the closure cannot be in a cycle with it
+    if graph_utils.find_cycle(g):
+        return get_requirements_graph(import_utils_lib, extra_required)
+    return g
+
+
+def _add_extras_edges(import_utils_lib: ImportUtils,
+                      graph: Dict[DistributionInfo, Set[DistributionInfo]],
+                      dist_map: Dict[str, DistributionInfo],
+                      dists,
+                      should_stop: Callable[[], bool] = None) -> int:
+    """
+    Adds edges of allowed extras to distributions which have no users.
+    Returns count of processed dists, less than all if should_stop
+    returned True.
+    """
+    index = get_extras_index(import_utils_lib)
+    processed = 0
+    for dist in dists:
+        if should_stop is not None and should_stop():
+            return processed
+        processed += 1
+        for req in index.optional_required(dist):
+            if len(graph[dist_map[req.name_general]]) > 0:
+                continue
+            graph[dist_map[req.name_general]].add(dist)
+            if test_graph_loops(graph):
+                graph[dist_map[req.name_general]].remove(dist)
+    return processed
+
+
+def patch_requirements_graph(import_utils_lib: ImportUtils,
+                             graph: Dict[DistributionInfo, Set[DistributionInfo]],
+                             delta: DistributionsDelta,
+                             extra_required=False):
+    """
+    Applies the result of ImportUtils.refresh_known_distributions to the graph
+    built by get_requirements_graph. Only edges of added, changed and affected
+    distributions are rebuilt, the graph is modified in place.
+    With extra_required the graph is rebuilt: extras edges are added only
+    to nodes without users, so any change may add or drop them anywhere.
+    """
+    if not delta:
+        return graph
+    if extra_required:
+        rebuilt = get_requirements_graph(import_utils_lib, extra_required)
+        graph.clear()
+        graph.update(rebuilt)
+        return graph
+    stale_names = set(d.name_general for d in delta.changed + delta.removed)
+    for node in [node for node in graph if node.name_general in stale_names]:
+        del graph[node]
+    for users in graph.values():
+        stale_users = set(u for u in users if u.name_general in stale_names)
+        users -= stale_users
+    for dist in delta.added + delta.changed:
+        graph[dist] = set([dist][:0])
+    dist_map = dict((dist.name_general, dist) for dist in graph)
+    touched = delta.added + delta.changed + [
+        d for d in delta.affected if d.name_general in dist_map]
+    index = get_extras_index(import_utils_lib)
+    for dist in touched:
+        for req in index.base_required(dist):
+            if req.name_general not in dist_map:
+                continue
+            graph[dist_map[req.name_general]].add(dist)
+    # delete cycles
+    while True:
+        if remove_cycles(graph):
+            continue
+        break
+    return graph
+
+
 def requirements_total_count(graph: Dict[DistributionInfo, Set[DistributionInfo]],
                              node: DistributionInfo) -> int:
     total_requirements = 0
@@ -122,7 +311,8 @@ def requirements_total_count(graph: Dict[DistributionInfo, Set[DistributionInfo]
     return total_requirements
 
 
-def remove_cycles(graph: Dict[DistributionInfo, Set[DistributionInfo]]) \
+def remove_cycles(graph: Dict[DistributionInfo, Set[DistributionInfo]],
+                  cut_edges: List[Tuple[DistributionInfo, DistributionInfo]] = None) \
         -> Sequence[DistributionInfo]:
     cycle = graph_utils.find_cycle(graph)
     if not cycle:
@@ -146,6 +336,8 @@ def remove_cycles(graph: Dict[DistributionInfo, Set[DistributionInfo]]) \
     node_to_remove_connection = cycle[min_index-1]
     connection = cycle[min_index]
     graph[node_to_remove_connection].remove(connection)
+    if cut_edges is not None:
+        cut_edges.append((node_to_remove_connection, connection))
     return cycle
 
 
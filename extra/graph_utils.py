@@ -1,5 +1,6 @@
-import copy
-from typing import Union, List, Dict, Set, Any, TypeVar, Collection, Sequence
+from collections import deque
+from typing import Union, List, Dict, Set, Any, TypeVar, Collection, Sequence, \
+    Callable, Tuple
 
 T = TypeVar('T')
 
@@ -12,8 +13,92 @@ def get_graph_leaves(graph: Dict[T, Collection[T]]) -> Set[T]:
     return result
 
 
+def find_dead_nodes(graph: Dict[T, Collection[T]], start: Collection[T]) -> Set[T]:
+    """
+    Returns start nodes with all nodes whose users are all dead
+    (like find_all_dead of pip_autoremove) in one worklist pass.
+    """
+    return DeadNodesIndex(graph).find_dead(start)
+
+
+class DeadNodesIndex(object):
+    """
+    Requirements and users counts of the graph prepared once for many
+    find_dead_nodes queries: every query visits only the requirements
+    of its dead nodes instead of the whole graph.
+    """
+
+    def __init__(self, graph: Dict[T, Collection[T]]):
+        self._requirements = dict()  # type: Dict[T, List[T]]
+        for node, users in graph.items():
+            for user in users:
+                self._requirements.setdefault(user, []).append(node)
+        self._users_count = dict((node, len(users)) for node, users in graph.items())
+
+    def find_dead(self, start: Collection[T]) -> Set[T]:
+        requirements = self._requirements
+        users_count = self._users_count
+        # users of touched nodes which are dead so far
+        dead_users = dict()  # type: Dict[T, int]
+        dead = set(start)
+        stack = list(dead)
+        while stack:
+            for requirement in requirements.get(stack.pop(), ()):
+                dead_users[requirement] = dead_users.get(requirement, 0) + 1
+                if dead_users[requirement] == users_count[requirement] \
+                        and requirement not in dead:
+                    dead.add(requirement)
+                    stack.append(requirement)
+        return dead
+
+
+def get_users_closure(graph: Dict[T, Collection[T]], node: T) -> Set[T]:
+    """
+    Returns the node with all nodes which use it transitively.
+    """
+    visited = {node}
+    stack = [node]
+    while stack:
+        for user in graph.get(stack.pop(), ()):
+            if user not in visited:
+                visited.add(user)
+                stack.append(user)
+    return visited
+
+
+def get_shortest_paths_from_leaves(graph: Dict[T, Collection[T]], node: T,
+                                   key: Callable[[T], Any] = None) \
+        -> List[Tuple[T, ...]]:
+    """
+    Returns a shortest path from every leaf which uses the node transitively
+    down to the node (BFS over users). Paths are sorted by length, users
+    are visited in order of key, so equal paths are chosen reproducibly.
+    """
+    parents = {node: None}  # type: Dict[T, Union[T, None]]
+    queue = deque([node])
+    leaves = list()
+    while queue:
+        current = queue.popleft()
+        users = graph.get(current, ())
+        if not users:
+            leaves.append(current)
+            continue
+        for user in (sorted(users, key=key) if key else users):
+            if user not in parents:
+                parents[user] = current
+                queue.append(user)
+    paths = list()
+    for leaf in leaves:
+        path = [leaf]
+        while parents[path[-1]] is not None:
+            path.append(parents[path[-1]])
+        paths.append(tuple(path))
+    return paths
+
+
 def remove_graph_nodes(graph, nodes):
-    new_graph = copy.deepcopy(graph)
+    # nodes are hashed by value, so copying the sets is enough
+    new_graph = dict((node, set(users)) for node, users in graph.items())
     for node in nodes:
         del new_graph[node]
     for node in new_graph.keys():
@@ -26,59 +111,57 @@ def test_graph_loops(graph):
     Test if the graph has loops.
     """
     visited = set()
-    stack = set()
-
-    def visit(_node):
-        if _node in stack:
-            return True  # Loop detected
-        if _node in visited:
-            return False  # Already visited
-
-        visited.add(_node)
-        stack.add(_node)
-
-        for neighbor in graph.get(_node, []):
-            if visit(neighbor):
-                return True
-
-        stack.remove(_node)
-        return False
-
+    # iterative DFS, chains of requirements may be deeper than the recursion limit
     for node in graph.keys():
-        if visit(node):
-            return True  # Loop detected
+        if node in visited:
+            continue
+        visited.add(node)
+        on_stack = {node}
+        stack = [(node, iter(graph.get(node, [])))]
+        while stack:
+            current, neighbors = stack[-1]
+            for neighbor in neighbors:
+                if neighbor in on_stack:
+                    return True  # Loop detected
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    on_stack.add(neighbor)
+                    stack.append((neighbor, iter(graph.get(neighbor, []))))
+                    break
+            else:
+                stack.pop()
+                on_stack.remove(current)
 
     return False  # No loops found
 
 
 def find_cycle(graph: Dict[T, Collection[T]]) -> Sequence[T]:
+    """
+    Returns the first cycle found by DFS in order of graph keys
+    (with the first node repeated at the end) or an empty tuple.
+    """
     visited = set()
-    stack = []
-    on_stack = set()
-
-    def dfs(node) -> Union[List[Any], None]:
-        visited.add(node)
-        stack.append(node)
-        on_stack.add(node)
-
-        for neighbor in graph.get(node, []):
-            if neighbor not in visited:
-                _cycle = dfs(neighbor)
-                if _cycle:
-                    return _cycle
-            elif neighbor in on_stack:
-                cycle_start_index = stack.index(neighbor)
-                return stack[cycle_start_index:] + [neighbor]
-
-        stack.pop()
-        on_stack.remove(node)
-        return None
-
     for start_node in graph:
-        if start_node not in visited:
-            cycle = dfs(start_node)
-            if cycle:
-                return tuple(cycle)
+        if start_node in visited:
+            continue
+        visited.add(start_node)
+        path = [start_node]
+        # node -> its index in path
+        on_path = {start_node: 0}
+        neighbors_stack = [iter(graph.get(start_node, []))]
+        while neighbors_stack:
+            for neighbor in neighbors_stack[-1]:
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    on_path[neighbor] = len(path)
+                    path.append(neighbor)
+                    neighbors_stack.append(iter(graph.get(neighbor, [])))
+                    break
+                elif neighbor in on_path:
+                    return tuple(path[on_path[neighbor]:] + [neighbor])
+            else:
+                neighbors_stack.pop()
+                del on_path[path.pop()]
 
     return tuple()  # No cycle found
 
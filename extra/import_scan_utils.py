@@ -0,0 +1,202 @@
+import ast
+import errno
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, List, Set, Tuple, Union, Iterator, Any
+
+from extra.dominator_utils import DominatorIndex
+from extra.extra_utils import get_requirements_graph
+from extra.importlib_utils import ImportUtils, DistributionInfo, get_user_cache_path
+
+IMPORT_CACHE_FORMAT_VERSION = 1
+# changed files are parsed in worker processes only when there are many of them
+PARALLEL_PARSE_MIN_FILES = 64
+# directories which never contain sources of the project itself
+_SKIPPED_DIRS = ('__pycache__', 'site-packages', 'node_modules', 'venv')
+
+# user of all imported distributions in the graph
+_SOURCE_TREE = '<source tree>'
+
+
+def _get_str_literal(node: ast.AST) -> Union[str, None]:
+    if isinstance(node, ast.Constant):
+        value = node.value
+    elif sys.version_info < (3, 8) and isinstance(node, ast.Str):
+        # string literals are ast.Str before Python 3.8
+        value = node.s
+    else:
+        return None
+    return value if isinstance(value, str) else None
+
+
+def parse_file_imports(path: str) -> List[str]:
+    """
+    Returns sorted top-level module names imported by the python file.
+    Relative imports are skipped, files with syntax errors import nothing.
+    """
+    try:
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (SyntaxError, ValueError, OSError):
+        return []
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                names.add(alias.name.split('.', 1)[0])
+        elif isinstance(node, ast.ImportFrom):
+            if node.level == 0 and node.module:
+                names.add(node.module.split('.', 1)[0])
+        elif isinstance(node, ast.Call):
+            # importlib.import_module("name") and __import__("name")
+            func = node.func
+            func_name = func.attr if isinstance(func, ast.Attribute) else \
+                getattr(func, 'id', None)
+            if func_name not in ('import_module', '__import__') or not node.args:
+                continue
+            name = _get_str_literal(node.args[0])
+            if name and not name.startswith('.'):
+                names.add(name.split('.', 1)[0])
+    return sorted(names)
+
+
+def _parse_files_imports(paths: List[str]) -> List[List[str]]:
+    return [parse_file_imports(path) for path in paths]
+
+
+def iter_source_files(root: str) -> Iterator[str]:
+    """
+    Yields python files of the source tree, hidden directories and
+    virtual environments are skipped.
+    """
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(
+            name for name in dir_names
+            if not name.startswith('.') and name not in _SKIPPED_DIRS and
+            not os.path.isfile(os.path.join(dir_path, name, 'pyvenv.cfg')))
+        for file_name in sorted(file_names):
+            if file_name.endswith('.py'):
+                yield os.path.join(dir_path, file_name)
+
+
+def get_default_cache_path(root: str) -> str:
+    """
+    Returns path of the import cache of the source tree
+    in the user cache directory.
+    """
+    digest = hashlib.sha1(os.path.realpath(root).encode('utf-8')).hexdigest()
+    return get_user_cache_path('imports-%s.json' % digest)
+
+
+def _load_cache(cache_path: Union[str, None]) -> Dict[str, Any]:
+    if not cache_path:
+        return dict()
+    try:
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return dict()
+    if not isinstance(cache, dict) or \
+            cache.get('version') != IMPORT_CACHE_FORMAT_VERSION:
+        return dict()
+    return cache.get('files') or dict()
+
+
+def _save_cache(cache_path: Union[str, None], files: Dict[str, Any]):
+    if not cache_path:
+        return
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': IMPORT_CACHE_FORMAT_VERSION, 'files': files},
+                      f, separators=(',', ':'))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def scan_source_tree(root: str, jobs: int = None,
+                     cache_path: Union[str, None] = None) -> Tuple[Set[str], int]:
+    """
+    Returns top-level module names imported by python files of the source
+    tree and count of files parsed again. Results are cached per file
+    (mtime, size), so only changed files are parsed on re-runs.
+    Raises FileNotFoundError if the root is not a directory.
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(errno.ENOENT, "Directory not found", root)
+    cached = _load_cache(cache_path)
+    files = dict()
+    changed = list()
+    for path in iter_source_files(root):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        record = cached.get(path)
+        if record is not None and record[:2] == stamp:
+            files[path] = record
+            continue
+        files[path] = stamp + [None]
+        changed.append(path)
+    if changed:
+        jobs = jobs or os.cpu_count() or 1
+        if jobs < 2 or len(changed) < PARALLEL_PARSE_MIN_FILES:
+            results = _parse_files_imports(changed)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            chunk_size = max(1, len(changed) // (jobs * 4))
+            chunks = [changed[i:i + chunk_size]
+                      for i in range(0, len(changed), chunk_size)]
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = [imports for chunk_result in
+                           executor.map(_parse_files_imports, chunks)
+                           for imports in chunk_result]
+        for path, imports in zip(changed, results):
+            files[path][2] = imports
+    if changed or len(files) != len(cached):
+        _save_cache(cache_path, files)
+    imported = set()
+    for record in files.values():
+        imported.update(record[2])
+    return imported, len(changed)
+
+
+def get_distribution_import_names(dist: DistributionInfo) -> List[str]:
+    """
+    Returns top-level import names of the distribution, the project name
+    is used when the distribution does not list them.
+    """
+    names = dist.top_level_names()
+    if names:
+        return names
+    return [dist.name_general.replace('-', '_').replace('.', '_')]
+
+
+def find_unused_leaves(import_utils_lib: ImportUtils, root: str,
+                       include_extras: bool = False, jobs: int = None,
+                       cache_path: Union[str, None] = None) \
+        -> List[Tuple[DistributionInfo, Set[DistributionInfo]]]:
+    """
+    Returns leaves which are not imported by the source tree with
+    the distributions their removal would free. Distributions imported
+    by the source tree are never freed.
+    """
+    imported_names, _ = scan_source_tree(root, jobs, cache_path)
+    graph = get_requirements_graph(import_utils_lib, include_extras)
+    graph = dict((node, set(users)) for node, users in graph.items())
+    for dist in list(graph):
+        if imported_names.intersection(get_distribution_import_names(dist)):
+            graph[dist].add(_SOURCE_TREE)
+    graph[_SOURCE_TREE] = set()
+    index = DominatorIndex(graph)
+    res = list()
+    for dist in sorted(graph, key=lambda d: str(getattr(d, 'name_general', d))):
+        if dist == _SOURCE_TREE or graph[dist]:
+            continue
+        res.append((dist, index.dominated(dist)))
+    return res
@@ -1,23 +1,39 @@
 # coding=utf-8
 import abc
 import logging
+import os
 import re
+import sys
 import weakref
-from typing import Union, List
-import packaging.requirements
+from typing import Union, List, Set, Dict, Tuple, Any
+
+from extra.discovery_utils import discover_distributions, DistributionPath, \
+    read_metadata_header, read_metadata_header_bytes, parse_metadata_header
+from extra.marker_utils import MarkerEvaluator, get_default_marker_evaluator
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
 class DistributionInfo(object):
-    def __init__(self):
-        self._name = None
-        self.__name_general = None
-        self._version = None
-        self._lib_path_location = None
-        self._available_extras = None
-        self._requirements = None
+    # slots keep the per-node memory low on environments with many packages
+    __slots__ = ('_name', '_name_general', '_version', '_lib_path_location',
+                 '_available_extras', '_requirements')
+
+    def __init__(self, name: str = None, version: str = None,
+                 lib_path_location: str = None, available_extras: List[str] = None,
+                 requirements: List['RequirementInfo'] = None):
+        self._name_general = None
+        self._set_name(name)
+        self._version = version
+        self._lib_path_location = lib_path_location
+        self._available_extras = available_extras
+        self._requirements = requirements
+
+    def _set_name(self, name: Union[str, None]):
+        self._name = name
+        self._name_general = sys.intern(get_package_general_name(name)) \
+            if name else None
 
     def __str__(self):
         return (
@@ -29,16 +45,30 @@ class DistributionInfo(object):
                  if self.lib_path_location else "") +
                 ")")
 
+    def __hash__(self):
+        return hash(self.name_general)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, DistributionInfo):
+            return NotImplemented
+        return (self.name_general == other.name_general and
+                self.version == other.version)
+
+    def __ne__(self, other):
+        res = self.__eq__(other)
+        return res if res is NotImplemented else not res
+
     @property
     def name(self) -> str:
         return self._name
 
     @property
     def name_general(self) -> str:
-        if not self.__name_general and self.name:
-            self.__name_general = get_package_general_name(self.name)
-        # print(self.__name_general)
-        return self.__name_general
+        if self._name_general is None and self.name:
+            self._set_name(self.name)
+        return self._name_general
 
     @property
     def version(self) -> str:
@@ -56,6 +86,43 @@ class DistributionInfo(object):
     def requirements(self) -> List['RequirementInfo']:
         return self._requirements
 
+    def raw_requirements(self) -> Union[List[str], None]:
+        """
+        Returns raw metadata requirement strings (Requires-Dist)
+        or None when the distribution cannot tell it cheaply.
+        """
+        return None
+
+    def raw_requirement_names(self) -> Union[Set[str], None]:
+        """
+        Returns general names of all packages mentioned in the raw metadata
+        requirements (regardless of markers and installation state)
+        or None when the distribution cannot tell it cheaply.
+        """
+        requirements_raw = self.raw_requirements()
+        if requirements_raw is None:
+            return None
+        res = set()
+        for req_raw in requirements_raw:
+            name_general = get_requirement_general_name(req_raw)
+            if name_general:
+                res.add(name_general)
+        return res
+
+    def installed_size(self) -> Union[int, None]:
+        """
+        Returns size of the installed files in bytes
+        or None when the distribution does not list its files.
+        """
+        return None
+
+    def top_level_names(self) -> Union[List[str], None]:
+        """
+        Returns top-level import names provided by the distribution
+        or None when the distribution does not list them.
+        """
+        return None
+
     def requirements_filter(self, enabled_extras: List[str] = None) \
             -> List['RequirementInfo']:
         if not self.requirements:
@@ -66,12 +133,22 @@ class DistributionInfo(object):
             self._requirements))
         return res
 
+    def freeze(self) -> 'FrozenDistributionInfo':
+        """
+        Returns immutable copy with all lazy fields loaded. It is detached
+        from the ImportUtils which created it, so it can be shared
+        between graphs of different backend instances.
+        """
+        return FrozenDistributionInfo(
+            self.name, self.version, self.lib_path_location,
+            tuple(self.available_extras or ()), tuple(self.requirements or ()))
+
     class Builder:
         def __init__(self):
             self._instance = DistributionInfo()
 
         def name(self, name: str):
-            self._instance._name = name
+            self._instance._set_name(name)
             return self
 
         def version(self, version: str):
@@ -94,22 +171,56 @@ class DistributionInfo(object):
             return self._instance
 
 
+class FrozenDistributionInfo(DistributionInfo):
+    """
+    Immutable DistributionInfo, see DistributionInfo.freeze.
+    """
+    __slots__ = ()
+
+    def __init__(self, name: str, version: str = None,
+                 lib_path_location: str = None, available_extras: Tuple[str] = (),
+                 requirements: Tuple['RequirementInfo'] = ()):
+        setattr_ = super(FrozenDistributionInfo, self).__setattr__
+        setattr_('_name', name)
+        setattr_('_name_general',
+                 sys.intern(get_package_general_name(name)) if name else None)
+        setattr_('_version', version)
+        setattr_('_lib_path_location', lib_path_location)
+        setattr_('_available_extras', tuple(available_extras))
+        setattr_('_requirements', tuple(requirements))
+
+    def __setattr__(self, key, value):
+        raise AttributeError("FrozenDistributionInfo is immutable.")
+
+    def freeze(self) -> 'FrozenDistributionInfo':
+        return self
+
+
 class RequirementInfo(object):
+    __slots__ = ('_name', '_name_general', '_enabled_extras', '_condition_extra')
+
+    # requirement string -> (name, enabled extras, condition extra) shared by
+    # all environments of the process, also filled from MetadataCache
+    _parsed_fields = dict()  # type: Dict[str, Tuple[str, List[str], Union[str, None]]]
+
     def __init__(self):
         self._name = None
-        self.__name_general = None
+        self._name_general = None
         self._enabled_extras = None
         self._condition_extra = None
 
+    def _set_name(self, name: Union[str, None]):
+        self._name = name
+        self._name_general = sys.intern(get_package_general_name(name)) \
+            if name else None
+
     @property
     def name(self) -> str:
         return self._name
 
     @property
     def name_general(self) -> str:
-        if not self.__name_general and self.name:
-            self.__name_general = get_package_general_name(self.name)
-        return self.__name_general
+        return self._name_general
 
     @property
     def enabled_extras(self):
@@ -142,10 +253,27 @@ class RequirementInfo(object):
             return False
         return True
 
+    def __hash__(self):
+        return hash((self.name_general, self.condition_extra))
+
+    @classmethod
+    def parse_str_fields(cls, str_repr: str) \
+            -> Tuple[str, List[str], Union[str, None]]:
+        """
+        Returns (name, enabled extras, condition extra) of the requirement
+        string, the result is shared and must not be modified.
+        """
+        fields = cls._parsed_fields.get(str_repr)
+        if fields is None:
+            res = cls.__parse_str_regex(str_repr)
+            fields = (res.name, res._enabled_extras, res.condition_extra)
+            cls._parsed_fields[str_repr] = fields
+        return fields
+
     @classmethod
     def __parse_str_regex(cls, str_repr: str) -> 'RequirementInfo':
         regex = (
-            r"^\s*(?P<requirement_name>[\w\-]+)\s*"
+            r"^\s*(?P<requirement_name>[\w.\-]+)\s*"
             r"(?:\[(?P<requirement_extras>.*)\])?"
             r"(?:.*extra\s*==\s*"
             r"(?P<_quote>[\"\'])(?P<condition_extra>[\w\-]+)(?P=_quote))?.*$")
@@ -171,30 +299,24 @@ class RequirementInfo(object):
         return res
 
     @classmethod
-    def __parse_str_packaging_satisfy(
-            cls, str_repr: str, condition_extra: Union[str, None] = None
-    ) -> bool:
-        try:
-            req = packaging.requirements.Requirement(str_repr)
-        except packaging.requirements.InvalidRequirement:
-            raise ValueError("Invalid requirement string format: " + str_repr)
-        custom_env = dict()
-        if condition_extra:
-            custom_env['extra'] = condition_extra
-        res = True
-        if req.marker:
-            res = req.marker.evaluate(custom_env)
-        return res
-
-    @classmethod
-    def parse_str(cls, str_repr: str) -> 'RequirementInfo':
+    def parse_str(cls, str_repr: str,
+                  marker_evaluator: MarkerEvaluator = None) -> 'RequirementInfo':
         """
         Parses the string representation of the requirement.
         The format is:
         name[extra1,extra2,...]; extra == "condition_extra"
+        Markers are evaluated by marker_evaluator, by default against
+        the running interpreter.
         """
-        res = cls.__parse_str_regex(str_repr)
-        if not cls.__parse_str_packaging_satisfy(str_repr, res.condition_extra):
+        name, enabled_extras, condition_extra = cls.parse_str_fields(str_repr)
+        res = (cls.Builder()
+               .name(name)
+               .enabled_extras(list(enabled_extras))
+               .condition_extra(condition_extra)
+               ).build()
+        if marker_evaluator is None:
+            marker_evaluator = get_default_marker_evaluator()
+        if not marker_evaluator.evaluate_requirement(str_repr, res.condition_extra):
             raise cls.SatisfyException(str_repr, res.condition_extra)
         return res
 
@@ -219,7 +341,7 @@ class RequirementInfo(object):
             self._instance._enabled_extras = list()
 
         def name(self, name: str):
-            self._instance._name = name
+            self._instance._set_name(name)
             return self
 
         def enabled_extras(self, enabled_extras: List[str]):
@@ -246,15 +368,164 @@ def get_package_general_name(name: str) -> str:
     return name.lower().replace('_', '-')
 
 
+_requirement_name_regex = re.compile(r"^\s*([\w.\-]+)")
+
+
+def get_requirement_general_name(str_repr: str) -> Union[str, None]:
+    """
+    Returns the general name of the raw requirement string without
+    parsing its markers.
+    """
+    match = _requirement_name_regex.match(str_repr)
+    if not match:
+        return None
+    return get_package_general_name(match.group(1))
+
+
+def get_path_mtime(path: str) -> Union[int, None]:
+    """
+    Returns modification time of the path in nanoseconds or None if
+    the path is not accessible.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def get_user_cache_path(name: str) -> str:
+    """
+    Returns path of the cache file or directory of pip-autoremove
+    in the user cache directory, it is shared by all environments of the user.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'pip-autoremove', name)
+
+
+def get_files_size(files: List[str], base_dir: str,
+                   sizes: List[Union[int, None]] = None) -> int:
+    """
+    Returns total size of the files relative to base_dir.
+    Known sizes (like from RECORD) are used instead of stat.
+    """
+    total = 0
+    for i, file in enumerate(files):
+        size = sizes[i] if sizes else None
+        if size is None:
+            try:
+                size = os.stat(os.path.join(base_dir, file)).st_size
+            except OSError:
+                size = 0
+        total += size
+    return total
+
+
+def get_record_size(record: str, base_dir: str) -> int:
+    """
+    Returns total size of the files listed in RECORD of the distribution.
+    """
+    import csv
+    files, sizes = list(), list()
+    for row in csv.reader(record.splitlines()):
+        if not row:
+            continue
+        files.append(row[0])
+        size = row[2] if len(row) > 2 else ''
+        sizes.append(int(size) if size.isdigit() else None)
+    return get_files_size(files, base_dir, sizes)
+
+
+def get_top_level_names(top_level: Union[str, None],
+                        record: Union[str, None]) -> Union[List[str], None]:
+    """
+    Returns top-level import names from top_level.txt or,
+    if it is missing, from the paths listed in RECORD.
+    """
+    if top_level is not None:
+        return sorted(set(line.strip() for line in top_level.splitlines()
+                          if line.strip()))
+    if record is None:
+        return None
+    names = set()
+    for line in record.splitlines():
+        path = line.split(',', 1)[0].strip().strip('"')
+        parts = path.split('/')
+        first = parts[0]
+        if len(parts) == 1:
+            # module.py or extension module.cpython-311-x86_64-linux-gnu.so
+            if not first.endswith(('.py', '.so', '.pyd')):
+                continue
+            first = first.split('.', 1)[0]
+        if first.isidentifier() and first != '__pycache__':
+            names.add(first)
+    return sorted(names)
+
+
+class DistributionsDelta(object):
+    """
+    Changes of installed distributions found by
+    ImportUtils.refresh_known_distributions.
+    """
+
+    def __init__(self, added: List[DistributionInfo] = None,
+                 changed: List[DistributionInfo] = None,
+                 removed: List[DistributionInfo] = None,
+                 affected: List[DistributionInfo] = None):
+        self.added = list(added or [])
+        self.changed = list(changed or [])
+        self.removed = list(removed or [])
+        # distributions kept as is, but requiring added, changed or removed ones
+        self.affected = list(affected or [])
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __str__(self):
+        return ("DistributionsDelta(added=" +
+                str([d.name for d in self.added]) +
+                ", changed=" + str([d.name for d in self.changed]) +
+                ", removed=" + str([d.name for d in self.removed]) + ")")
+
+
 class ImportUtils(abc.ABC):
     def __init__(self):
         self._known_dists = dict()
+        # dist-info path -> (mtime, general name or None if skipped)
+        self._known_stamps = dict()  # type: Dict[str, Tuple[Any, Union[str, None]]]
+        # data derived from known distributions by other modules (like indexes),
+        # dropped whenever known distributions change
+        self._derived_caches = dict()  # type: Dict[str, Any]
+        # None means sys.path
+        self._paths = None  # type: Union[List[str], None]
+        # None means the running interpreter
+        self.marker_evaluator = None  # type: Union[MarkerEvaluator, None]
+        # METADATA headers of immutable path entries (see layer_cache_utils),
+        # None means every METADATA is read
+        self.layer_cache = None
+        # parsed METADATA headers by content (see metadata_cache_utils)
+        self.metadata_cache = None
         # if root class is ImportUtils then exception
         if type(self) is not ImportUtils:
             return
         raise self.ImportUtilsInitializationError(
             "ImportUtils is an abstract class and cannot be instantiated directly.")
 
+    @property
+    def paths(self) -> List[str]:
+        """
+        Returns paths searched for distributions.
+        """
+        return list(self._paths) if self._paths is not None else list(sys.path)
+
+    @property
+    def is_running_environment(self) -> bool:
+        """
+        Returns True if distributions of the running interpreter (sys.path)
+        are searched, so its pip manages them.
+        """
+        return self._paths is None
+
     def get_distribution(self, name: str) -> DistributionInfo:
         """
         Returns the distribution information for the given package name.
@@ -270,7 +541,7 @@ class ImportUtils(abc.ABC):
                             str(type(str_repr)) + ".")
         if not self._known_dists:
             self.get_installed_distributions()
-        requirement = RequirementInfo().parse_str(str_repr)
+        requirement = RequirementInfo().parse_str(str_repr, self.marker_evaluator)
         name_general = requirement.name_general
         if name_general not in self._known_dists:
             raise self.InstalledDependencyNotFound(requirement.name)
@@ -298,6 +569,102 @@ class ImportUtils(abc.ABC):
         or get_installed_distributions will fetch the latest data.
         """
         self._known_dists.clear()
+        self._known_stamps.clear()
+        self._derived_caches.clear()
+
+    def _scan_distribution_stamps(self) -> Union[Dict[str, Tuple[Any, Any]], None]:
+        """
+        Returns mapping of dist-info path to (mtime, raw distribution) for
+        the current environment or None if the implementation
+        cannot identify distributions by path.
+        """
+        return None
+
+    def _wrap_raw_distribution(self, dist_raw) -> Union[DistributionInfo, None]:
+        """
+        Wraps the raw distribution returned by _scan_distribution_stamps.
+        Returns None if the distribution must be skipped.
+        """
+        raise NotImplementedError()
+
+    def refresh_known_distributions(self) -> DistributionsDelta:
+        """
+        Synchronizes the cache of known distributions with the environment.
+        Unlike clear_known_distributions only added or changed dist-info
+        entries are loaded again, other distributions are kept as is.
+        """
+        delta = self.__refresh_known_distributions()
+        if delta:
+            self._derived_caches.clear()
+        return delta
+
+    def __refresh_known_distributions(self) -> DistributionsDelta:
+        if not self._known_dists:
+            return DistributionsDelta(added=self.get_installed_distributions())
+        scanned = self._scan_distribution_stamps()
+        if scanned is None:
+            return self.__refresh_full()
+        known_stamps = self._known_stamps
+        removed_paths = [path for path in known_stamps if path not in scanned]
+        loaded_paths = [path for path, (mtime, _) in scanned.items()
+                        if path not in known_stamps or known_stamps[path][0] != mtime]
+        if not removed_paths and not loaded_paths:
+            return DistributionsDelta()
+        old_dists = dict()
+        for path in removed_paths + loaded_paths:
+            if path not in known_stamps:
+                continue
+            name_general = known_stamps.pop(path)[1]
+            if name_general in self._known_dists:
+                old_dists[name_general] = self._known_dists.pop(name_general)
+        new_dists = dict()
+        for path in loaded_paths:
+            mtime, dist_raw = scanned[path]
+            dist = self._wrap_raw_distribution(dist_raw)
+            known_stamps[path] = (mtime, dist.name_general if dist else None)
+            if dist is not None:
+                new_dists[dist.name_general] = dist
+        self._known_dists.update(new_dists)
+        self._known_dists = dict(sorted(self._known_dists.items()))
+        return self.__make_delta(old_dists, new_dists)
+
+    def __refresh_full(self) -> DistributionsDelta:
+        old_dists = dict(self._known_dists)
+        self.clear_known_distributions()
+        new_dists = dict()
+        for dist in self.get_installed_distributions():
+            old_dist = old_dists.get(dist.name_general)
+            if old_dist is not None and (old_dist.version == dist.version and
+                                         old_dist.lib_path_location ==
+                                         dist.lib_path_location):
+                # keep the loaded instance
+                self._known_dists[dist.name_general] = old_dist
+                del old_dists[dist.name_general]
+                continue
+            new_dists[dist.name_general] = dist
+        return self.__make_delta(old_dists, new_dists)
+
+    def __make_delta(self, old_dists: Dict[str, DistributionInfo],
+                     new_dists: Dict[str, DistributionInfo]) -> DistributionsDelta:
+        added = [d for n, d in new_dists.items() if n not in old_dists]
+        changed = [d for n, d in new_dists.items() if n in old_dists]
+        removed = [d for n, d in old_dists.items() if n not in new_dists]
+        # requirements are filtered by installed packages,
+        # so cached ones of the kept distributions may become stale
+        installed_changed_names = set(d.name_general for d in added + removed)
+        touched_names = installed_changed_names | set(new_dists)
+        affected = list()
+        for name_general, dist in self._known_dists.items():
+            if name_general in new_dists:
+                continue
+            names = dist.raw_requirement_names()
+            if names is not None and not (names & touched_names):
+                continue
+            if names is None or names & installed_changed_names:
+                dist._requirements = None
+            affected.append(dist)
+        return DistributionsDelta(added=added, changed=changed, removed=removed,
+                                  affected=affected)
 
     # @abc.abstractmethod
     # def get_requirement_dependencies(
@@ -333,13 +700,22 @@ class ImportUtilsFactory:
     """
 
     @staticmethod
-    def create() -> ImportUtils:
+    def create(paths: List[str] = None, layer_cache=None,
+               metadata_cache=None) -> ImportUtils:
+        """
+        :param paths: search distributions only in these paths
+            instead of sys.path.
+        :param layer_cache: LayerCache of immutable path entries,
+            used only by the importlib implementation.
+        :param metadata_cache: MetadataCache of parsed METADATA headers,
+            used only by the importlib implementation.
+        """
         try:
-            return ImportUtilsImportlib()
+            return ImportUtilsImportlib(paths, layer_cache, metadata_cache)
         except ImportUtils.ImportUtilsInitializationError:
             pass
         try:
-            return ImportUtilsPkgResources()
+            return ImportUtilsPkgResources(paths)
         except ImportUtils.ImportUtilsInitializationError:
             raise ImportUtils.ImportUtilsInitializationError(
                 "No suitable ImportUtils implementation found. "
@@ -359,81 +735,207 @@ class ImportUtilsPkgResources(ImportUtils):
                 import pkg_resources
                 self.__pkg_resources = pkg_resources
             except ImportError:
-                raise Exception("pkg_resources module is not available.")
+                raise self.ImportUtilsInitializationError(
+                    "Module \"pkg_resources\" is not available.")
 
-    def __init__(self):
+    def __init__(self, paths: List[str] = None):
         super(self.__class__, self).__init__()
         self.__import()
+        self._paths = list(paths) if paths is not None else None
+        self.__working_set = None
 
     def clear_known_distributions(self):
         self.__pkg_resources = None
         self.__import()
         getattr(self.__pkg_resources, '_initialize_master_working_set', lambda: None)()
+        self.__working_set = None
         super(self.__class__, self).clear_known_distributions()
 
+    def __get_working_set(self):
+        if self.__working_set is None:
+            if self._paths is not None:
+                self.__working_set = self.__make_working_set()
+            else:
+                # master working set is already built by pkg_resources import
+                self.__working_set = self.__pkg_resources.working_set
+        return self.__working_set
+
+    def __make_working_set(self):
+        pkg_resources = self.__pkg_resources
+        working_set = pkg_resources.WorkingSet([])
+        for dist_path in discover_distributions(self.paths):
+            if (dist_path.kind == DistributionPath.KIND_ARCHIVE or
+                    os.path.basename(dist_path.path) == 'EGG-INFO'):
+                dists_raw = pkg_resources.find_distributions(dist_path.location)
+            else:
+                dists_raw = pkg_resources.distributions_from_metadata(dist_path.path)
+            for dist_raw in dists_raw:
+                # the first added distribution of the same key wins
+                working_set.add(dist_raw, dist_path.location)
+        return working_set
+
+    @staticmethod
+    def __get_raw_distribution_path(dist_raw) -> str:
+        return getattr(dist_raw, 'egg_info', None) or dist_raw.location
+
+    def _scan_distribution_stamps(self) -> Dict[str, Tuple[Any, Any]]:
+        # Fresh working set scans sys.path without touching the master one
+        working_set = self.__make_working_set()
+        self.__working_set = working_set
+        res = dict()
+        for dist_raw in working_set:
+            path = self.__get_raw_distribution_path(dist_raw)
+            res[path] = (get_path_mtime(path), dist_raw)
+        return res
+
+    def _wrap_raw_distribution(self, dist_raw) -> Union[DistributionInfo, None]:
+        dist = self.__DistributionInfoProxyPkgResources(self, dist_raw)
+        if dist.name is None:
+            return None
+        if 'vendor' in dist.lib_path_location:
+            return None
+        return dist
+
     def get_installed_distributions(self) -> List[DistributionInfo]:
         if self._known_dists:
             return list(self._known_dists.values())
-        distributions_raw = list(self.__pkg_resources.working_set)
-        distributions = list()
+        distributions_raw = list(self.__get_working_set())
+        distributions = dict()
+        self._known_stamps.clear()
         for dist_raw in distributions_raw:
-            dist = self.__DistributionInfoProxyPkgResources(dist_raw)
-            if dist.name is None:
+            path = self.__get_raw_distribution_path(dist_raw)
+            dist = self._wrap_raw_distribution(dist_raw)
+            if dist is not None and dist.name_general in distributions:
+                dist = None  # shadowed by the earlier path entry
+            self._known_stamps[path] = (get_path_mtime(path),
+                                        dist.name_general if dist else None)
+            if dist is None:
                 continue
-            if 'vendor' in dist.lib_path_location:
-                continue
-            distributions.append(dist)
-        distributions = list(sorted(distributions, key=lambda x: x.name_general))
-        self._known_dists = {dist.name_general: dist for dist in distributions}
+            distributions[dist.name_general] = dist
+        self._known_dists = dict(sorted(distributions.items()))
         return self.get_installed_distributions()
 
     def _get_requirement_dependencies(
-            self, name: str, enabled_extras: list = None) -> List[RequirementInfo]:
-        try:
-            d = self.__pkg_resources.get_distribution(name)
-            requirements_raw = d.requires(extras=enabled_extras)
-            requirements_raw = requirements_raw if requirements_raw else list()
-            requirements = list()
-            for req in requirements_raw:
-                try:
-                    req_fetched_requirement = self.get_requirement(str(req))
-                except self.InstalledDependencyNotFound:
-                    continue
-                # condition_extra = req.ex
-                # req_info = (RequirementInfo().Builder()
-                #             .name(req_fetched_requirement.name)
-                #             .enabled_extras(list(req.extras) if req.extras else list())
-                #             ).build()
-                requirements.append(req_fetched_requirement)
-            requirements = list(sorted(
-                requirements, key=lambda x: x.name_general))
-            return requirements
-        except self.__pkg_resources.DistributionNotFound:
-            raise self.InstalledDependencyNotFound(name)
+            self, dist_raw, available_extras: List[str] = None) -> List[RequirementInfo]:
+        """
+        Converts pkg_resources requirements of the distribution without
+        parsing them again. pkg_resources evaluates markers itself, requirements
+        of an extra are the ones added by requires(extras=(extra,)).
+        """
+        requirements = list()
+        known_dists = self._known_dists or dict(
+            (d.name_general, d) for d in self.get_installed_distributions())
+        base_requirements_raw = dist_raw.requires() or list()
+        requirements_raw = [(req, None) for req in base_requirements_raw]
+        for extra in available_extras or list():
+            try:
+                extra_requirements_raw = dist_raw.requires(extras=(extra,))
+            except self.__pkg_resources.UnknownExtra:
+                continue
+            requirements_raw += [(req, extra) for req in
+                                 extra_requirements_raw[len(base_requirements_raw):]]
+        for req, condition_extra in requirements_raw:
+            requirement = (RequirementInfo.Builder()
+                           .name(req.project_name)
+                           .enabled_extras(list(req.extras))
+                           .condition_extra(condition_extra)
+                           ).build()
+            if requirement.name_general not in known_dists:
+                continue
+            requirements.append(requirement)
+        requirements = list(sorted(
+            requirements, key=lambda x: x.name_general))
+        return requirements
 
     class __DistributionInfoProxyPkgResources(DistributionInfo):
-        def __init__(self, dist_raw):
+        __slots__ = ('__import_utils_lib', '__dist_raw')
+
+        def __init__(self, import_utils_lib: 'ImportUtilsPkgResources', dist_raw):
             super(self.__class__, self).__init__()
-            self._name = dist_raw.project_name
+            self.__import_utils_lib = weakref.ref(import_utils_lib)
+            self.__dist_raw = dist_raw
+            self._set_name(dist_raw.project_name)
             self._version = dist_raw.version
             self._lib_path_location = dist_raw.location
-            available_extras = list()
-            try:
-                available_extras = list(dist_raw.extras)
-            except FileNotFoundError as e:
-                logger.info(
-                    "Failed to get extras for distribution %s: %s",
-                    dist_raw.project_name, str(e))
-            self._available_extras = available_extras
+
+        @property
+        def available_extras(self) -> List[str]:
+            # extras are known after parsing of all requirements, so it is lazy
+            if self._available_extras is None:
+                available_extras = list()
+                try:
+                    available_extras = list(self.__dist_raw.extras)
+                except FileNotFoundError as e:
+                    logger.info(
+                        "Failed to get extras for distribution %s: %s",
+                        self.__dist_raw.project_name, str(e))
+                self._available_extras = available_extras
+            return super(self.__class__, self).available_extras
+
+        def get_import_utils_lib(self) -> 'ImportUtilsPkgResources':
+            lib = self.__import_utils_lib()
+            if not lib:
+                raise Exception("ImportUtils was nulled (weak reference).")
+            return lib
 
         @property
         def requirements(self) -> List['RequirementInfo']:
-            if not self._requirements:
-                requirements = ImportUtilsPkgResources()._get_requirement_dependencies(
-                    self.name, self.available_extras)
+            if self._requirements is None:
+                requirements = self.get_import_utils_lib()._get_requirement_dependencies(
+                    self.__dist_raw, self.available_extras)
                 self._requirements = requirements
             return super(self.__class__, self).requirements
 
+        def raw_requirements(self) -> Union[List[str], None]:
+            dist_raw = self.__dist_raw
+            try:
+                if dist_raw.has_metadata('METADATA'):
+                    return [line.split(':', 1)[1].strip()
+                            for line in dist_raw.get_metadata_lines('METADATA')
+                            if line.lower().startswith('requires-dist:')]
+                # egg-info keeps extras as sections of requires.txt
+                requirements_raw = [str(req) for req in dist_raw.requires()]
+                base_count = len(requirements_raw)
+                for extra in self.available_extras:
+                    for req in dist_raw.requires(extras=(extra,))[base_count:]:
+                        marker = ('(%s) and ' % req.marker) if req.marker else ''
+                        requirements_raw.append(
+                            '%s; %sextra == "%s"' % (
+                                str(req).split(';')[0], marker, extra))
+                return requirements_raw
+            except Exception as e:
+                logger.info("Failed to get raw requirements of %s: %s",
+                            self.name, str(e))
+                return None
+
+        def installed_size(self) -> Union[int, None]:
+            dist_raw = self.__dist_raw
+            try:
+                if dist_raw.has_metadata('RECORD'):
+                    return get_record_size(dist_raw.get_metadata('RECORD'),
+                                           dist_raw.location)
+                if dist_raw.has_metadata('installed-files.txt'):
+                    return get_files_size(
+                        list(dist_raw.get_metadata_lines('installed-files.txt')),
+                        dist_raw.egg_info)
+            except Exception as e:
+                logger.info("Failed to get installed size of %s: %s",
+                            self.name, str(e))
+            return None
+
+        def top_level_names(self) -> Union[List[str], None]:
+            dist_raw = self.__dist_raw
+            try:
+                return get_top_level_names(
+                    dist_raw.get_metadata('top_level.txt')
+                    if dist_raw.has_metadata('top_level.txt') else None,
+                    dist_raw.get_metadata('RECORD')
+                    if dist_raw.has_metadata('RECORD') else None)
+            except Exception as e:
+                logger.info("Failed to get top level names of %s: %s",
+                            self.name, str(e))
+                return None
+
         # def requirements_filter(self, enabled_extras: List[str] = None) \
         #         -> List[RequirementInfo]:
         #     requirements = ImportUtilsPkgResources()._get_requirement_dependencies(
@@ -444,6 +946,11 @@ class ImportUtilsPkgResources(ImportUtils):
             return super(self.__class__, self).__str__()
 
 
+# fields of METADATA header used by distributions of ImportUtilsImportlib
+# (and kept by layer and metadata caches)
+METADATA_HEADER_FIELDS = ('name', 'version', 'provides-extra', 'requires-dist')
+
+
 class ImportUtilsImportlib(ImportUtils):
     """
     Implementation of ImportUtils using importlib.metadata for python 3.8+.
@@ -453,8 +960,13 @@ class ImportUtilsImportlib(ImportUtils):
     _importlib_metadata = None
     _importlib = None
 
-    def __init__(self):
+    def __init__(self, paths: List[str] = None, layer_cache=None, metadata_cache=None):
         super(self.__class__, self).__init__()
+        self._paths = list(paths) if paths is not None else None
+        self.layer_cache = layer_cache
+        self.metadata_cache = metadata_cache
+        # dist-info path -> (mtime, METADATA header) given by the layer cache
+        self.__layer_records = dict()
         try:
             import importlib.resources
             import importlib.metadata
@@ -466,30 +978,117 @@ class ImportUtilsImportlib(ImportUtils):
             raise self.ImportUtilsInitializationError(
                 "Module \"importlib\" is not available.")
 
+    @staticmethod
+    def __get_raw_distribution_path(dist_raw) -> Union[str, None]:
+        path = getattr(dist_raw, '_path', None)
+        return str(path) if path is not None else None
+
+    def __distributions_raw(self):
+        metadata = self._importlib_metadata
+        dist_paths = discover_distributions(self.paths)
+        self.__layer_records = self.layer_cache.get_records(dist_paths) \
+            if self.layer_cache is not None else dict()
+        for dist_path in dist_paths:
+            if dist_path.kind == DistributionPath.KIND_ARCHIVE:
+                for dist_raw in metadata.distributions(path=[dist_path.path]):
+                    yield dist_raw
+                continue
+            yield metadata.Distribution.at(dist_path.path)
+
+    def _scan_distribution_stamps(self) -> Union[Dict[str, Tuple[Any, Any]], None]:
+        res = dict()
+        for dist_raw in self.__distributions_raw():
+            path = self.__get_raw_distribution_path(dist_raw)
+            if path is None:
+                return None
+            res[path] = (self.__get_path_mtime(path), dist_raw)
+        return res
+
+    def __get_path_mtime(self, path: str) -> Union[int, None]:
+        record = self.__layer_records.get(os.path.normpath(path))
+        return record[0] if record is not None else get_path_mtime(path)
+
+    def _get_layer_header(self, path: str) -> Union[Dict[str, List[str]], None]:
+        """
+        Returns METADATA header of the dist-info directory
+        given by the layer cache or None if it is not cached.
+        """
+        record = self.__layer_records.get(os.path.normpath(path))
+        return record[1] if record is not None else None
+
+    def _read_metadata_header(self, metadata_file: str) \
+            -> Union[Dict[str, List[str]], None]:
+        """
+        Reads the header of the METADATA file, with the metadata cache
+        the header and its requirements are parsed once per content.
+        """
+        metadata_cache = self.metadata_cache
+        if metadata_cache is None:
+            return read_metadata_header(metadata_file)
+        data = read_metadata_header_bytes(metadata_file)
+        if data is None:
+            return None
+        from extra.metadata_cache_utils import get_metadata_digest
+        digest = get_metadata_digest(data)
+        entry = metadata_cache.get(digest)
+        if entry is not None:
+            parsed_fields = RequirementInfo._parsed_fields
+            for str_repr, (name, enabled_extras, condition_extra) in \
+                    entry['requirements'].items():
+                parsed_fields.setdefault(str_repr, (name, enabled_extras, condition_extra))
+            return entry['header']
+        header = parse_metadata_header(data.decode('utf-8', 'replace'))
+        header = dict((field, header.get(field, list()))
+                      for field in METADATA_HEADER_FIELDS)
+        requirements = dict()
+        for str_repr in header['requires-dist']:
+            try:
+                requirements[str_repr] = RequirementInfo.parse_str_fields(str_repr)
+            except ValueError:
+                continue
+        metadata_cache.put(digest, {'header': header, 'requirements': requirements})
+        return header
+
+    def __flush_metadata_cache(self):
+        if self.metadata_cache is not None:
+            self.metadata_cache.flush()
+
+    def refresh_known_distributions(self) -> DistributionsDelta:
+        delta = super(self.__class__, self).refresh_known_distributions()
+        self.__flush_metadata_cache()
+        return delta
+
+    def _wrap_raw_distribution(self, dist_raw) -> Union[DistributionInfo, None]:
+        # vendored paths are already rejected by discover_distributions
+        dist = self.__DistributionInfoProxyImportLib(self, dist_raw)
+        if dist.name is None:
+            return None
+        return dist
+
     def get_installed_distributions(self) -> List[DistributionInfo]:
         if self._known_dists:
             return list(self._known_dists.values())
-        distributions_raw = list(self._importlib_metadata.distributions())
-        distributions = list()
+        distributions_raw = list(self.__distributions_raw())
+        distributions = dict()
+        self._known_stamps.clear()
         for dist_raw in distributions_raw:
             # dist_metadata = dist_raw.metadata
-
-            dist = self.__DistributionInfoProxyImportLib(self, dist_raw)
-            if dist.name is None:
+            dist = self._wrap_raw_distribution(dist_raw)
+            if dist is not None and dist.name_general in distributions:
+                dist = None  # shadowed by the earlier path entry
+            path = self.__get_raw_distribution_path(dist_raw)
+            if path is not None:
+                self._known_stamps[path] = (self.__get_path_mtime(path),
+                                            dist.name_general if dist else None)
+            if dist is None:
                 continue
-            # dist.name = str(dist_metadata['name'])
-            # dist.version = str(dist_metadata['version'])
-            # dist.available_extras = list(dist_metadata.get('provides_extra', list()))
-            # dist.lib_path_location = str(dist_raw.locate_file('.'))
-            if 'vendor' in dist.lib_path_location:
-                continue
-            distributions.append(dist)
-        distributions = list(sorted(distributions, key=lambda x: x.name_general))
-        self._known_dists = {d.name_general: d for d in distributions}
+            distributions[dist.name_general] = dist
+        self._known_dists = dict(sorted(distributions.items()))
+        self.__flush_metadata_cache()
         return self.get_installed_distributions()
 
-    def _get_requirement_dependencies(self, metadata) -> List[RequirementInfo]:
-        requirements_raw = metadata.get_all('requires-dist', list()) or [""][:-1]
+    def _get_requirement_dependencies(self, requirements_raw: List[str]) \
+            -> List[RequirementInfo]:
         requirements = list()
         for req_raw in requirements_raw:
             try:
@@ -506,23 +1105,49 @@ class ImportUtilsImportlib(ImportUtils):
         """
         Proxy class for DistributionInfo to allow lazy loading of metadata.
         """
+        __slots__ = ('__import_utils_lib', '__dist_raw', '__header')
 
         def __init__(self, import_utils_lib: 'ImportUtilsImportlib', dist_raw):
             super(self.__class__, self).__init__()
             self.__import_utils_lib = weakref.ref(import_utils_lib)
             self.__dist_raw = dist_raw
-            self.__metadata = self.__dist_raw.metadata
+            self.__header = None
+
+        def __get_header(self) -> Dict[str, List[str]]:
+            """
+            Returns METADATA header fields. Only the header bytes of dist-info
+            are read, other formats are parsed by importlib.metadata.
+            """
+            if self.__header is None:
+                header = None
+                path = getattr(self.__dist_raw, '_path', None)
+                if path is not None:
+                    header = self.get_import_utils_lib()._get_layer_header(str(path))
+                if header is None and path is not None and os.path.isdir(str(path)):
+                    header = self.get_import_utils_lib()._read_metadata_header(
+                        os.path.join(str(path), 'METADATA'))
+                if header is None:
+                    metadata = self.__dist_raw.metadata
+                    header = dict((field, metadata.get_all(field, list()) or list())
+                                  for field in METADATA_HEADER_FIELDS)
+                self.__header = dict((field, header.get(field, list()))
+                                     for field in METADATA_HEADER_FIELDS)
+            return self.__header
+
+        def __get_header_value(self, field: str) -> Union[str, None]:
+            values = self.__get_header()[field]
+            return values[0] if values else None
 
         @property
         def name(self) -> str:
             if not self._name:
-                self._name = self.__metadata['name']
+                self._set_name(self.__get_header_value('name'))
             return super(self.__class__, self).name
 
         @property
         def version(self) -> str:
             if not self._version:
-                self._version = self.__metadata['version']
+                self._version = self.__get_header_value('version')
             return super(self.__class__, self).version
 
         @property
@@ -534,7 +1159,7 @@ class ImportUtilsImportlib(ImportUtils):
         @property
         def available_extras(self) -> List[str]:
             if not self._available_extras:
-                self._available_extras = self.__metadata.get_all('provides-extra', list())
+                self._available_extras = list(self.__get_header()['provides-extra'])
             return super(self.__class__, self).available_extras
 
         def get_import_utils_lib(self) -> 'ImportUtilsImportlib':
@@ -549,39 +1174,29 @@ class ImportUtilsImportlib(ImportUtils):
             if not self._requirements:
                 import_utils_lib = self.get_import_utils_lib()
                 requirements = import_utils_lib._get_requirement_dependencies(
-                    self.__metadata)
+                    self.__get_header()['requires-dist'])
                 self._requirements = requirements
             return super(self.__class__, self).requirements
 
-        def __str__(self):
-            return super(self.__class__, self).__str__()
-
-
-def main():
-    util1, util2 = ImportUtilsPkgResources(), ImportUtilsImportlib()
-    for i in range(10):
-        utils = [util1, util2]
-        a, b = list(util.get_distribution('fastapi') for util in utils)[:2]
-        if i == 0:
-            print(a)
-            print(b)
-        # a2, b2 = list(util.get_requirement_dependencies('fastapi')
-        # for util in utils)[:2]
-        c1, c2 = list(util.get_installed_distributions() for util in utils)[:2]
-        for c in [c1, c2]:
-            for d in c:
-                _ = (d.name, d.version, d.lib_path_location, d.available_extras,
-                     d.requirements)
-        pass
-        d1, d2 = list(util.get_requirement('fastapi[standard]') for util in utils)[:2]
-        if d1 == d2:
-            pass
-        e1, e2 = list(util.get_distribution('setuptools') for util in utils)[:2]
-        if e1 == e2:
-            pass
-    pass
+        def raw_requirements(self) -> Union[List[str], None]:
+            return list(self.__get_header()['requires-dist'])
+
+        def installed_size(self) -> Union[int, None]:
+            dist_raw = self.__dist_raw
+            record = dist_raw.read_text('RECORD')
+            if record is not None:
+                return get_record_size(record, self.lib_path_location)
+            installed_files = dist_raw.read_text('installed-files.txt')
+            if installed_files is not None:
+                return get_files_size(installed_files.splitlines(),
+                                      str(getattr(dist_raw, '_path', '')))
+            return None
 
+        def top_level_names(self) -> Union[List[str], None]:
+            top_level = self.__dist_raw.read_text('top_level.txt')
+            return get_top_level_names(
+                top_level,
+                self.__dist_raw.read_text('RECORD') if top_level is None else None)
 
-if __name__ == '__main__':
-    # make_all_profiling_in_module(globals())
-    main()
+        def __str__(self):
+            return super(self.__class__, self).__str__()
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, List, Tuple, Union, Sequence, Any
+
+from extra.discovery_utils import DistributionPath, DIST_INFO_SUFFIX, \
+    scan_path_entry, read_metadata_header
+from extra.importlib_utils import METADATA_HEADER_FIELDS, get_path_mtime, \
+    get_user_cache_path
+
+LAYER_CACHE_FORMAT_VERSION = 2
+
+# dist-info path -> (mtime, METADATA header, (METADATA mtime, METADATA size))
+LayerRecords = Dict[str, Tuple[Union[int, None], Dict[str, List[str]],
+                               Union[Tuple[int, int], None]]]
+
+
+def get_default_layer_cache_dir() -> str:
+    """
+    Returns directory of layer caches in the user cache directory,
+    it is shared by all environments of the user.
+    """
+    return get_user_cache_path('layers')
+
+
+def is_base_layer(entry: str) -> bool:
+    """
+    Returns True if the path entry belongs to the base interpreter of
+    the running virtual environment. Permissions do not tell it: a read-only
+    directory may still be changed by its owner.
+    """
+    entry = os.path.realpath(entry or '.')
+    base_prefix = os.path.realpath(getattr(sys, 'base_prefix', sys.prefix))
+    return base_prefix != os.path.realpath(sys.prefix) and \
+        (entry == base_prefix or entry.startswith(base_prefix + os.sep))
+
+
+def _get_metadata_stamp(path: str) -> Union[Tuple[int, int], None]:
+    """
+    Returns (mtime, size) of METADATA of the dist-info directory,
+    rewriting the file in place does not change the layer directory.
+    """
+    try:
+        stat = os.stat(os.path.join(path, 'METADATA'))
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class LayerCache(object):
+    """
+    Cache of METADATA headers per immutable sys.path entry (layer), like
+    site-packages of the base interpreter shared by many virtual environments.
+    A layer is indexed once into a file and is read again when its
+    directory or any METADATA file is modified, entries of the environment
+    itself are not cached.
+    Shadowing between layers is resolved by discover_distributions, so the
+    cache only replaces reading of METADATA files.
+    """
+
+    def __init__(self, cache_dir: str = None, layers: Sequence[str] = None):
+        """
+        :param cache_dir: directory of cache files (see get_default_layer_cache_dir).
+        :param layers: immutable path entries, detected by is_base_layer if None.
+        """
+        self.cache_dir = cache_dir or get_default_layer_cache_dir()
+        self._layers = set(os.path.realpath(layer) for layer in layers) \
+            if layers is not None else None
+        # realpath of the layer -> (directory mtime, records)
+        self._loaded = dict()  # type: Dict[str, Tuple[int, LayerRecords]]
+        self.hits = 0
+        self.misses = 0
+
+    def is_layer(self, entry: str) -> bool:
+        if self._layers is not None:
+            return os.path.realpath(entry or '.') in self._layers
+        return is_base_layer(entry)
+
+    def get_cache_path(self, entry: str) -> str:
+        digest = hashlib.sha1(
+            os.path.realpath(entry or '.').encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'layer-%s.json' % digest)
+
+    def get_records(self, dist_paths: Sequence[DistributionPath]) -> LayerRecords:
+        """
+        Returns cached records of the dist-info directories which belong
+        to layers, other distributions are skipped.
+        """
+        by_entry = dict()  # type: Dict[str, List[str]]
+        for dist_path in dist_paths:
+            if dist_path.kind == DistributionPath.KIND_METADATA and \
+                    dist_path.path.lower().endswith(DIST_INFO_SUFFIX):
+                by_entry.setdefault(dist_path.location, list()).append(
+                    os.path.normpath(dist_path.path))
+        res = dict()
+        for entry, paths in by_entry.items():
+            if not self.is_layer(entry):
+                continue
+            records = self.get_layer(entry, paths)
+            res.update((path, records[path]) for path in paths if path in records)
+        return res
+
+    def get_layer(self, entry: str, expected_paths: Sequence[str] = ()) -> LayerRecords:
+        """
+        Returns records of all dist-info directories of the layer. The layer
+        is indexed again if its directory was modified, misses any of
+        the expected paths or any of their METADATA files changed.
+        """
+        location = os.path.normpath(entry or '.')
+        key = os.path.realpath(location)
+        mtime = get_path_mtime(location)
+        loaded = self._loaded.get(key)
+        if loaded is None or loaded[0] != mtime:
+            loaded = (mtime, self.__load(location, mtime))
+            self._loaded[key] = loaded
+        records = loaded[1]
+        if mtime is None or any(path not in records or
+                                _get_metadata_stamp(path) != records[path][2]
+                                for path in expected_paths):
+            self.misses += 1
+            records = self.__index(location)
+            self._loaded[key] = (mtime, records)
+            self.__save(location, mtime, records)
+        else:
+            self.hits += 1
+        return records
+
+    def __load(self, location: str, mtime: int) -> LayerRecords:
+        try:
+            with open(self.get_cache_path(location), 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return dict()
+        if not isinstance(cache, dict) or \
+                cache.get('version') != LAYER_CACHE_FORMAT_VERSION or \
+                cache.get('entry') != os.path.realpath(location) or \
+                cache.get('mtime') != mtime:
+            return dict()
+        return dict((os.path.join(location, file_name),
+                     (dist_mtime, header, tuple(stamp) if stamp else None))
+                    for file_name, (dist_mtime, header, stamp) in cache['dists'].items())
+
+    @staticmethod
+    def __index(location: str) -> LayerRecords:
+        res = dict()
+        for dist_path in scan_path_entry(location):
+            path = os.path.normpath(dist_path.path)
+            if dist_path.kind != DistributionPath.KIND_METADATA or \
+                    not path.lower().endswith(DIST_INFO_SUFFIX):
+                continue
+            # stamped before reading, so a concurrent change is noticed later
+            stamp = _get_metadata_stamp(path)
+            header = read_metadata_header(os.path.join(path, 'METADATA'))
+            if header is None:
+                continue
+            res[path] = (get_path_mtime(path),
+                         dict((field, header.get(field, list()))
+                              for field in METADATA_HEADER_FIELDS),
+                         stamp)
+        return res
+
+    def __save(self, location: str, mtime: Union[int, None], records: LayerRecords):
+        if mtime is None or not records:
+            return
+        cache = {
+            'version': LAYER_CACHE_FORMAT_VERSION,
+            'entry': os.path.realpath(location),
+            'mtime': mtime,
+            'dists': dict((os.path.basename(path), record)
+                          for path, record in records.items()),
+        }  # type: Dict[str, Any]
+        cache_path = self.get_cache_path(location)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # unique temporary file, environments may index the layer concurrently
+            tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f, separators=(',', ':'))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
@@ -0,0 +1,154 @@
+from typing import Dict, Union
+
+_packaging = None
+
+
+def _import_packaging():
+    """
+    Imports packaging on first use, it is too heavy
+    for the startup of command line interface.
+    """
+    global _packaging
+    if _packaging is None:
+        import packaging.markers
+        import packaging.requirements
+        _packaging = packaging
+    return _packaging
+
+
+def get_current_environment() -> Dict[str, str]:
+    """
+    Returns marker environment of the running interpreter.
+    """
+    return dict(_import_packaging().markers.default_environment())
+
+
+def make_python_environment(python_version: str) -> Dict[str, str]:
+    """
+    Returns marker environment of the running interpreter with python version
+    replaced by the given one ("3.8" or "3.8.10").
+    """
+    parts = python_version.split('.')
+    if len(parts) < 2 or not all(part.isdigit() for part in parts[:2]):
+        raise ValueError("Invalid python version \"%s\"." % python_version)
+    environment = get_current_environment()
+    environment['python_version'] = '.'.join(parts[:2])
+    environment['python_full_version'] = python_version if len(parts) > 2 \
+        else python_version + '.0'
+    return environment
+
+
+class MarkerEvaluator(object):
+    """
+    Evaluates requirement markers against the environment computed once.
+    Results are cached per (marker, extra), requirement strings are parsed
+    once per evaluator.
+    """
+
+    def __init__(self, environment: Dict[str, str] = None):
+        """
+        :param environment: target marker environment, missing keys are taken
+            from the running interpreter.
+        """
+        self._target_environment = dict(environment) if environment else None
+        self._environment = None
+        self._requirement_markers = dict()  # type: Dict[str, Union[str, None]]
+        self._markers = dict()
+        self._results = dict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def environment(self) -> Dict[str, str]:
+        if self._environment is None:
+            environment = get_current_environment()
+            if self._target_environment:
+                environment.update(self._target_environment)
+            environment['extra'] = ''
+            self._environment = environment
+        return self._environment
+
+    def get_requirement_marker(self, str_repr: str) -> Union[str, None]:
+        """
+        Returns the marker of the requirement string.
+        Raises ValueError for invalid marker.
+        """
+        try:
+            return self._requirement_markers[str_repr]
+        except KeyError:
+            pass
+        if ';' not in str_repr:
+            marker = None
+        elif '@' in str_repr:
+            # URL may contain ";", so the whole requirement is parsed
+            requirements = _import_packaging().requirements
+            try:
+                req = requirements.Requirement(str_repr)
+            except requirements.InvalidRequirement:
+                raise ValueError("Invalid requirement string format: " + str_repr)
+            marker = str(req.marker) if req.marker else None
+            if marker is not None:
+                self._markers.setdefault(marker, req.marker)
+        else:
+            # only the marker is parsed, identical markers share the result
+            marker = str_repr.split(';', 1)[1].strip() or None
+            if marker is not None:
+                self.__parse_marker(marker)
+        self._requirement_markers[str_repr] = marker
+        return marker
+
+    def __parse_marker(self, marker: str):
+        marker_parsed = self._markers.get(marker)
+        if marker_parsed is None:
+            markers = _import_packaging().markers
+            try:
+                marker_parsed = markers.Marker(marker)
+            except markers.InvalidMarker:
+                raise ValueError("Invalid requirement marker: " + marker)
+            self._markers[marker] = marker_parsed
+        return marker_parsed
+
+    def evaluate(self, marker: str, extra: Union[str, None] = None) -> bool:
+        key = (marker, extra)
+        res = self._results.get(key)
+        if res is not None:
+            self.hits += 1
+            return res
+        self.misses += 1
+        marker_parsed = self.__parse_marker(marker)
+        environment = self.environment
+        if extra:
+            environment = dict(environment)
+            environment['extra'] = extra
+        res = bool(marker_parsed.evaluate(environment))
+        self._results[key] = res
+        return res
+
+    def evaluate_requirement(self, str_repr: str,
+                             extra: Union[str, None] = None) -> bool:
+        """
+        Returns True if the requirement is needed in the environment
+        with the given extra enabled.
+        """
+        marker = self.get_requirement_marker(str_repr)
+        if marker is None:
+            return True
+        return self.evaluate(marker, extra)
+
+    def clear(self):
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+_default_marker_evaluator = None
+
+
+def get_default_marker_evaluator() -> MarkerEvaluator:
+    """
+    Returns evaluator of the running interpreter shared by the process.
+    """
+    global _default_marker_evaluator
+    if _default_marker_evaluator is None:
+        _default_marker_evaluator = MarkerEvaluator()
+    return _default_marker_evaluator
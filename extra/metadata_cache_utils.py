@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+from typing import Dict, Any, List, Union
+
+from extra.importlib_utils import get_user_cache_path
+
+METADATA_CACHE_FORMAT_VERSION = 3
+# hex digits of the digest naming the shard, a lookup loads its shard only
+SHARD_PREFIX_LENGTH = 2
+# packs of a shard are merged into one when there are more of them
+MAX_PACKS = 4
+# entries of a shard kept by the merge, the oldest ones are evicted
+MAX_SHARD_ENTRIES = 256
+_PACK_PREFIX = 'pack-'
+_PACK_SUFFIX = '.json'
+
+
+def get_default_metadata_cache_dir() -> str:
+    """
+    Returns directory of the metadata cache in the user cache directory,
+    it is shared by all environments of the user.
+    """
+    return get_user_cache_path('metadata')
+
+
+def get_metadata_digest(data: bytes) -> str:
+    """
+    Returns the content address of METADATA header bytes.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+class MetadataCache(object):
+    """
+    Content-addressed cache of parsed METADATA headers, the same wheel
+    installed in many environments is parsed once. Entries never change,
+    so every process writes its new entries into its own pack file
+    (atomically) and packs are merged from time to time: concurrent
+    environments and users sharing the directory never block each other.
+    Packs are sharded by the digest prefix, so a lookup reads one small
+    shard instead of the whole cache, and merges keep at most
+    MAX_SHARD_ENTRIES newest entries of the shard.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or get_default_metadata_cache_dir()
+        # shard prefix -> entries, loaded on the first lookup in the shard
+        self._shards = dict()  # type: Dict[str, Dict[str, Any]]
+        # shard prefix -> pack paths, the oldest first
+        self._packs = dict()  # type: Dict[str, List[str]]
+        # shard prefix -> entries not written yet
+        self._new_entries = dict()  # type: Dict[str, Dict[str, Any]]
+        self.hits = 0
+        self.misses = 0
+        # entries read from pack files
+        self.loaded = 0
+
+    def get_shard_dir(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:SHARD_PREFIX_LENGTH])
+
+    @staticmethod
+    def __list_packs(shard_dir: str) -> List[str]:
+        try:
+            names = os.listdir(shard_dir)
+        except OSError:
+            return []
+        paths = list()
+        for name in names:
+            if name.startswith(_PACK_PREFIX) and name.endswith(_PACK_SUFFIX):
+                path = os.path.join(shard_dir, name)
+                try:
+                    paths.append((os.stat(path).st_mtime_ns, path))
+                except OSError:
+                    continue
+        return [path for _, path in sorted(paths)]
+
+    def __load(self, digest: str) -> Dict[str, Any]:
+        prefix = digest[:SHARD_PREFIX_LENGTH]
+        entries = self._shards.get(prefix)
+        if entries is None:
+            entries = dict()
+            packs = list()
+            for pack_path in self.__list_packs(self.get_shard_dir(digest)):
+                try:
+                    with open(pack_path, 'r') as f:
+                        pack = json.load(f)
+                except (OSError, ValueError):
+                    # removed by concurrent merge or written by other version
+                    continue
+                if not isinstance(pack, dict) or \
+                        pack.get('version') != METADATA_CACHE_FORMAT_VERSION:
+                    continue
+                pack_entries = pack.get('entries') or {}
+                self.loaded += len(pack_entries)
+                # newer packs win, entries are kept in order of age
+                for key, entry in pack_entries.items():
+                    entries.pop(key, None)
+                    entries[key] = entry
+                packs.append(pack_path)
+            self._shards[prefix] = entries
+            self._packs[prefix] = packs
+        return entries
+
+    def get(self, digest: str) -> Union[Any, None]:
+        entry = self.__load(digest).get(digest)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, digest: str, entry: Any):
+        """
+        Adds the entry, it must be JSON serializable.
+        New entries are written by flush.
+        """
+        self.__load(digest)[digest] = entry
+        self._new_entries.setdefault(digest[:SHARD_PREFIX_LENGTH], dict())[digest] = entry
+
+    def flush(self):
+        """
+        Writes new entries of every shard into a new pack, merges packs
+        of the shard if there are more than MAX_PACKS of them.
+        """
+        for prefix, new_entries in list(self._new_entries.items()):
+            shard_dir = self.get_shard_dir(prefix)
+            pack_path = self.__write_pack(shard_dir, new_entries)
+            if pack_path is None:
+                continue
+            del self._new_entries[prefix]
+            packs = self._packs[prefix]
+            packs.append(pack_path)
+            if len(packs) <= MAX_PACKS:
+                continue
+            entries = self._shards[prefix]
+            kept = list(entries.items())[-MAX_SHARD_ENTRIES:]
+            merged_path = self.__write_pack(shard_dir, dict(kept))
+            if merged_path is None:
+                continue
+            # packs written by others meanwhile are kept, they are merged later
+            for path in packs:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._packs[prefix] = [merged_path]
+
+    @staticmethod
+    def __write_pack(shard_dir: str, entries: Dict[str, Any]) -> Union[str, None]:
+        name = '%s%d-%s' % (_PACK_PREFIX, os.getpid(), os.urandom(8).hex())
+        pack_path = os.path.join(shard_dir, name + _PACK_SUFFIX)
+        tmp_path = os.path.join(shard_dir, name + '.tmp')
+        try:
+            os.makedirs(shard_dir, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': METADATA_CACHE_FORMAT_VERSION, 'entries': entries},
+                          f, separators=(',', ':'))
+            os.replace(tmp_path, pack_path)
+        except OSError:
+            return None
+        return pack_path
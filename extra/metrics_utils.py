@@ -0,0 +1,124 @@
+import os
+import time
+from typing import Dict, List, Tuple, Union
+
+# prefix of all exported metric names
+METRIC_PREFIX = 'pip_autoremove_'
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class AnalysisMetrics(object):
+    """
+    Gauges of one analysis run in Prometheus text format, written
+    as a file for the textfile collector of node_exporter.
+    """
+
+    def __init__(self):
+        # name -> (help, samples of (labels, value)) in order of addition
+        self._metrics = dict()  # type: Dict[str, Tuple[str, List[Tuple[Dict[str, str], float]]]]
+
+    def set(self, name: str, value: float, help_text: str,
+            labels: Dict[str, str] = None):
+        """
+        Sets the sample of the gauge, name is given without METRIC_PREFIX.
+        """
+        _, samples = self._metrics.setdefault(name, (help_text, list()))
+        labels = dict(labels or {})
+        for i, (sample_labels, _) in enumerate(samples):
+            if sample_labels == labels:
+                samples[i] = (labels, value)
+                return
+        samples.append((labels, value))
+
+    def get(self, name: str, labels: Dict[str, str] = None) -> Union[float, None]:
+        for sample_labels, value in self._metrics.get(name, ('', []))[1]:
+            if sample_labels == dict(labels or {}):
+                return value
+        return None
+
+    def set_cache(self, cache: str, hits: int, misses: int):
+        """
+        Sets hits, misses and hit ratio (if anything was looked up) of the cache.
+        """
+        labels = {'cache': cache}
+        self.set('cache_hits', hits, "Lookups found in the cache.", labels)
+        self.set('cache_misses', misses, "Lookups missing in the cache.", labels)
+        if hits + misses:
+            self.set('cache_hit_ratio', hits / float(hits + misses),
+                     "Share of lookups found in the cache.", labels)
+
+    def format(self) -> str:
+        lines = list()
+        for name, (help_text, samples) in self._metrics.items():
+            full_name = METRIC_PREFIX + name
+            lines.append('# HELP %s %s' % (full_name, help_text))
+            lines.append('# TYPE %s gauge' % full_name)
+            for labels, value in samples:
+                label_str = ','.join('%s="%s"' % (key, _escape_label_value(str(val)))
+                                     for key, val in sorted(labels.items()))
+                lines.append('%s%s %s' % (full_name, '{%s}' % label_str if label_str else '',
+                                          _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: str):
+        """
+        Writes metrics atomically, so the collector never reads a partial file.
+        """
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(self.format())
+        os.replace(tmp_path, path)
+
+
+def collect_analysis_metrics(import_utils_lib, analysis, start=(),
+                             dead=None, cut_edges=None) -> AnalysisMetrics:
+    """
+    Returns metrics of the BudgetedAnalysis of the ImportUtils: counts,
+    phase durations and hit ratios of caches used by the run.
+    :param dead: freed packages reported to the user (whitelist excluded),
+        the dead ones of the analysis by default.
+    """
+    metrics = AnalysisMetrics()
+    metrics.set('packages', len(import_utils_lib.get_installed_distributions()),
+                "Installed distributions.")
+    metrics.set('leaves', len(analysis.leaves),
+                "Distributions not required by others (definite ones if partial).")
+    if start:
+        dead = analysis.dead if dead is None else dead
+        metrics.set('reclaimable_packages', len(dead),
+                    "Distributions freed by removal of the given ones.")
+        metrics.set('reclaimable_bytes', sum(d.installed_size() or 0 for d in dead),
+                    "Installed size of the freed distributions.")
+    if cut_edges is not None:
+        metrics.set('cycle_edges_cut', len(cut_edges),
+                    "Requirement edges removed to break cycles.")
+    metrics.set('analysis_complete', analysis.complete,
+                "1 if the analysis finished within the time budget.")
+    for phase, duration in analysis.phase_durations.items():
+        metrics.set('phase_duration_seconds', duration,
+                    "Duration of the analysis phase.", {'phase': phase})
+    metrics.set('duration_seconds', sum(analysis.phase_durations.values()),
+                "Duration of the whole analysis.")
+    marker_evaluator = import_utils_lib.marker_evaluator
+    if marker_evaluator is None:
+        from extra.marker_utils import get_default_marker_evaluator
+        marker_evaluator = get_default_marker_evaluator()
+    metrics.set_cache('marker', marker_evaluator.hits, marker_evaluator.misses)
+    for cache_name, cache in (('layer', import_utils_lib.layer_cache),
+                              ('metadata', import_utils_lib.metadata_cache)):
+        if cache is not None:
+            metrics.set_cache(cache_name, cache.hits, cache.misses)
+    metrics.set('last_run_timestamp_seconds', int(time.time()),
+                "Unix time of the analysis.")
+    return metrics
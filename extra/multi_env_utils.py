@@ -0,0 +1,158 @@
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Union, Any
+
+from extra.extra_utils import get_requirements_graph
+from extra.graph_utils import get_graph_leaves
+from extra.importlib_utils import ImportUtils, ImportUtilsFactory, ImportUtilsPkgResources
+from extra.marker_utils import MarkerEvaluator
+
+# prints sys.path, prefixes and the marker environment (the keys of
+# packaging.markers.default_environment) without importing packaging
+_ENVIRONMENT_SCRIPT = """
+import json, os, platform, sys
+def full_version(info):
+    version = '%d.%d.%d' % (info[0], info[1], info[2])
+    if info[3] != 'final':
+        version += info[3][0] + str(info[4])
+    return version
+implementation = getattr(sys, 'implementation', None)
+markers = {
+    'implementation_name': implementation.name if implementation else '',
+    'implementation_version': full_version(implementation.version) if implementation else '0',
+    'os_name': os.name,
+    'platform_machine': platform.machine(),
+    'platform_python_implementation': platform.python_implementation(),
+    'platform_release': platform.release(),
+    'platform_system': platform.system(),
+    'platform_version': platform.version(),
+    'python_full_version': platform.python_version(),
+    'python_version': '.'.join(platform.python_version_tuple()[:2]),
+    'sys_platform': sys.platform,
+}
+print(json.dumps([sys.path, sys.prefix, getattr(sys, 'base_prefix', sys.prefix), markers]))
+"""
+
+
+def is_interpreter(environment: str) -> bool:
+    return os.path.isfile(environment) and os.access(environment, os.X_OK)
+
+
+def get_environment_paths(environment: str) -> List[str]:
+    """
+    Returns paths searched for distributions in the environment.
+    The environment is either a site-packages directory
+    or a python interpreter executable.
+    """
+    return get_environment_layout(environment)[0]
+
+
+def get_environment_layout(environment: str) \
+        -> Tuple[List[str], List[str], Union[Dict[str, str], None]]:
+    """
+    Returns paths searched for distributions in the environment,
+    the ones of them which belong to the base interpreter of the virtual
+    environment (immutable layers shared with other environments)
+    and the marker environment of the interpreter (None for directories,
+    markers of the running interpreter are used for them).
+    """
+    if not is_interpreter(environment):
+        if not os.path.isdir(environment):
+            raise ValueError("Environment \"%s\" is neither a directory "
+                             "nor an interpreter." % environment)
+        return [environment], [], None
+    output = subprocess.check_output([environment, '-c', _ENVIRONMENT_SCRIPT])
+    paths, prefix, base_prefix, markers = json.loads(output.decode('utf-8'))
+    # '' is the working directory of the subprocess, not a part of environment
+    paths = [path for path in paths if path and os.path.exists(path)]
+    layers = list()
+    if os.path.realpath(prefix) != os.path.realpath(base_prefix):
+        base_prefix = os.path.realpath(base_prefix)
+        layers = [path for path in paths
+                  if os.path.realpath(path).startswith(base_prefix + os.sep)]
+    return paths, layers, markers
+
+
+def _set_marker_environment(import_utils_lib: ImportUtils, environment: str,
+                           markers: Dict[str, str]):
+    """
+    Makes the backend evaluate requirement markers for the interpreter
+    of the environment instead of the running one.
+    Raises ValueError if the backend cannot do it.
+    """
+    if isinstance(import_utils_lib, ImportUtilsPkgResources):
+        # pkg_resources evaluates markers itself for the running interpreter
+        if os.path.realpath(environment) != os.path.realpath(sys.executable):
+            raise ValueError("The pkg_resources backend cannot evaluate requirement "
+                             "markers of another interpreter \"%s\"." % environment)
+        return
+    import_utils_lib.marker_evaluator = MarkerEvaluator(markers)
+
+
+def analyze_environment(environment: str, include_extras: bool = False,
+                        layer_cache_dir: str = None,
+                        metadata_cache_dir: str = None) -> Dict[str, Any]:
+    """
+    Lists leaves of the environment. Runs in a worker process,
+    so the result contains only plain data.
+    :param layer_cache_dir: directory of LayerCache for site-packages
+        of the base interpreter, None disables the cache.
+    :param metadata_cache_dir: directory of MetadataCache shared by
+        environments, None disables the cache.
+    """
+    result = {
+        'environment': environment,
+        'paths': [],
+        'distributions_count': 0,
+        'leaves': [],
+        'error': None,
+    }
+    try:
+        paths, layers, markers = get_environment_layout(environment)
+        layer_cache = None
+        if layer_cache_dir:
+            from extra.layer_cache_utils import LayerCache
+            layer_cache = LayerCache(layer_cache_dir, layers)
+        metadata_cache = None
+        if metadata_cache_dir:
+            from extra.metadata_cache_utils import MetadataCache
+            metadata_cache = MetadataCache(metadata_cache_dir)
+        import_utils_lib = ImportUtilsFactory.create(paths, layer_cache, metadata_cache)
+        if markers is not None:
+            _set_marker_environment(import_utils_lib, environment, markers)
+        graph = get_requirements_graph(import_utils_lib, include_extras)
+    except Exception as e:
+        result['error'] = "%s: %s" % (type(e).__name__, e)
+        return result
+    result['paths'] = paths
+    result['distributions_count'] = len(graph)
+    leaves = sorted(get_graph_leaves(graph), key=lambda d: d.name_general)
+    result['leaves'] = [
+        {'name': d.name, 'version': d.version, 'location': d.lib_path_location}
+        for d in leaves]
+    return result
+
+
+def analyze_environments(environments: List[str], include_extras: bool = False,
+                         jobs: int = None, layer_cache_dir: str = None,
+                         metadata_cache_dir: str = None) -> List[Dict[str, Any]]:
+    """
+    Analyzes environments in parallel worker processes.
+    Results are merged in the order of given environments.
+    """
+    if not environments:
+        return []
+    jobs = jobs or min(len(environments), os.cpu_count() or 1)
+    if jobs < 2 or len(environments) < 2:
+        return [analyze_environment(env, include_extras, layer_cache_dir,
+                                    metadata_cache_dir)
+                for env in environments]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(
+            analyze_environment, environments,
+            [include_extras] * len(environments),
+            [layer_cache_dir] * len(environments),
+            [metadata_cache_dir] * len(environments)))
@@ -0,0 +1,125 @@
+import os
+from typing import Iterator, List, Set, Tuple, Union
+
+from extra.discovery_utils import normalize_name
+from extra.importlib_utils import ImportUtils, DistributionInfo, \
+    get_requirement_general_name
+from extra.marker_utils import MarkerEvaluator, get_default_marker_evaluator
+
+# options with a value which do not name packages (pip requirements file format)
+_IGNORED_OPTIONS = ('-c', '--constraint', '-i', '--index-url', '--extra-index-url',
+                    '-f', '--find-links', '--no-index', '--prefer-binary',
+                    '--trusted-host', '--use-feature', '--pre', '--only-binary',
+                    '--no-binary', '--require-hashes')
+_INCLUDE_OPTIONS = ('-r', '--requirement')
+_EDITABLE_OPTIONS = ('-e', '--editable')
+
+
+def _split_option(line: str) -> Tuple[str, str]:
+    if line.startswith('--'):
+        option, sep, value = line.partition('=')
+        if not sep:
+            option, _, value = line.partition(' ')
+    else:
+        option, value = line[:2], line[2:]
+    return option.strip(), value.strip()
+
+
+def _strip_comment(line: str) -> str:
+    if line.startswith('#'):
+        return ''
+    index = line.find(' #')
+    if index >= 0:
+        line = line[:index]
+    return line.strip()
+
+
+def _iter_logical_lines(path: str) -> Iterator[str]:
+    """
+    Streams lines of the file with joined "\\" continuations.
+    """
+    with open(path, mode='r') as f:
+        buffer = ''
+        for line in f:
+            line = line.rstrip('\r\n')
+            if line.endswith('\\'):
+                buffer += line[:-1]
+                continue
+            yield buffer + line
+            buffer = ''
+        if buffer:
+            yield buffer
+
+
+def _is_named_requirement(requirement: str) -> bool:
+    # plain URLs and paths do not tell the name without building them
+    name = requirement.split(';')[0].split('@')[0]
+    return not (':' in name or name.startswith(('.', '/', '~')))
+
+
+def iter_requirements_file(path: str, seen: Set[str] = None) -> Iterator[str]:
+    """
+    Yields requirement strings of requirements.txt like file. Comments
+    and options are skipped, nested "-r" files are followed (once per file),
+    editable requirements are yielded by their "#egg=" name.
+    """
+    if seen is None:
+        seen = set()
+    real_path = os.path.realpath(path)
+    if real_path in seen:
+        return
+    seen.add(real_path)
+    for line in _iter_logical_lines(path):
+        line = _strip_comment(line.strip())
+        if not line:
+            continue
+        if not line.startswith('-'):
+            # per-requirement options like --hash
+            line = line.split(' --')[0].strip()
+            if _is_named_requirement(line):
+                yield line
+            continue
+        option, value = _split_option(line)
+        if option in _INCLUDE_OPTIONS:
+            if value:
+                yield from iter_requirements_file(
+                    os.path.join(os.path.dirname(path), value), seen)
+        elif option in _EDITABLE_OPTIONS:
+            _, _, egg = value.partition('#egg=')
+            if egg:
+                yield egg.split('&')[0]
+        elif option not in _IGNORED_OPTIONS:
+            raise ValueError("Unsupported option \"%s\" in \"%s\"." % (option, path))
+
+
+def load_requirements_file(import_utils_lib: ImportUtils, path: str,
+                           marker_evaluator: Union[MarkerEvaluator, None] = None) \
+        -> Tuple[List[DistributionInfo], List[str]]:
+    """
+    Resolves all requirements of the file against installed distributions
+    in one pass, names are compared in PEP 503 form (like pip does,
+    "zope.interface" is "zope-interface"). Requirements with markers false for the environment
+    are skipped. Returns found distributions (without duplicates, in order
+    of the file) and names which are not installed.
+    """
+    marker_evaluator = marker_evaluator or import_utils_lib.marker_evaluator or \
+        get_default_marker_evaluator()
+    index = dict((normalize_name(dist.name_general), dist)
+                 for dist in import_utils_lib.get_installed_distributions())
+    found = dict()
+    missing = dict()
+    for requirement in iter_requirements_file(path):
+        name_general = get_requirement_general_name(requirement)
+        if not name_general:
+            continue
+        name_general = normalize_name(name_general)
+        if name_general in found:
+            continue
+        if not marker_evaluator.evaluate_requirement(requirement):
+            continue
+        dist = index.get(name_general)
+        if dist is None:
+            missing.setdefault(name_general, requirement.split(';')[0].strip())
+            continue
+        found[name_general] = dist
+    return list(found.values()), list(missing.values())
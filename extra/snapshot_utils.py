@@ -0,0 +1,196 @@
+import json
+import os
+import platform
+import sys
+import time
+import weakref
+from typing import List, Tuple, Union, Dict, Any
+
+from extra.binary_graph_utils import BinaryGraph, is_binary_graph
+from extra.importlib_utils import ImportUtils, DistributionInfo, RequirementInfo
+from extra.marker_utils import MarkerEvaluator
+
+SNAPSHOT_FORMAT = 'pip-autoremove-snapshot'
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def make_snapshot(import_utils_lib: ImportUtils) -> Dict[str, Any]:
+    """
+    Serializes installed distributions and their parsed requirements
+    into plain data.
+    """
+    distributions = list()
+    for dist in import_utils_lib.get_installed_distributions():
+        distributions.append({
+            'name': dist.name,
+            'version': dist.version,
+            'location': dist.lib_path_location,
+            'extras': list(dist.available_extras or []),
+            'requires': dist.raw_requirements(),
+            'size': dist.installed_size(),
+            'requirements': [{
+                'name': req.name,
+                'enabled_extras': list(req.enabled_extras or []),
+                'condition_extra': req.condition_extra,
+            } for req in dist.requirements or []],
+        })
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_FORMAT_VERSION,
+        'created': int(time.time()),
+        'python_version': platform.python_version(),
+        'executable': sys.executable,
+        'paths': import_utils_lib.paths,
+        'distributions': distributions,
+    }
+
+
+def export_snapshot(import_utils_lib: ImportUtils, path: str):
+    """
+    Writes snapshot of the environment to the file.
+    """
+    snapshot = make_snapshot(import_utils_lib)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str) -> Dict[str, Any]:
+    """
+    Loads the snapshot file or the binary graph file of binary_graph_utils.
+    """
+    if is_binary_graph(path):
+        with BinaryGraph(path) as graph:
+            return graph.to_snapshot()
+    with open(path, 'r') as f:
+        try:
+            snapshot = json.load(f)
+        except ValueError:
+            # not JSON (or not text at all)
+            snapshot = None
+    if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError("File \"%s\" is not a pip-autoremove snapshot." % path)
+    if snapshot.get('version') != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError("Unsupported snapshot version %s in \"%s\"." % (
+            snapshot.get('version'), path))
+    return snapshot
+
+
+def _is_valid_requirement_record(req_record: Any) -> bool:
+    """
+    Requirement records have a name and condition_extra which is None
+    for base requirements or the name of the extra.
+    """
+    if not isinstance(req_record, dict) or not req_record.get('name') or \
+            'condition_extra' not in req_record:
+        return False
+    condition_extra = req_record['condition_extra']
+    return condition_extra is None or (isinstance(condition_extra, str) and
+                                       bool(condition_extra))
+
+
+class ImportUtilsSnapshot(ImportUtils):
+    """
+    Implementation of ImportUtils over the environment snapshot
+    created by export_snapshot.
+    """
+
+    def __init__(self, snapshot: Union[str, Dict[str, Any]],
+                 marker_environment: Dict[str, str] = None):
+        """
+        :param marker_environment: when given, requirement markers are
+            evaluated again against it (see marker_utils.make_python_environment),
+            otherwise requirements evaluated at export time are used.
+        """
+        super(self.__class__, self).__init__()
+        if isinstance(snapshot, str):
+            self.snapshot_path = snapshot
+            snapshot = load_snapshot(snapshot)
+        else:
+            self.snapshot_path = None
+        self._snapshot = snapshot
+        self._paths = list(snapshot.get('paths') or [])
+        # (distribution name, requirement record) skipped as malformed
+        self.malformed_requirements = list()  # type: List[Tuple[str, Any]]
+        if marker_environment is not None:
+            self.marker_evaluator = MarkerEvaluator(marker_environment)
+
+    @property
+    def snapshot(self) -> Dict[str, Any]:
+        return self._snapshot
+
+    def get_installed_distributions(self) -> List[DistributionInfo]:
+        if self._known_dists:
+            return list(self._known_dists.values())
+        distributions = list()
+        for record in self._snapshot['distributions']:
+            if not record.get('name'):
+                continue
+            distributions.append(self.__DistributionInfoSnapshot(self, record))
+        distributions = list(sorted(distributions, key=lambda x: x.name_general))
+        self._known_dists = {d.name_general: d for d in distributions}
+        return self.get_installed_distributions()
+
+    def _get_requirement_dependencies(self, record) -> List[RequirementInfo]:
+        requirements = list()
+        if self.marker_evaluator is not None and record.get('requires') is not None:
+            for req_raw in record['requires']:
+                try:
+                    requirements.append(self.get_requirement(req_raw))
+                except (RequirementInfo.SatisfyException,
+                        self.InstalledDependencyNotFound):
+                    continue
+            return list(sorted(requirements, key=lambda x: x.name_general))
+        for req_record in record.get('requirements') or []:
+            if not _is_valid_requirement_record(req_record):
+                # a lost condition must not turn an extras edge into a base one
+                self.malformed_requirements.append((record['name'], req_record))
+                continue
+            requirement = (RequirementInfo.Builder()
+                           .name(req_record['name'])
+                           .enabled_extras(list(req_record.get('enabled_extras') or []))
+                           .condition_extra(req_record['condition_extra'])
+                           ).build()
+            if requirement.name_general not in self._known_dists:
+                continue
+            requirements.append(requirement)
+        requirements = list(sorted(
+            requirements, key=lambda x: x.name_general))
+        return requirements
+
+    class __DistributionInfoSnapshot(DistributionInfo):
+        __slots__ = ('__import_utils_lib', '__record')
+
+        def __init__(self, import_utils_lib: 'ImportUtilsSnapshot', record):
+            super(self.__class__, self).__init__()
+            self.__import_utils_lib = weakref.ref(import_utils_lib)
+            self.__record = record
+            self._set_name(record['name'])
+            self._version = record.get('version')
+            self._lib_path_location = record.get('location')
+            self._available_extras = list(record.get('extras') or [])
+
+        def get_import_utils_lib(self) -> 'ImportUtilsSnapshot':
+            lib = self.__import_utils_lib()
+            if not lib:
+                raise Exception("ImportUtils was nulled (weak reference).")
+            return lib
+
+        @property
+        def requirements(self) -> List['RequirementInfo']:
+            if self._requirements is None:
+                self._requirements = \
+                    self.get_import_utils_lib()._get_requirement_dependencies(
+                        self.__record)
+            return super(self.__class__, self).requirements
+
+        def raw_requirements(self) -> Union[List[str], None]:
+            requirements_raw = self.__record.get('requires')
+            return list(requirements_raw) if requirements_raw is not None else None
+
+        def installed_size(self) -> Union[int, None]:
+            return self.__record.get('size')
+
+        def __str__(self):
+            return super(self.__class__, self).__str__()
@@ -0,0 +1,85 @@
+import time
+from typing import List, Set, Tuple, Union, Callable, Iterator
+
+from extra.extra_utils import get_requirements_graph, patch_requirements_graph
+from extra.graph_utils import get_graph_leaves, find_dead_nodes
+from extra.importlib_utils import ImportUtils, DistributionInfo, DistributionsDelta, \
+    get_path_mtime
+
+
+class WatchEvent(object):
+    """
+    Changes of the environment found by iter_watch_events.
+    """
+
+    def __init__(self, delta: DistributionsDelta,
+                 new_leaves: List[DistributionInfo] = None,
+                 orphaned: List[DistributionInfo] = None,
+                 dead: List[DistributionInfo] = None):
+        self.delta = delta
+        # leaves which were not leaves on the previous tick (installed ones too)
+        self.new_leaves = new_leaves or list()
+        # new leaves which were required before
+        self.orphaned = orphaned or list()
+        # packages freed by removal of orphaned ones
+        self.dead = dead or list()
+
+    def __bool__(self):
+        return bool(self.new_leaves or self.orphaned or self.dead)
+
+    def __str__(self):
+        return ("WatchEvent(new_leaves=" + str([d.name for d in self.new_leaves]) +
+                ", orphaned=" + str([d.name for d in self.orphaned]) +
+                ", dead=" + str([d.name for d in self.dead]) + ")")
+
+
+def get_paths_stamp(paths: List[str]) -> Tuple[Union[int, None], ...]:
+    """
+    Returns modification times of the path entries, installation
+    or removal of a distribution changes the mtime of its directory.
+    """
+    return tuple(get_path_mtime(path) for path in paths)
+
+
+def _sorted(dists) -> List[DistributionInfo]:
+    return sorted(dists, key=lambda d: d.name_general)
+
+
+def iter_watch_events(import_utils_lib: ImportUtils, include_extras: bool = False,
+                      interval: float = 2.0, ticks: int = None,
+                      sleep: Callable[[float], None] = time.sleep,
+                      exclude: Set[str] = ()) -> Iterator[WatchEvent]:
+    """
+    Polls path entries of the environment every interval seconds and yields
+    an event when leaves or dead packages change. While nothing changes
+    a tick only stats the path entries, otherwise the known distributions
+    are refreshed and the graph is patched incrementally.
+    :param ticks: count of polls, None means forever.
+    :param exclude: general names never reported as dead (like whitelist).
+    """
+    graph = get_requirements_graph(import_utils_lib, include_extras)
+    leaf_names = set(d.name_general for d in get_graph_leaves(graph))
+    paths = import_utils_lib.paths
+    stamp = get_paths_stamp(paths)
+    tick = 0
+    while ticks is None or tick < ticks:
+        tick += 1
+        sleep(interval)
+        new_stamp = get_paths_stamp(paths)
+        if new_stamp == stamp:
+            continue
+        stamp = new_stamp
+        delta = import_utils_lib.refresh_known_distributions()
+        if not delta:
+            continue
+        patch_requirements_graph(import_utils_lib, graph, delta, include_extras)
+        leaves = get_graph_leaves(graph)
+        added_names = set(d.name_general for d in delta.added)
+        new_leaves = [d for d in leaves if d.name_general not in leaf_names]
+        orphaned = [d for d in new_leaves if d.name_general not in added_names]
+        dead = find_dead_nodes(graph, orphaned) - set(orphaned)
+        dead = [d for d in dead if d.name_general not in exclude]
+        leaf_names = set(d.name_general for d in leaves)
+        event = WatchEvent(delta, _sorted(new_leaves), _sorted(orphaned), _sorted(dead))
+        if event:
+            yield event
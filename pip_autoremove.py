@@ -1,13 +1,12 @@
 from __future__ import print_function
 
-import optparse
-import subprocess
 import sys
 
 from typing import List
 
 from extra import importlib_utils
-from extra.extra_utils import optional_distributions_required, get_requirements_graph
+from extra.extra_utils import get_requirements_graph, get_partial_requirements_graph, \
+    get_extras_index
 from extra.graph_utils import get_graph_leaves, remove_graph_nodes
 from extra.importlib_utils import DistributionInfo
 
@@ -19,15 +18,39 @@ try:
 except NameError:
     pass
 
-import_utils_lib = importlib_utils.ImportUtilsFactory.create()
+# ImportUtils of the current environment, created on first use
+# (see get_import_utils_lib), so importing the module does not scan anything
+_import_utils_lib = None
+
+
+def get_import_utils_lib(lib=None) -> importlib_utils.ImportUtils:
+    """
+    Returns given ImportUtils or the one of the current environment.
+    """
+    global _import_utils_lib
+    if lib is not None:
+        return lib
+    if _import_utils_lib is None:
+        _import_utils_lib = importlib_utils.ImportUtilsFactory.create()
+    return _import_utils_lib
+
+
+def __getattr__(name):
+    # keeps "pip_autoremove.import_utils_lib" working for library users
+    if name == 'import_utils_lib':
+        return get_import_utils_lib()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 WHITELIST = ['pip', 'packaging' if sys.version_info >= (3, 8) else 'setuptools',
              'pip3-autoremove']
 
 
-def autoremove(names, yes=False, remove_extra=False):
+def autoremove(names, yes=False, remove_extra=False, time_budget=None,
+               metrics_file=None, dists=()):
     # names_to_remove = list(names)
-    dead_base_distributions = list_dead(names, remove_extras=remove_extra)
+    dead_base_distributions = list_dead(names, remove_extras=remove_extra,
+                                        time_budget=time_budget,
+                                        metrics_file=metrics_file, dists=dists)
     dead_extras = set()
     # if remove_extra:
     #     dead_extras = list_dead_extras(dead_base_distributions)
@@ -37,26 +60,57 @@ def autoremove(names, yes=False, remove_extra=False):
         remove_dists(dead_distributions)
 
 
-def list_dead(names, remove_extras=False):
-    start = set()
+def list_dead(names, remove_extras=False, lib=None, time_budget=None,
+              metrics_file=None, dists=()):
+    """
+    :param dists: distributions already resolved (like the ones of
+        a requirements file), they are removed together with the names.
+    """
+    lib = get_import_utils_lib(lib)
+    budget = None
+    if time_budget is not None or metrics_file:
+        from extra.budget_utils import TimeBudget
+        budget = TimeBudget(time_budget)
+    start = set(dists)
     for name in names:
         try:
-            start.add(import_utils_lib.get_distribution(name))
-        except import_utils_lib.InstalledDependencyNotFound:
+            start.add(lib.get_distribution(name))
+        except lib.InstalledDependencyNotFound:
             print("%s is not an installed pip module, skipping" % name,
                   file=sys.stderr)
-    installed_distributions = import_utils_lib.get_installed_distributions()
-    graph = get_requirements_graph(import_utils_lib, remove_extras)
-    dead = exclude_whitelist(find_all_dead(graph, start))
-    if remove_extras:
-        dead = exclude_whitelist(dead)
+    installed_distributions = lib.get_installed_distributions()
+    if budget is not None:
+        from extra.budget_utils import analyze_with_budget
+        cut_edges = list()
+        analysis = analyze_with_budget(lib, start, remove_extras, budget, cut_edges)
+        dead = exclude_whitelist(analysis.dead)
+        report_budget(analysis, "only packages surely freed are listed")
+        write_metrics(metrics_file, lib, analysis, start, dead, cut_edges)
+    else:
+        dead = get_dead(start, remove_extras, lib=lib)
     # b: importlib_utils.ImportUtils
     for d in start:
-        show_tree(d, dead, installed_distributions, include_extras=True)
+        show_tree(d, dead, installed_distributions, include_extras=True, lib=lib)
     return dead
 
 
+def get_dead(start, remove_extras=False, lib=None):
+    """
+    Returns distributions freed by removal of the start ones
+    (without whitelisted ones), nothing is printed.
+    """
+    lib = get_import_utils_lib(lib)
+    start = set(start)
+    graph = get_partial_requirements_graph(lib, start, remove_extras)
+    if len(start) == 1:
+        # freed packages of a single one are its subtree in the dominator tree
+        from extra.dominator_utils import DominatorIndex
+        return exclude_whitelist(DominatorIndex(graph).dominated(next(iter(start))))
+    return exclude_whitelist(find_all_dead(graph, start))
+
+
 def list_dead_extras(dead_base_distributions):
+    import_utils_lib = get_import_utils_lib()
     installed_distributions = import_utils_lib.get_installed_distributions()
     graph = get_requirements_graph(import_utils_lib, installed_distributions)
     dead_distribution_by_base = exclude_whitelist(
@@ -64,14 +118,10 @@ def list_dead_extras(dead_base_distributions):
     graph_without_base = remove_graph_nodes(graph, dead_distribution_by_base)
     leaf_nodes = get_graph_leaves(graph_without_base)
     leaf_extra_nodes = set()
-    restricted_extras_like = ['dev', 'test', 'doc']
+    extras_index = get_extras_index(import_utils_lib)
     for dist in dead_distribution_by_base:
-        allowed_extras = list(filter(
-            lambda e: not any(
-                [restricted in e for restricted in restricted_extras_like]
-            ), dist.available_extras))
-        optional_distributions = exclude_whitelist(optional_distributions_required(
-            import_utils_lib, dist, allowed_extras))
+        optional_distributions = exclude_whitelist(
+            extras_index.optional_required(dist))
         for optional_dist in optional_distributions:
             if optional_dist in leaf_nodes:
                 leaf_extra_nodes.add(optional_dist)
@@ -85,19 +135,30 @@ def exclude_whitelist(dists):
 
 
 def show_tree(dist, dead, installed_distributions, indent=0, visited=None,
-              include_extras=False):
+              include_extras=False, lib=None):
     if visited is None:
         visited = set()
     if dist in visited:
         return
-    visited.add(dist)
-    print(' ' * 4 * indent, end='')
-    show_dist(dist)
-
-    for req in requires(dist, installed_distributions):
-        if req in dead:
-            show_tree(req, dead, installed_distributions, indent + 1, visited,
-                      include_extras=include_extras)
+    installed_names = set(x.name.lower() for x in installed_distributions)
+
+    def enter(d, level):
+        visited.add(d)
+        print(' ' * 4 * level, end='')
+        show_dist(d)
+        return iter(requires(d, installed_distributions, lib=lib,
+                             installed_names=installed_names))
+
+    # explicit stack, chains of dead packages may be deeper than the recursion limit
+    stack = [(indent, enter(dist, indent))]
+    while stack:
+        level, reqs = stack[-1]
+        for req in reqs:
+            if req in dead and req not in visited:
+                stack.append((level + 1, enter(req, level + 1)))
+                break
+        else:
+            stack.pop()
 
 
 def find_all_dead(graph, start):
@@ -138,8 +199,13 @@ def remove_dists(dists):
     #     pip_cmd = [sys.executable, '-m', 'pip']
     # else:
     #     pip_cmd = ['pip']
-    pip_cmd = [sys.executable, '-m', 'pip']
-    subprocess.check_call(pip_cmd + ["uninstall", "-y"] + [d.name_general for d in dists])
+    import subprocess
+    subprocess.check_call(get_uninstall_command(dists))
+
+
+def get_uninstall_command(dists, python=None):
+    pip_cmd = [python or sys.executable, '-m', 'pip']
+    return pip_cmd + ["uninstall", "-y"] + [d.name_general for d in dists]
 
 
 def get_graph(installed_distributions):
@@ -153,10 +219,17 @@ def get_graph(installed_distributions):
     return g
 
 
-def requires(dist: DistributionInfo, installed_dists: List[DistributionInfo]):
+def requires(dist: DistributionInfo, installed_dists: List[DistributionInfo],
+             lib=None, installed_names=None):
+    """
+    :param installed_names: lowercase names of installed_dists,
+        given when the function is called for many distributions.
+    """
+    lib = get_import_utils_lib(lib)
     required = []
-    installed_dependencies_names = list(
-        x.name.lower() for x in installed_dists)
+    installed_dependencies_names = installed_names
+    if installed_dependencies_names is None:
+        installed_dependencies_names = set(x.name.lower() for x in installed_dists)
     requirements = dist.requirements_filter()
     for pkg in requirements:
         try:
@@ -167,12 +240,12 @@ def requires(dist: DistributionInfo, installed_dists: List[DistributionInfo]):
             if pkg.name.lower() == dist.name.lower():
                 # Recursive
                 continue
-            required.append(import_utils_lib.get_distribution(pkg.name_general))
+            required.append(lib.get_distribution(pkg.name_general))
         # except pkg_resources.VersionConflict as e:
         #     print(e.report(), file=sys.stderr)
         #     print("Redoing requirement with just package name...", file=sys.stderr)
         #     required.append(pkg_resources.get_distribution(pkg.project_name))
-        except import_utils_lib.InstalledDependencyNotFound as e:
+        except lib.InstalledDependencyNotFound as e:
             print(e, file=sys.stderr)
             print("Skipping %s" % pkg.name, file=sys.stderr)
     return required
@@ -181,30 +254,146 @@ def requires(dist: DistributionInfo, installed_dists: List[DistributionInfo]):
 def main(argv=None):
     parser = create_parser()
     (opts, args) = parser.parse_args(argv)
-    if opts.leaves or opts.freeze:
-        list_leaves(opts.freeze, include_extras=opts.include_extras)
+    if opts.environments:
+        # --env only lists leaves (-L or -f) of the environments
+        incompatible = [option for option, value in (
+            ('-l', opts.list), ('-y', opts.yes), ('-r', opts.read_file),
+            ('--watch', opts.watch), ('--why', opts.why),
+            ('--unused-in', opts.unused_in), ('--impact', opts.impact),
+            ('--batch', opts.batch), ('--time-budget', opts.time_budget is not None),
+            ('--metrics-file', opts.metrics_file), ('--snapshot', opts.snapshots),
+            ('--diff', opts.diff), ('--export-snapshot', opts.export_snapshot),
+            ('--export-graph', opts.export_graph)) if value]
+        if incompatible:
+            parser.error("--env cannot be combined with %s" % ', '.join(incompatible))
+        if args:
+            parser.error("--env only lists leaves, packages cannot be given: %s" %
+                         ' '.join(args))
+    if opts.snapshots:
+        # saved environments are only queried, they cannot be changed or watched
+        incompatible = [option for option, value in (
+            ('-y', opts.yes), ('-r', opts.read_file), ('--watch', opts.watch),
+            ('--unused-in', opts.unused_in),
+            ('--time-budget', opts.time_budget is not None),
+            ('--metrics-file', opts.metrics_file), ('--diff', opts.diff),
+            ('--export-snapshot', opts.export_snapshot),
+            ('--export-graph', opts.export_graph)) if value]
+        if incompatible:
+            parser.error("--snapshot cannot be combined with %s" % ', '.join(incompatible))
+    # saved environments are analyzed without reading METADATA
+    scans_environment = not (opts.diff or opts.snapshots)
+    layer_cache_dir = None
+    if scans_environment and not opts.no_layer_cache:
+        from extra.layer_cache_utils import LayerCache, get_default_layer_cache_dir
+        layer_cache_dir = get_default_layer_cache_dir()
+        get_import_utils_lib().layer_cache = LayerCache(layer_cache_dir)
+    metadata_cache_dir = None
+    if scans_environment and not opts.no_metadata_cache:
+        from extra.metadata_cache_utils import MetadataCache, \
+            get_default_metadata_cache_dir
+        metadata_cache_dir = opts.metadata_cache_dir or get_default_metadata_cache_dir()
+        get_import_utils_lib().metadata_cache = MetadataCache(metadata_cache_dir)
+    if opts.export_snapshot or opts.export_graph:
+        if opts.export_snapshot:
+            from extra.snapshot_utils import export_snapshot
+            export_snapshot(get_import_utils_lib(), opts.export_snapshot)
+        if opts.export_graph:
+            from extra.binary_graph_utils import write_binary_graph
+            write_binary_graph(get_import_utils_lib(), opts.export_graph)
+    elif opts.diff:
+        diff_snapshots(opts.diff[0], opts.diff[1], include_extras=opts.include_extras)
+    elif opts.environments:
+        list_environments_leaves(opts.environments, opts.freeze,
+                                 include_extras=opts.include_extras, jobs=opts.jobs,
+                                 layer_cache_dir=layer_cache_dir,
+                                 metadata_cache_dir=metadata_cache_dir)
+    elif opts.snapshots:
+        from extra.snapshot_utils import ImportUtilsSnapshot
+        marker_environment = None
+        if opts.python_version:
+            import os
+            from extra.binary_graph_utils import is_binary_graph
+            from extra.marker_utils import make_python_environment
+            # binary graphs keep edges evaluated by the exporting interpreter, not markers
+            binary_graphs = [path for path in opts.snapshots
+                             if os.path.isfile(path) and is_binary_graph(path)]
+            if binary_graphs:
+                parser.error("--python-version cannot be used with binary graphs: %s" %
+                             ', '.join(binary_graphs))
+            try:
+                marker_environment = make_python_environment(opts.python_version)
+            except ValueError as e:
+                parser.error("--python-version: %s" % e)
+        for snapshot_path in opts.snapshots:
+            if len(opts.snapshots) > 1:
+                print('# %s' % snapshot_path)
+            try:
+                lib = ImportUtilsSnapshot(snapshot_path, marker_environment)
+            except (OSError, ValueError) as e:
+                print(e, file=sys.stderr)
+                continue
+            if opts.leaves or opts.freeze:
+                list_leaves(opts.freeze, include_extras=opts.include_extras, lib=lib)
+            elif opts.batch:
+                list_batch_dead(opts.batch, include_extras=opts.include_extras, lib=lib)
+            elif opts.impact:
+                list_impact(include_extras=opts.include_extras, lib=lib)
+            elif opts.why:
+                why(opts.why, include_extras=opts.include_extras, lib=lib)
+            elif len(args) == 0:
+                parser.print_help()
+                break
+            else:
+                # snapshot cannot be changed, so names are only listed
+                list_dead(args, remove_extras=opts.include_extras, lib=lib)
+            if lib.malformed_requirements:
+                print("Skipped %d malformed requirements of %s, first in %s: %s" % (
+                    len(lib.malformed_requirements), snapshot_path,
+                    lib.malformed_requirements[0][0], lib.malformed_requirements[0][1]),
+                    file=sys.stderr)
+    elif opts.watch:
+        watch(include_extras=opts.include_extras, interval=opts.watch_interval)
+    elif opts.why:
+        why(opts.why, include_extras=opts.include_extras)
+    elif opts.unused_in:
+        list_unused(opts.unused_in, include_extras=opts.include_extras,
+                    jobs=opts.jobs, lib=get_import_utils_lib(),
+                    use_cache=not opts.no_import_cache)
+    elif opts.impact:
+        list_impact(include_extras=opts.include_extras)
+    elif opts.batch:
+        list_batch_dead(opts.batch, include_extras=opts.include_extras)
+    elif opts.leaves or opts.freeze:
+        list_leaves(opts.freeze, include_extras=opts.include_extras,
+                    time_budget=opts.time_budget, metrics_file=opts.metrics_file)
     elif opts.list:
-        list_dead(args, remove_extras=opts.include_extras)
+        list_dead(args, remove_extras=opts.include_extras, time_budget=opts.time_budget,
+                  metrics_file=opts.metrics_file)
     elif len(args) == 0:
         parser.print_help()
     elif opts.read_file:
+        from extra.requirements_file_utils import load_requirements_file
         filename = args[0]
-        total_args = args[1:]
-        file_args = []
         try:
-            with open(filename, mode='r') as f:
-                line = f.readline().rstrip('\n')
-                while line:
-                    if len(line) < 1:
-                        break
-                    file_args.append(line)
-                    line = str(f.readline()).rstrip('\n').strip()
-            total_args += file_args
-            autoremove(total_args, yes=opts.yes, remove_extra=opts.include_extras)
-        except FileNotFoundError:
-            print('File \'%s\' not found!' % filename)
+            dists, missing = load_requirements_file(get_import_utils_lib(), filename)
+        except FileNotFoundError as e:
+            # the missing one may be a nested "-r" file
+            print('File \'%s\' not found!' % (e.filename or filename))
+            return
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return
+        if missing:
+            print("%d packages of %s are not installed, skipping: %s" % (
+                len(missing), filename, ', '.join(missing)), file=sys.stderr)
+        # resolved distributions are passed as they are, their names
+        # may not be parsed back (like "zope.interface")
+        autoremove(args[1:], yes=opts.yes, remove_extra=opts.include_extras,
+                   time_budget=opts.time_budget, metrics_file=opts.metrics_file,
+                   dists=dists)
     else:
-        autoremove(args, yes=opts.yes, remove_extra=opts.include_extras)
+        autoremove(args, yes=opts.yes, remove_extra=opts.include_extras,
+                   time_budget=opts.time_budget, metrics_file=opts.metrics_file)
 
 
 def get_leaves(graph):
@@ -214,12 +403,22 @@ def get_leaves(graph):
     return filter(is_leaf, graph)
 
 
-def list_leaves(freeze=False, include_extras=False):
+def list_leaves(freeze=False, include_extras=False, lib=None, time_budget=None,
+                metrics_file=None):
     # installed_distributions = import_utils_lib.get_installed_distributions()
-    graph = get_requirements_graph(
-        import_utils_lib, include_extras)
-
-    leaves = get_graph_leaves(graph)
+    if time_budget is not None or metrics_file:
+        from extra.budget_utils import TimeBudget, analyze_with_budget
+        lib = get_import_utils_lib(lib)
+        cut_edges = list()
+        analysis = analyze_with_budget(lib, (), include_extras, TimeBudget(time_budget),
+                                       cut_edges)
+        leaves = analysis.leaves
+        report_budget(analysis, "only definite leaves are listed")
+        write_metrics(metrics_file, lib, analysis, cut_edges=cut_edges)
+    else:
+        graph = get_requirements_graph(
+            get_import_utils_lib(lib), include_extras)
+        leaves = get_graph_leaves(graph)
     for node in leaves:
         if freeze:
             show_freeze(node)
@@ -227,7 +426,189 @@ def list_leaves(freeze=False, include_extras=False):
             show_dist(node)
 
 
+def report_budget(analysis, partial_note):
+    if analysis.complete:
+        return
+    print("Time budget expired in phase \"%s\" after %.2f s, %s." % (
+        analysis.cut_phase, analysis.elapsed, partial_note), file=sys.stderr)
+
+
+def write_metrics(metrics_file, lib, analysis, start=(), dead=None, cut_edges=None):
+    if not metrics_file:
+        return
+    from extra.metrics_utils import collect_analysis_metrics
+    collect_analysis_metrics(lib, analysis, start, dead, cut_edges).write_textfile(
+        metrics_file)
+
+
+def watch(include_extras=False, interval=2.0, ticks=None, lib=None):
+    """
+    Prints new leaves, orphaned and dead packages whenever
+    the environment changes.
+    """
+    from extra.watch_utils import iter_watch_events
+    lib = get_import_utils_lib(lib)
+    try:
+        for event in iter_watch_events(lib, include_extras, interval, ticks,
+                                       exclude=set(WHITELIST)):
+            for dist in event.new_leaves:
+                print('leaf: ', end='')
+                show_dist(dist)
+            for dist in event.orphaned:
+                print('orphaned: ', end='')
+                show_dist(dist)
+            for dist in event.dead:
+                print('dead: ', end='')
+                show_dist(dist)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+
+def why(name, include_extras=False, lib=None):
+    """
+    Shows the shortest paths from leaves to the package, they tell
+    why the package is kept. Cycle edges cut in the graph are shown too.
+    """
+    from extra.graph_utils import get_shortest_paths_from_leaves, get_users_closure
+    lib = get_import_utils_lib(lib)
+    try:
+        dist = lib.get_distribution(name)
+    except lib.InstalledDependencyNotFound:
+        print("%s is not an installed pip module" % name, file=sys.stderr)
+        return []
+    cut_edges = list()
+    graph = get_requirements_graph(lib, include_extras, cut_edges)
+    paths = get_shortest_paths_from_leaves(graph, dist, key=lambda d: d.name_general)
+    paths.sort(key=lambda p: (len(p), [d.name_general for d in p]))
+    for path in paths:
+        print(' -> '.join('%s %s' % (d.name, d.version) for d in path))
+    users_closure = get_users_closure(graph, dist)
+    for requirement, user in cut_edges:
+        if requirement in users_closure:
+            print("cycle edge cut: %s -> %s" % (user.name, requirement.name))
+    return paths
+
+
+def list_impact(include_extras=False, lib=None):
+    """
+    Lists all packages ranked by count and size of packages
+    which would be freed by their removal.
+    """
+    from extra.dominator_utils import DominatorIndex
+    lib = get_import_utils_lib(lib)
+    graph = get_requirements_graph(lib, include_extras)
+    whitelisted = set(graph) - exclude_whitelist(graph)
+    impact = DominatorIndex(graph).impact(
+        lambda d: d.installed_size(), exclude=whitelisted)
+    for dist, count, size in impact:
+        print('%d %s ' % (count, format_size(size)), end='')
+        show_dist(dist)
+    return impact
+
+
+def list_batch_dead(manifest_path, include_extras=False, lib=None):
+    """
+    Lists packages freed by removal of every root set of the manifest
+    against one requirements graph.
+    """
+    from extra.batch_utils import load_manifest, evaluate_manifest
+    lib = get_import_utils_lib(lib)
+    try:
+        manifest = load_manifest(manifest_path)
+    except FileNotFoundError:
+        print('File \'%s\' not found!' % manifest_path)
+        return None
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return None
+    results = evaluate_manifest(lib, manifest, include_extras)
+    installed_distributions = lib.get_installed_distributions()
+    for result in results:
+        print('# %s' % result.name)
+        if result.missing:
+            print("%s: %s not installed, skipping" % (
+                result.name, ', '.join(result.missing)), file=sys.stderr)
+        result.dead = exclude_whitelist(result.dead)
+        for d in sorted(result.start, key=lambda dist: dist.name_general):
+            show_tree(d, result.dead, installed_distributions, include_extras=True,
+                      lib=lib)
+    return results
+
+
+def diff_snapshots(old_path, new_path, include_extras=False):
+    """
+    Prints JSON report of changes between two captured environments:
+    added, removed and upgraded packages, new leaves and dead packages.
+    """
+    import json
+    from extra import diff_utils
+    try:
+        diff = diff_utils.diff_snapshots(old_path, new_path, include_extras,
+                                         exclude=set(WHITELIST))
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return None
+    print(json.dumps(diff.to_dict(), indent=2))
+    return diff
+
+
+def format_size(size):
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return '%d%s' % (size, unit) if unit == 'B' else '%.1f%s' % (size, unit)
+        size /= 1024.0
+    return '%.1fGiB' % size
+
+
+def list_unused(source_dir, include_extras=False, jobs=None, lib=None,
+                use_cache=True):
+    """
+    Lists leaves which are not imported by python files of the source
+    directory with packages their removal would free.
+    :param use_cache: keep imports of unchanged files in the user cache directory.
+    """
+    from extra.import_scan_utils import find_unused_leaves, get_default_cache_path
+    lib = get_import_utils_lib(lib)
+    cache_path = get_default_cache_path(source_dir) if use_cache else None
+    try:
+        unused = find_unused_leaves(lib, source_dir, include_extras, jobs, cache_path)
+    except FileNotFoundError:
+        # otherwise nothing is imported and every leaf is listed as unused
+        print('Directory \'%s\' not found!' % source_dir, file=sys.stderr)
+        return None
+    installed_distributions = lib.get_installed_distributions()
+    res = list()
+    for leaf, dead in unused:
+        dead = exclude_whitelist(dead)
+        if leaf not in dead:
+            continue
+        show_tree(leaf, dead, installed_distributions, include_extras=True, lib=lib)
+        res.append((leaf, dead))
+    return res
+
+
+def list_environments_leaves(environments, freeze=False, include_extras=False,
+                             jobs=None, layer_cache_dir=None, metadata_cache_dir=None):
+    from extra.multi_env_utils import analyze_environments
+    results = analyze_environments(environments, include_extras, jobs, layer_cache_dir,
+                                   metadata_cache_dir)
+    for result in results:
+        print('# %s' % result['environment'])
+        if result['error']:
+            print("Failed to analyze environment %s: %s" % (
+                result['environment'], result['error']), file=sys.stderr)
+            continue
+        for leaf in result['leaves']:
+            if freeze:
+                print('%s==%s' % (leaf['name'], leaf['version']))
+            else:
+                print('%s %s (%s)' % (leaf['name'], leaf['version'], leaf['location']))
+    return results
+
+
 def create_parser():
+    import optparse
     parser = optparse.OptionParser(
         usage='usage: %prog [OPTION]... [NAME]...',
         version='%prog ' + __version__,
@@ -250,7 +631,93 @@ def create_parser():
              "file_test.txt format")
     parser.add_option(
         '-r', '--read-file', action='store_true', default=False,
-        help="read packages from file like file_test.txt")
+        help="read packages from requirements file (comments, markers "
+             "and nested -r files are supported)")
+    parser.add_option(
+        '--watch', action='store_true', default=False,
+        help="watch the environment and print new leaves and packages "
+             "orphaned by uninstallation until interrupted.")
+    parser.add_option(
+        '--watch-interval', type='float', default=2.0, metavar='SECONDS',
+        help="polling interval of --watch (default: 2).")
+    parser.add_option(
+        '--why', default=None, metavar='NAME',
+        help="show the shortest paths from leaves to NAME "
+             "(why the package is kept).")
+    parser.add_option(
+        '--unused-in', default=None, metavar='DIR',
+        help="list leaves which are not imported by python files of DIR "
+             "with packages their removal would free.")
+    parser.add_option(
+        '--no-import-cache', action='store_true', default=False,
+        help="parse every python file of --unused-in instead of using "
+             "the cache of imports (~/.cache/pip-autoremove).")
+    parser.add_option(
+        '--impact', action='store_true', default=False,
+        help="list all packages ranked by count and size of packages "
+             "which would be freed by their removal.")
+    parser.add_option(
+        '--batch', default=None, metavar='MANIFEST',
+        help="list unused dependencies of every root set of the JSON "
+             "MANIFEST ({\"name\": [\"package\", ...], ...}) against one "
+             "requirements graph, nothing is uninstalled.")
+    parser.add_option(
+        '--time-budget', type='float', default=None, metavar='SECONDS',
+        help="stop the analysis (-L, -f, -l or uninstall) after SECONDS and "
+             "use the partial result: only definite leaves and packages "
+             "surely freed.")
+    parser.add_option(
+        '--metrics-file', default=None, metavar='FILE',
+        help="write counts, phase durations and cache hit ratios of the "
+             "analysis (-L, -f, -l or uninstall) to FILE in Prometheus "
+             "text format (for node_exporter textfile collector).")
+    parser.add_option(
+        '--env', action='append', dest='environments', default=[],
+        metavar='PATH',
+        help="list leaves of the environment given by site-packages directory "
+             "or python interpreter instead of the current one. "
+             "Can be repeated, environments are analyzed in parallel.")
+    parser.add_option(
+        '-j', '--jobs', type='int', default=None,
+        help="number of worker processes for --env and --unused-in "
+             "(default: CPU count).")
+    parser.add_option(
+        '--no-layer-cache', action='store_true', default=False,
+        help="read metadata of the base interpreter site-packages of the "
+             "virtual environment again instead of the shared cache "
+             "(see --env).")
+    parser.add_option(
+        '--no-metadata-cache', action='store_true', default=False,
+        help="parse every METADATA instead of using the cache of parsed ones "
+             "shared by environments.")
+    parser.add_option(
+        '--metadata-cache-dir', default=None, metavar='DIR',
+        help="directory of the parsed METADATA cache, may be shared by "
+             "users (default: ~/.cache/pip-autoremove/metadata).")
+    parser.add_option(
+        '--export-snapshot', default=None, metavar='FILE',
+        help="save installed distributions and their requirements to the "
+             "snapshot file for offline analysis.")
+    parser.add_option(
+        '--export-graph', default=None, metavar='FILE',
+        help="save the requirements graph to the compact binary file, "
+             "which can be used with --snapshot.")
+    parser.add_option(
+        '--snapshot', action='append', dest='snapshots', default=[],
+        metavar='FILE',
+        help="analyze the environment saved by --export-snapshot or "
+             "--export-graph instead of "
+             "the current one (-L, -f, -l, --batch, --impact or --why). "
+             "Can be repeated.")
+    parser.add_option(
+        '--diff', nargs=2, default=None, metavar='OLD NEW',
+        help="print JSON report of changes between two files of "
+             "--export-snapshot or --export-graph: added, removed and "
+             "upgraded packages, new leaves and packages which became dead.")
+    parser.add_option(
+        '--python-version', default=None, metavar='X.Y',
+        help="evaluate requirement markers of --snapshot "
+             "for the given python version (not for binary graphs).")
     return parser
 
 
@@ -0,0 +1,236 @@
+"""
+Runs every ImportUtils backend over the same environment, checks that
+distributions, requirements and graphs are identical and reports
+per-backend timings, memory and cache statistics.
+
+    python -m test_utils.backend_harness --synthetic 2000 --output result.json
+    python -m test_utils.backend_harness --output new.json --baseline result.json
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Any, Union
+
+BACKENDS = ['importlib', 'pkg_resources']
+# timings and memory compared with the baseline, lower is better
+COMPARED_METRICS = ['scan_time', 'requirements_time', 'graph_time',
+                    'graph_extras_time', 'peak_memory']
+RESULT_FORMAT_VERSION = 1
+
+_REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _create_backend(backend: str, paths: Union[List[str], None]):
+    from extra import importlib_utils
+    if backend == 'importlib':
+        return importlib_utils.ImportUtilsImportlib(paths)
+    if backend == 'pkg_resources':
+        return importlib_utils.ImportUtilsPkgResources(paths)
+    raise ValueError("Unknown backend \"%s\"." % backend)
+
+
+def _canonical_graph(graph) -> Dict[str, List[str]]:
+    return dict((dist.name_general, sorted(user.name_general for user in users))
+                for dist, users in sorted(graph.items(), key=lambda x: x[0].name_general))
+
+
+def measure_backend(backend: str, paths: Union[List[str], None] = None) \
+        -> Dict[str, Any]:
+    """
+    Measures the backend in the current process. Returns metrics
+    and canonical data (plain lists and dicts) for the parity check.
+    """
+    from extra.extra_utils import get_requirements_graph
+    from extra.marker_utils import get_default_marker_evaluator
+    result = {'backend': backend, 'available': True, 'error': None}
+    try:
+        lib = _create_backend(backend, paths)
+    except Exception as e:
+        result.update(available=False, error="%s: %s" % (type(e).__name__, e))
+        return result
+    marker_evaluator = get_default_marker_evaluator()
+    hits, misses = marker_evaluator.hits, marker_evaluator.misses
+    tracemalloc.start()
+    start = time.perf_counter()
+    dists = lib.get_installed_distributions()
+    result['scan_time'] = time.perf_counter() - start
+    start = time.perf_counter()
+    requirements = dict(
+        (dist.name_general, sorted(
+            [req.name_general, sorted(req.enabled_extras or []),
+             req.condition_extra or '']
+            for req in dist.requirements or []))
+        for dist in dists)
+    result['requirements_time'] = time.perf_counter() - start
+    start = time.perf_counter()
+    graph = get_requirements_graph(lib)
+    result['graph_time'] = time.perf_counter() - start
+    start = time.perf_counter()
+    graph_extras = get_requirements_graph(lib, True)
+    result['graph_extras_time'] = time.perf_counter() - start
+    result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result['distributions_count'] = len(dists)
+    result['edges_count'] = sum(len(users) for users in graph.values())
+    result['marker_cache'] = {
+        'hits': marker_evaluator.hits - hits,
+        'misses': marker_evaluator.misses - misses,
+    }
+    result['data'] = {
+        'distributions': sorted([d.name_general, d.version] for d in dists),
+        'requirements': requirements,
+        'graph': _canonical_graph(graph),
+        'graph_extras': _canonical_graph(graph_extras),
+    }
+    return result
+
+
+def run_backend(backend: str, paths: Union[List[str], None] = None) -> Dict[str, Any]:
+    """
+    Measures the backend in a fresh interpreter, so imports and caches
+    of one backend do not affect the others.
+    """
+    command = [sys.executable, '-m', 'test_utils.backend_harness', '--worker', backend]
+    for path in paths or []:
+        command += ['--path', path]
+    process = subprocess.run(command, cwd=_REPO_DIR, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode != 0:
+        return {'backend': backend, 'available': False, 'failed': True,
+                'error': process.stderr.strip()}
+    return json.loads(process.stdout)
+
+
+def compare_backends(results: List[Dict[str, Any]]) -> List[str]:
+    """
+    Returns differences of data between available backends.
+    """
+    mismatches = list()
+    available = [r for r in results if r.get('available')]
+    if len(available) < 2:
+        return mismatches
+    reference = available[0]
+    for other in available[1:]:
+        for key in ('distributions', 'requirements', 'graph', 'graph_extras'):
+            expected, actual = reference['data'][key], other['data'][key]
+            if expected == actual:
+                continue
+            if isinstance(expected, dict):
+                names = sorted(name for name in set(expected) | set(actual)
+                               if expected.get(name) != actual.get(name))
+            else:
+                names = sorted(set(map(str, expected)) ^ set(map(str, actual)))
+            mismatches.append("%s of %s and %s differ: %s" % (
+                key, reference['backend'], other['backend'], ', '.join(names[:10])))
+    return mismatches
+
+
+def run_harness(paths: Union[List[str], None] = None,
+                backends: List[str] = None) -> Dict[str, Any]:
+    """
+    Runs backends over the same paths (sys.path by default). Failure of
+    an available backend is reported as a mismatch.
+    """
+    results = [run_backend(backend, paths) for backend in backends or BACKENDS]
+    mismatches = ["%s failed: %s" % (result['backend'], result['error'])
+                  for result in results if result.get('failed')]
+    mismatches += compare_backends(results)
+    for result in results:
+        result.pop('data', None)
+    return {
+        'version': RESULT_FORMAT_VERSION,
+        'created': int(time.time()),
+        'python_version': platform.python_version(),
+        'paths': paths,
+        'backends': dict((result['backend'], result) for result in results),
+        'parity': {'ok': not mismatches, 'mismatches': mismatches},
+    }
+
+
+def compare_with_baseline(result: Dict[str, Any], baseline: Dict[str, Any],
+                          tolerance: float = 0.2) -> List[str]:
+    """
+    Returns metrics which are worse than the baseline by more than
+    tolerance (relative).
+    """
+    regressions = list()
+    for backend, metrics in sorted(result['backends'].items()):
+        baseline_metrics = baseline.get('backends', {}).get(backend)
+        if not metrics.get('available') or not baseline_metrics or \
+                not baseline_metrics.get('available'):
+            continue
+        for metric in COMPARED_METRICS:
+            value, baseline_value = metrics.get(metric), baseline_metrics.get(metric)
+            if value is None or not baseline_value:
+                continue
+            if value > baseline_value * (1 + tolerance):
+                regressions.append("%s %s: %.6g > %.6g (baseline)" % (
+                    backend, metric, value, baseline_value))
+    return regressions
+
+
+def write_result(path: str, result: Dict[str, Any]):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def create_parser():
+    import optparse
+    parser = optparse.OptionParser(usage='usage: %prog [OPTION]...')
+    parser.add_option('--path', action='append', dest='paths', default=None,
+                      help="search distributions in the path instead of sys.path, "
+                           "can be repeated.")
+    parser.add_option('--synthetic', type='int', default=None, metavar='COUNT',
+                      help="run over generated site-packages with COUNT "
+                           "distributions.")
+    parser.add_option('--backend', action='append', dest='backends', default=None,
+                      help="backend to run (%s), can be repeated." % ', '.join(BACKENDS))
+    parser.add_option('--output', default=None, metavar='FILE',
+                      help="write the result as JSON.")
+    parser.add_option('--baseline', default=None, metavar='FILE',
+                      help="compare timings and memory with the earlier result.")
+    parser.add_option('--tolerance', type='float', default=0.2,
+                      help="allowed relative regression (default: 0.2).")
+    parser.add_option('--worker', default=None, help=optparse.SUPPRESS_HELP)
+    return parser
+
+
+def main(argv=None) -> int:
+    (opts, args) = create_parser().parse_args(argv)
+    if opts.worker:
+        print(json.dumps(measure_backend(opts.worker, opts.paths)))
+        return 0
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = opts.paths
+        if opts.synthetic:
+            from test_utils.fixture_utils import make_synthetic_site_packages
+            paths = [make_synthetic_site_packages(
+                os.path.join(tmp, 'site-packages'), opts.synthetic)]
+        result = run_harness(paths, opts.backends)
+    if opts.synthetic:
+        result['synthetic'] = opts.synthetic
+    regressions = list()
+    if opts.baseline:
+        with open(opts.baseline, 'r') as f:
+            regressions = compare_with_baseline(result, json.load(f), opts.tolerance)
+        result['regressions'] = regressions
+    if opts.output:
+        write_result(opts.output, result)
+    else:
+        print(json.dumps(result, indent=2, sort_keys=True))
+    for mismatch in result['parity']['mismatches']:
+        print("Parity: " + mismatch, file=sys.stderr)
+    for regression in regressions:
+        print("Regression: " + regression, file=sys.stderr)
+    return 1 if result['parity']['mismatches'] or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
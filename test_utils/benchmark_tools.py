@@ -0,0 +1,39 @@
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+_IMPORT_TIME_REGEX = re.compile(
+    r"^import time:\s*(?P<self>\d+)\s*\|\s*(?P<cumulative>\d+)\s*\|(?P<name>.*)$")
+
+
+def parse_import_time(output: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parses stderr of "python -X importtime".
+    Returns mapping of module name to (self, cumulative) time in microseconds.
+    """
+    res = dict()
+    for line in output.splitlines():
+        match = _IMPORT_TIME_REGEX.match(line)
+        if not match:
+            continue
+        name = match.group('name').strip()
+        res[name] = (int(match.group('self')), int(match.group('cumulative')))
+    return res
+
+
+def measure_import_time(module: str, cwd: str = None) \
+        -> Dict[str, Tuple[int, int]]:
+    """
+    Imports the module in the fresh interpreter with "-X importtime".
+    """
+    if cwd is None:
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if process.returncode != 0:
+        raise Exception("Failed to import %s: %s" % (module, process.stderr))
+    return parse_import_time(process.stderr)
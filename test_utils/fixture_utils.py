@@ -0,0 +1,72 @@
+import os
+import random
+from typing import Dict, Sequence
+
+
+def make_dist_info(site_packages: str, name: str, version: str = '1.0',
+                   requires: Sequence[str] = (), extras: Sequence[str] = (),
+                   top_level: Sequence[str] = None,
+                   files: Dict[str, str] = None) -> str:
+    """
+    Creates minimal "<name>-<version>.dist-info" directory in site_packages.
+    Returns path to the created directory.
+    :param files: mapping of path relative to site_packages to its content,
+        files are written and listed in RECORD.
+    """
+    dist_info = os.path.join(
+        site_packages, '%s-%s.dist-info' % (name.replace('-', '_'), version))
+    os.makedirs(dist_info, exist_ok=True)
+    lines = ['Metadata-Version: 2.1', 'Name: %s' % name, 'Version: %s' % version]
+    lines += ['Provides-Extra: %s' % extra for extra in extras]
+    lines += ['Requires-Dist: %s' % req for req in requires]
+    with open(os.path.join(dist_info, 'METADATA'), 'w') as f:
+        f.write('\n'.join(lines) + '\n\n')
+    if top_level is not None:
+        with open(os.path.join(dist_info, 'top_level.txt'), 'w') as f:
+            f.write('\n'.join(top_level) + '\n')
+    if files is not None:
+        record = list()
+        for path, content in files.items():
+            full_path = os.path.join(site_packages, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'w') as f:
+                f.write(content)
+            record.append('%s,,%d' % (path, len(content)))
+        with open(os.path.join(dist_info, 'RECORD'), 'w') as f:
+            f.write('\n'.join(record) + '\n')
+    return dist_info
+
+
+def make_site_packages(site_packages: str, dists: Dict[str, Dict]) -> str:
+    """
+    Creates fake site-packages directory.
+    :param dists: mapping of name to make_dist_info keyword arguments.
+    """
+    os.makedirs(site_packages, exist_ok=True)
+    for name, kwargs in dists.items():
+        make_dist_info(site_packages, name, **kwargs)
+    return site_packages
+
+
+def make_synthetic_site_packages(site_packages: str, count: int, seed: int = 0,
+                                 requires_count: int = 3) -> str:
+    """
+    Creates site-packages directory with count distributions "pkg<i>",
+    each one requires up to requires_count later distributions. Some
+    requirements have python_version markers or belong to the "cli" extra.
+    """
+    rnd = random.Random(seed)
+    dists = dict()
+    for i in range(count):
+        requires = list()
+        later = range(i + 1, count)
+        for j in rnd.sample(later, min(requires_count, len(later))):
+            kind = rnd.random()
+            if kind < 0.1:
+                requires.append('pkg%d; python_version < "3"' % j)
+            elif kind < 0.3:
+                requires.append('pkg%d[cli]>=1.0; extra == "cli"' % j)
+            else:
+                requires.append('pkg%d>=1.0' % j)
+        dists['pkg%d' % i] = {'requires': requires, 'extras': ['cli']}
+    return make_site_packages(site_packages, dists)
@@ -15,6 +15,13 @@ def install_dist(req):
         raise Exception("Failed to install %s" % req)
 
 
+def uninstall_dist(req):
+    pip_cmd = [sys.executable, '-m', 'pip']
+    call = subprocess.check_call(pip_cmd + ["uninstall", "-y", req])
+    if call != 0:
+        raise Exception("Failed to uninstall %s" % req)
+
+
 def need_dists(dists: Sequence[str], remove_after: bool = False):
     def _decorator(func):
         def wrapper(*args, **kwargs):
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import stat
+import subprocess
+import tempfile
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.async_utils import AsyncImportUtils
+from test_utils.fixture_utils import make_site_packages
+
+# stands for "python -m pip uninstall -y NAME...", removes dist-info directories
+_FAKE_PYTHON = """#!/bin/sh
+shift 4
+for name in "$@"; do
+    echo "Uninstalling $name"
+    rm -rf "%s/$(echo "$name" | tr - _)-1.0.dist-info"
+done
+exit %d
+"""
+
+
+class TestAsyncUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_site_packages(os.path.join(self._tmp.name, 'site'), {
+            'app': {'requires': ['lib-a', 'shared']},
+            'tool': {'requires': ['shared']},
+            'lib-a': {'requires': ['lib-b']},
+            'lib-b': {},
+            'shared': {},
+        })
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def __make_utils(self, return_code=0):
+        python = os.path.join(self._tmp.name, 'python-%d' % return_code)
+        with open(python, 'w') as f:
+            f.write(_FAKE_PYTHON % (self.site_packages, return_code))
+        os.chmod(python, os.stat(python).st_mode | stat.S_IEXEC)
+        lib = importlib_utils.ImportUtilsImportlib([self.site_packages])
+        return AsyncImportUtils(lib, python=python)
+
+    def test1_queries(self):
+        async def run():
+            utils = self.__make_utils()
+            leaves, dead = await asyncio.gather(utils.get_leaves(),
+                                                utils.list_dead(['app']))
+            return [d.name for d in leaves], sorted(d.name for d in dead)
+
+        leaves, dead = asyncio.run(run())
+        self.assertEqual(leaves, ['app', 'tool'])
+        self.assertEqual(dead, ['app', 'lib-a', 'lib-b'])
+
+    def test2_autoremove(self):
+        output = list()
+
+        async def run():
+            utils = self.__make_utils()
+            removed = await utils.autoremove(['app'], on_output=output.append)
+            dists = await utils.get_installed_distributions()
+            return sorted(d.name for d in removed), sorted(d.name for d in dists)
+
+        removed, installed = asyncio.run(run())
+        self.assertEqual(removed, ['app', 'lib-a', 'lib-b'])
+        self.assertEqual(installed, ['shared', 'tool'])
+        self.assertEqual(output, ['Uninstalling app\n', 'Uninstalling lib-a\n',
+                                  'Uninstalling lib-b\n'])
+
+    def test3_uninstall_error(self):
+        async def run():
+            utils = self.__make_utils(return_code=1)
+            await utils.uninstall([await utils.get_distribution('tool')],
+                                  on_output=lambda line: None)
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            asyncio.run(run())
+
+    def test4_unknown_name(self):
+        utils = self.__make_utils()
+        with self.assertRaises(utils.import_utils_lib.InstalledDependencyNotFound):
+            asyncio.run(utils.list_dead(['missing']))
+
+    def test5_python_required(self):
+        lib = importlib_utils.ImportUtilsImportlib([self.site_packages])
+        utils = AsyncImportUtils(lib)
+        self.assertIsNone(utils.python)
+        with self.assertRaises(ValueError):
+            asyncio.run(utils.autoremove(['app']))
+        self.assertIn('app', [d.name for d in lib.get_installed_distributions()])
+
+    def test6_uninstall_blocks_queries(self):
+        events = list()
+
+        async def run():
+            utils = self.__make_utils()
+            dists = [await utils.get_distribution('app')]
+            uninstall = asyncio.ensure_future(utils.uninstall(
+                dists, on_output=lambda line: events.append('output')))
+            # let uninstall take the lock first
+            await asyncio.sleep(0)
+            installed = await utils.get_installed_distributions()
+            events.append('query')
+            await uninstall
+            return [d.name for d in installed]
+
+        self.assertNotIn('app', asyncio.run(run()))
+        self.assertEqual(events, ['output', 'query'])
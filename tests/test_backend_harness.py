@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from test_utils.backend_harness import run_harness, compare_with_baseline, \
+    compare_backends, main
+from test_utils.fixture_utils import make_synthetic_site_packages
+
+
+class TestBackendHarness(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_synthetic_site_packages(
+            os.path.join(self._tmp.name, 'site'), 60, seed=1)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test1_parity(self):
+        result = run_harness([self.site_packages])
+        available = [backend for backend, metrics in result['backends'].items()
+                     if metrics['available']]
+        self.assertIn('importlib', available)
+        if 'pkg_resources' not in available:
+            self.skipTest("pkg_resources is not available")
+        self.assertEqual(result['parity'], {'ok': True, 'mismatches': []})
+        for metrics in result['backends'].values():
+            self.assertEqual(metrics['distributions_count'], 60)
+            self.assertGreater(metrics['edges_count'], 0)
+            self.assertGreater(metrics['peak_memory'], 0)
+            self.assertNotIn('data', metrics)
+
+    def test2_compare_backends(self):
+        data = {'distributions': [['a', '1.0']], 'requirements': {'a': []},
+                'graph': {'a': []}, 'graph_extras': {'a': []}}
+        other = dict(data, graph={'a': ['b']})
+        self.assertEqual(compare_backends([
+            {'backend': 'x', 'available': True, 'data': data},
+            {'backend': 'y', 'available': True, 'data': other},
+            {'backend': 'z', 'available': False}]),
+            ['graph of x and y differ: a'])
+
+    def test3_compare_with_baseline(self):
+        baseline = {'backends': {
+            'importlib': {'available': True, 'scan_time': 1.0, 'peak_memory': 100},
+            'pkg_resources': {'available': False}}}
+        result = {'backends': {
+            'importlib': {'available': True, 'scan_time': 1.1, 'peak_memory': 200},
+            'pkg_resources': {'available': True, 'scan_time': 5.0}}}
+        self.assertEqual(compare_with_baseline(result, baseline, 0.2),
+                         ['importlib peak_memory: 200 > 100 (baseline)'])
+        self.assertEqual(compare_with_baseline(result, baseline, 1.0), [])
+
+    def test4_main(self):
+        output = os.path.join(self._tmp.name, 'result.json')
+        self.assertEqual(main(['--path', self.site_packages, '--backend', 'importlib',
+                               '--output', output]), 0)
+        with open(output, 'r') as f:
+            result = json.load(f)
+        self.assertEqual(list(result['backends']), ['importlib'])
+        self.assertEqual(result['paths'], [self.site_packages])
@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.batch_utils import load_manifest, evaluate_manifest
+from pip_autoremove import list_batch_dead, get_dead
+from test_utils.fixture_utils import make_site_packages
+
+
+class TestBatchUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_site_packages(os.path.join(self._tmp.name, 'site'), {
+            'svc-a': {'requires': ['lib-a', 'shared']},
+            'svc-b': {'requires': ['lib-b', 'shared']},
+            'lib-a': {'requires': ['common']},
+            'lib-b': {'requires': ['common']},
+            'common': {},
+            'shared': {},
+            'tool': {},
+        })
+        self.manifest_path = os.path.join(self._tmp.name, 'manifest.json')
+        self.manifest = {
+            'a': ['svc-a'],
+            'b': ['svc-b', 'missing'],
+            'both': ['svc-a', 'svc-b'],
+            'both-again': ['svc-b', 'svc-a'],
+        }
+        with open(self.manifest_path, 'w') as f:
+            json.dump(self.manifest, f)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def __lib(self):
+        return importlib_utils.ImportUtilsImportlib([self.site_packages])
+
+    @staticmethod
+    def __names(dists):
+        return sorted(dist.name for dist in dists)
+
+    def test1_evaluate(self):
+        results = evaluate_manifest(self.__lib(), load_manifest(self.manifest_path))
+        self.assertEqual([r.name for r in results], ['a', 'b', 'both', 'both-again'])
+        self.assertEqual(self.__names(results[0].dead), ['lib-a', 'svc-a'])
+        self.assertEqual(results[1].missing, ['missing'])
+        self.assertEqual(self.__names(results[1].dead), ['lib-b', 'svc-b'])
+        self.assertEqual(self.__names(results[2].dead),
+                         ['common', 'lib-a', 'lib-b', 'shared', 'svc-a', 'svc-b'])
+        # the same root set is evaluated once
+        self.assertIs(results[2].dead, results[3].dead)
+        for result in results:
+            self.assertEqual(result.dead, get_dead(result.start, lib=self.__lib()))
+
+    def test2_list_batch_dead(self):
+        out = io.StringIO()
+        err = io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            results = list_batch_dead(self.manifest_path, lib=self.__lib())
+        self.assertEqual(len(results), 4)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[:3], ['# a', 'svc-a 1.0 (%s)' % self.site_packages,
+                                     '    lib-a 1.0 (%s)' % self.site_packages])
+        self.assertIn('missing not installed', err.getvalue())
+
+    def test3_invalid_manifest(self):
+        with open(self.manifest_path, 'w') as f:
+            json.dump({'a': 'svc-a'}, f)
+        self.assertRaises(ValueError, load_manifest, self.manifest_path)
+        err = io.StringIO()
+        with redirect_stderr(err):
+            self.assertIsNone(list_batch_dead(self.manifest_path, lib=self.__lib()))
+        self.assertIn('root set a', err.getvalue())
@@ -0,0 +1,23 @@
+import os
+from unittest import TestCase
+
+from test_utils.benchmark_tools import measure_import_time
+
+# cumulative import time of pip_autoremove, microseconds
+IMPORT_TIME_BUDGET_US = int(os.environ.get(
+    'PIP_AUTOREMOVE_IMPORT_TIME_BUDGET_US', 100000))
+# modules which must be imported only when they are really needed
+LAZY_MODULES = ['packaging', 'packaging.requirements', 'subprocess', 'optparse',
+                'importlib.metadata', 'pkg_resources', 'concurrent.futures']
+
+
+class TestBenchmarks(TestCase):
+    def test1_import_time(self):
+        # the best of several runs, first one may warm up the file system cache
+        timings = [measure_import_time('pip_autoremove') for _ in range(3)]
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, timings[0],
+                             "Module \"%s\" is imported at startup." % module)
+        best = min(timing['pip_autoremove'][1] for timing in timings)
+        self.assertLess(best, IMPORT_TIME_BUDGET_US,
+                        "Import of pip_autoremove takes %d us." % best)
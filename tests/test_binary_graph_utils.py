@@ -0,0 +1,92 @@
+import os
+import random
+import tempfile
+import time
+from unittest import TestCase
+
+import pip_autoremove
+from extra.binary_graph_utils import BinaryGraph, write_binary_graph
+from extra.graph_utils import get_graph_leaves
+from extra.importlib_utils import DistributionInfo
+from extra.snapshot_utils import ImportUtilsSnapshot
+from extra.extra_utils import get_requirements_graph
+
+
+def make_layered_graph(layers: int, width: int, seed: int = 0):
+    rnd = random.Random(seed)
+    dists = [[(DistributionInfo.Builder()
+               .name('pkg-%d-%d' % (layer, i))
+               .version('1.%d' % i)
+               .lib_path_location('/site-packages')
+               .available_extras(['extra%d' % (i % 3)] if i % 2 else [])
+               ).build() for i in range(width)] for layer in range(layers)]
+    graph = dict((d, set()) for layer in dists for d in layer)
+    for layer in range(1, layers):
+        for user in dists[layer]:
+            for dep in rnd.sample(dists[layer - 1], 2):
+                graph[dep].add(user)
+    return graph
+
+
+def _names(graph):
+    return {k.name: set(v.name for v in vs) for k, vs in graph.items()}
+
+
+class TestBinaryGraphUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'graph.bin')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test1_round_trip(self):
+        graph = make_layered_graph(5, 40)
+        write_binary_graph(None, self.path, graph, graph)
+        with BinaryGraph(self.path) as binary_graph:
+            decoded = binary_graph.to_graph()
+            self.assertEqual(_names(graph), _names(decoded))
+            self.assertEqual(
+                set(d.name for d in get_graph_leaves(graph)),
+                set(binary_graph.node_name(i) for i in binary_graph.leaves()))
+            for dist in list(graph)[::7]:
+                start = binary_graph.node_id(dist.name)
+                expected = pip_autoremove.find_all_dead(graph, {dist})
+                self.assertEqual(
+                    set(d.name for d in expected),
+                    set(binary_graph.node_name(i)
+                        for i in binary_graph.find_all_dead({start})))
+
+    def test2_snapshot_from_binary_graph(self):
+        graph = make_layered_graph(4, 10)
+        write_binary_graph(None, self.path, graph, graph)
+        util = ImportUtilsSnapshot(self.path)
+        self.assertEqual(_names(graph), _names(get_requirements_graph(util)))
+
+    def test3_large_graph_load(self):
+        graph = make_layered_graph(20, 1000)
+        write_binary_graph(None, self.path, graph, graph)
+        started = time.perf_counter()
+        with BinaryGraph(self.path) as binary_graph:
+            leaves = binary_graph.leaves()
+            dead = binary_graph.find_all_dead(leaves)
+        elapsed = time.perf_counter() - started
+        self.assertGreaterEqual(len(leaves), 1000)
+        self.assertEqual(20000, len(dead))
+        self.assertLess(elapsed, 1.0)
+
+    def test4_lost_extras_label(self):
+        graph = make_layered_graph(2, 2)
+        lib, user = sorted(graph, key=lambda d: d.name)[0], \
+            sorted(graph, key=lambda d: d.name)[-1]
+        base_graph = dict((d, set()) for d in graph)
+        extras_graph = dict((d, set()) for d in graph)
+        # the user has no requirement with the condition extra of the edge
+        extras_graph[lib].add(user)
+        write_binary_graph(None, self.path, base_graph, extras_graph)
+        with BinaryGraph(self.path) as binary_graph:
+            self.assertEqual([(binary_graph.node_id(user.name), '')],
+                             binary_graph.extras_users(binary_graph.node_id(lib.name)))
+        util = ImportUtilsSnapshot(self.path)
+        self.assertEqual(_names(base_graph), _names(get_requirements_graph(util)))
+        self.assertEqual([user.name], [name for name, _ in util.malformed_requirements])
@@ -0,0 +1,95 @@
+import itertools
+import os
+import tempfile
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.budget_utils import TimeBudget, analyze_with_budget, PHASES
+from extra.extra_utils import get_requirements_graph
+from extra.graph_utils import get_graph_leaves
+from pip_autoremove import find_all_dead
+from test_utils.fixture_utils import make_site_packages
+
+
+class TestBudgetUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_site_packages(os.path.join(self._tmp.name, 'site'), {
+            'app': {'requires': ['lib-a', 'cyc-a']},
+            'cyc-a': {'requires': ['cyc-b']},
+            'cyc-b': {'requires': ['cyc-a']},
+            'lib-a': {'requires': ['lib-b', 'old; python_version < "3"']},
+            'lib-b': {},
+            'old': {},
+            'tool': {'requires': ['lib-b', 'click; extra == "cli"'], 'extras': ['cli']},
+            'click': {},
+        })
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def __lib(self):
+        return importlib_utils.ImportUtilsImportlib([self.site_packages])
+
+    @staticmethod
+    def __names(dists):
+        return sorted(dist.name for dist in dists)
+
+    def test1_complete(self):
+        for extra_required in (False, True):
+            lib = self.__lib()
+            start = [lib.get_distribution('app')]
+            analysis = analyze_with_budget(lib, start, extra_required)
+            graph = get_requirements_graph(self.__lib(), extra_required)
+            self.assertTrue(analysis.complete)
+            self.assertEqual(list(analysis.completed_phases), list(PHASES))
+            self.assertEqual(
+                dict((d.name, self.__names(users)) for d, users in analysis.graph.items()),
+                dict((d.name, self.__names(users)) for d, users in graph.items()))
+            self.assertEqual(self.__names(analysis.leaves),
+                             self.__names(get_graph_leaves(graph)))
+            self.assertEqual(self.__names(analysis.dead),
+                             self.__names(find_all_dead(graph, set(
+                                 d for d in graph if d.name == 'app'))))
+
+    def test2_partial_is_conservative(self):
+        for extra_required in (False, True):
+            full = analyze_with_budget(self.__lib(), [], extra_required)
+            full_leaves = self.__names(full.leaves)
+            full_dead = self.__names(find_all_dead(
+                full.graph, set(d for d in full.graph if d.name == 'app')))
+            cut_phases = list()
+            for checks in itertools.count():
+                lib = self.__lib()
+                start = [lib.get_distribution('app')]
+                counter = itertools.count()
+                # every check of the budget takes one second
+                budget = TimeBudget(checks, clock=lambda: next(counter))
+                analysis = analyze_with_budget(lib, start, extra_required, budget)
+                self.assertLessEqual(set(self.__names(analysis.leaves)), set(full_leaves))
+                self.assertLessEqual(set(self.__names(analysis.dead)), set(full_dead))
+                self.assertIn('app', self.__names(analysis.dead))
+                cut_phases.append(analysis.cut_phase)
+                if analysis.complete:
+                    self.assertEqual(self.__names(analysis.leaves), full_leaves)
+                    self.assertEqual(self.__names(analysis.dead), full_dead)
+                    break
+            expected_phases = PHASES if extra_required else PHASES[:-1]
+            self.assertEqual(sorted(set(cut_phases) - {None}, key=PHASES.index),
+                             list(expected_phases))
+            # phases are reached in order while the budget grows
+            self.assertEqual(cut_phases, sorted(
+                cut_phases, key=lambda p: PHASES.index(p) if p else len(PHASES)))
+
+    def test3_partial_edges(self):
+        lib = self.__lib()
+        start = [lib.get_distribution('lib-a')]
+        counter = itertools.count()
+        # the scan and requirements of lib-a and lib-b only
+        budget = TimeBudget(4, clock=lambda: next(counter))
+        analysis = analyze_with_budget(lib, start, budget=budget)
+        self.assertEqual(analysis.cut_phase, 'edges')
+        # lib-b may be required by not processed tool
+        self.assertEqual(self.__names(analysis.dead), ['lib-a'])
+        # click is mentioned by tool, so it is not a definite leaf
+        self.assertEqual(self.__names(analysis.leaves), ['app', 'old', 'tool'])
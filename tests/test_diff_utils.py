@@ -0,0 +1,82 @@
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase, mock
+
+from extra import importlib_utils
+from extra.binary_graph_utils import write_binary_graph
+from extra.diff_utils import diff_snapshots, diff_graphs, load_interned_graph
+from extra.snapshot_utils import export_snapshot
+from pip_autoremove import main
+from test_utils.fixture_utils import make_site_packages
+
+
+class TestDiffUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        old = make_site_packages(os.path.join(self._tmp.name, 'old'), {
+            'app': {'requires': ['lib-a']},
+            'Lib_A': {'requires': ['common']},
+            'common': {'requires': ['deep']},
+            'deep': {},
+            'old-pkg': {},
+            'tool': {'version': '2.0', 'requires': ['pip']},
+            'pip': {},
+            'custom': {'version': 'abc'},
+        })
+        new = make_site_packages(os.path.join(self._tmp.name, 'new'), {
+            'app': {'version': '1.1', 'requires': ['lib-a']},
+            'lib-a': {'version': '2.0'},
+            'common': {'requires': ['deep', 'pip']},
+            'deep': {},
+            'new-pkg': {},
+            'tool': {},
+            'pip': {},
+            'custom': {'version': 'xyz'},
+        })
+        self.paths = dict()
+        for name, site_packages in (('old', old), ('new', new)):
+            lib = importlib_utils.ImportUtilsImportlib([site_packages])
+            self.paths[name] = os.path.join(self._tmp.name, name + '.json')
+            export_snapshot(lib, self.paths[name])
+            self.paths[name + '.bin'] = os.path.join(self._tmp.name, name + '.bin')
+            write_binary_graph(lib, self.paths[name + '.bin'])
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test1_diff(self):
+        for suffix in ('', '.bin'):
+            diff = diff_snapshots(self.paths['old' + suffix], self.paths['new' + suffix],
+                                  exclude={'pip'})
+            self.assertEqual(diff.added, ['new-pkg'])
+            self.assertEqual(diff.removed, ['old-pkg'])
+            self.assertEqual(diff.upgraded, [('app', '1.0', '1.1'), ('lib-a', '1.0', '2.0')])
+            self.assertEqual(diff.downgraded, [('tool', '2.0', '1.0')])
+            self.assertEqual(diff.changed, [('custom', 'abc', 'xyz')])
+            self.assertEqual(diff.new_leaves, ['common', 'new-pkg'])
+            self.assertEqual(diff.orphaned, ['common'])
+            # pip is freed too, but it is excluded
+            self.assertEqual(diff.dead, ['deep'])
+
+    def test2_same_ids_required(self):
+        old = load_interned_graph(self.paths['old'])
+        new = load_interned_graph(self.paths['new'])
+        self.assertRaises(ValueError, diff_graphs, old, new)
+        ids = dict()
+        old = load_interned_graph(self.paths['old'], ids=ids)
+        self.assertFalse(diff_graphs(old, load_interned_graph(self.paths['old.bin'], ids=ids)))
+
+    def test3_main(self):
+        out = io.StringIO()
+        cache_home = os.path.join(self._tmp.name, 'cache')
+        with redirect_stdout(out), mock.patch.dict(os.environ, XDG_CACHE_HOME=cache_home):
+            main(['--diff', self.paths['old'], self.paths['new.bin']])
+        # saved environments need no metadata caches
+        self.assertFalse(os.path.exists(cache_home))
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['added'], ['new-pkg'])
+        self.assertEqual(report['downgraded'], [{'name': 'tool', 'old': '2.0', 'new': '1.0'}])
+        self.assertEqual(report['dead'], ['deep'])
@@ -0,0 +1,77 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.discovery_utils import discover_distributions, parse_metadata_name, \
+    DistributionPath, read_metadata_header, read_metadata_header_bytes
+from test_utils.fixture_utils import make_site_packages, make_dist_info
+
+
+class TestDiscoveryUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.first = make_site_packages(self._tmp.name + '/first', {
+            'Shadowed.Name': {'version': '2.0'},
+        })
+        self.second = make_site_packages(self._tmp.name + '/second', {
+            'shadowed-name': {'version': '1.0'},
+            'other': {},
+        })
+        self.vendor = make_site_packages(self._tmp.name + '/_vendor', {
+            'vendored': {},
+        })
+        with open(os.path.join(self.second, 'legacy-0.1-py3.8.egg-info'), 'w') as f:
+            f.write('Metadata-Version: 1.0\nName: legacy\nVersion: 0.1\n\n')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test1_parse_metadata_name(self):
+        self.assertEqual('zope-interface',
+                         parse_metadata_name('zope.interface-5.0.dist-info'))
+        self.assertEqual('legacy', parse_metadata_name('legacy-0.1-py3.8.egg-info'))
+        self.assertEqual('develop', parse_metadata_name('develop.egg-info'))
+
+    def test2_discover_distributions(self):
+        paths = [self.first, self.vendor, self.second, self.first,
+                 os.path.join(self._tmp.name, 'missing')]
+        found = discover_distributions(paths)
+        self.assertEqual(['shadowed-name', 'legacy', 'other'],
+                         [d.name for d in found])
+        self.assertEqual(self.first, found[0].location)
+        self.assertTrue(all(d.kind == DistributionPath.KIND_METADATA for d in found))
+
+    def test3_backend_precedence(self):
+        util = importlib_utils.ImportUtilsFactory.create(
+            [self.vendor, self.first, self.second])
+        names = dict((d.name_general, d.version)
+                     for d in util.get_installed_distributions())
+        self.assertEqual({'shadowed.name': '2.0', 'other': '1.0', 'legacy': '0.1'},
+                         names)
+
+    def test4_archive_entry(self):
+        archive = os.path.join(self._tmp.name, 'lib.zip')
+        with open(archive, 'wb') as f:
+            f.write(b'')
+        found = discover_distributions([archive])
+        self.assertEqual([DistributionPath.KIND_ARCHIVE], [d.kind for d in found])
+        make_dist_info(self.first, 'other', '3.0')
+        found = discover_distributions([self.first, self.second])
+        self.assertEqual(self.first, [d for d in found if d.name == 'other'][0].location)
+
+    def test5_read_metadata_header(self):
+        metadata = os.path.join(self._tmp.name, 'METADATA')
+        with open(metadata, 'w') as f:
+            f.write('Metadata-Version: 2.1\nName: app\nLicense: first\n'
+                    '         \n         second\nRequires-Dist: lib-a\n'
+                    'Requires-Dist: lib-b; extra == "cli"\n\n'
+                    'Requires-Dist: not-a-header\n' + 'x' * 20000)
+        header = read_metadata_header(metadata)
+        self.assertEqual(['app'], header['name'])
+        self.assertEqual(['first second'], header['license'])
+        self.assertEqual(['lib-a', 'lib-b; extra == "cli"'], header['requires-dist'])
+        self.assertIsNone(read_metadata_header(metadata + '.missing'))
+        # the content address does not depend on the long description
+        self.assertTrue(read_metadata_header_bytes(metadata).endswith(
+            b'Requires-Dist: lib-b; extra == "cli"'))
@@ -0,0 +1,63 @@
+import os
+import random
+import tempfile
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.dominator_utils import DominatorIndex
+from extra.extra_utils import get_requirements_graph
+from pip_autoremove import find_all_dead
+from test_utils.fixture_utils import make_site_packages
+
+
+def make_random_dag(nodes_count, density, seed):
+    """
+    Returns graph (node -> users), users always have lower numbers.
+    """
+    rnd = random.Random(seed)
+    graph = {i: set() for i in range(nodes_count)}
+    for dep in range(nodes_count):
+        for user in range(dep):
+            if rnd.random() < density:
+                graph[dep].add(user)
+    return graph
+
+
+class TestDominatorUtils(TestCase):
+    def test1_same_as_find_all_dead(self):
+        for seed in range(20):
+            graph = make_random_dag(40, 0.1, seed)
+            index = DominatorIndex(graph)
+            for node in graph:
+                self.assertSetEqual(index.dominated(node),
+                                    find_all_dead(graph, {node}))
+
+    def test2_deep_chain(self):
+        # 0 uses 1, 1 uses 2... removal of 0 frees everything
+        nodes_count = 100000
+        graph = {i: ({i - 1} if i else set()) for i in range(nodes_count)}
+        index = DominatorIndex(graph)
+        self.assertEqual(len(index.dominated(0)), nodes_count)
+        self.assertEqual(index.immediate_dominator(5), 4)
+        self.assertIsNone(index.immediate_dominator(0))
+        self.assertEqual(index.impact()[0], (0, nodes_count, 0))
+
+    def test3_impact(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            site_packages = make_site_packages(os.path.join(tmp, 'site'), {
+                'app': {'requires': ['lib-a', 'shared'],
+                        'files': {'app/__init__.py': 'x' * 10}},
+                'tool': {'requires': ['shared'],
+                         'files': {'tool/__init__.py': 'x' * 1000}},
+                'lib-a': {'requires': ['lib-b'],
+                          'files': {'lib_a/__init__.py': 'x' * 100}},
+                'lib-b': {'files': {'lib_b/__init__.py': 'x' * 200}},
+                'shared': {'files': {'shared/__init__.py': 'x' * 5}},
+            })
+            util = importlib_utils.ImportUtilsFactory.create([site_packages])
+            index = DominatorIndex(get_requirements_graph(util))
+            impact = [(d.name_general, count, size)
+                      for d, count, size in index.impact(lambda d: d.installed_size())]
+        self.assertListEqual(impact, [
+            ('app', 3, 310), ('lib-a', 2, 300), ('tool', 1, 1000),
+            ('lib-b', 1, 200), ('shared', 1, 5)])
@@ -0,0 +1,88 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.extra_utils import get_requirements_graph, get_partial_requirements_graph, \
+    get_extras_index
+from pip_autoremove import find_all_dead
+from test_utils.fixture_utils import make_site_packages
+
+
+def _graph_names(graph):
+    return {k.name_general: set(v.name_general for v in vs) for k, vs in graph.items()}
+
+
+class TestExtraUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_site_packages(os.path.join(self._tmp.name, 'site'), {
+            'app': {'requires': ['lib-a', 'shared']},
+            'tool': {'requires': ['shared', 'lib-b; python_version < "3"']},
+            'lib-a': {'requires': ['lib-b']},
+            'lib-b': {},
+            'shared': {'requires': ['lib-c']},
+            'lib-c': {},
+            'unrelated': {'requires': ['lib-c']},
+        })
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test1_partial_requirements_graph(self):
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        graph = get_partial_requirements_graph(util, [util.get_distribution('app')])
+        self.assertDictEqual({
+            'app': set(), 'lib-a': {'app'}, 'lib-b': {'lib-a'},
+            'shared': {'app', 'tool'}, 'lib-c': {'shared', 'unrelated'},
+            'tool': set(), 'unrelated': set(),
+        }, _graph_names(graph))
+        full_graph = get_requirements_graph(util)
+        for name in ('app', 'tool', 'shared', 'lib-a'):
+            start = {util.get_distribution(name)}
+            self.assertSetEqual(
+                find_all_dead(full_graph, start),
+                find_all_dead(get_partial_requirements_graph(util, start), start))
+
+    def test2_partial_graph_cycle_fallback(self):
+        make_site_packages(self.site_packages, {
+            'lib-b': {'version': '1.0', 'requires': ['lib-a']},
+        })
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        graph = get_partial_requirements_graph(util, [util.get_distribution('app')])
+        self.assertEqual(7, len(graph))
+
+    def test3_cut_cycle_edges(self):
+        make_site_packages(self.site_packages, {
+            'lib-b': {'version': '1.0', 'requires': ['lib-a']},
+        })
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        cut_edges = list()
+        graph = get_requirements_graph(util, cut_edges=cut_edges)
+        self.assertEqual(1, len(cut_edges))
+        requirement, user = cut_edges[0]
+        self.assertSetEqual({'lib-a', 'lib-b'},
+                            {requirement.name_general, user.name_general})
+        self.assertNotIn(user, graph[requirement])
+
+    def test4_extras_index(self):
+        make_site_packages(self.site_packages, {
+            'app': {'version': '1.0', 'extras': ['cli', 'dev'],
+                    'requires': ['lib-a', 'shared', 'tool; extra == "cli"',
+                                 'lib-c; extra == "cli"', 'lib-b; extra == "dev"',
+                                 'lib-a; extra == "cli"']},
+        })
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        index = get_extras_index(util)
+        self.assertIs(index, get_extras_index(util))
+        app = util.get_distribution('app')
+        names = lambda dists: sorted(d.name_general for d in dists)
+        self.assertListEqual(['lib-a', 'shared'], names(index.base_required(app)))
+        self.assertListEqual(['cli'], index.allowed_extras(app))
+        self.assertListEqual(['lib-c', 'tool'], names(index.extra_required(app, 'cli')))
+        self.assertListEqual(['lib-c', 'tool'], names(index.optional_required(app)))
+        self.assertListEqual(['lib-b', 'lib-c', 'tool'],
+                             names(index.optional_required(app, ['cli', 'dev'])))
+        make_site_packages(self.site_packages, {'new-tool': {}})
+        util.refresh_known_distributions()
+        self.assertIsNot(index, get_extras_index(util))
@@ -0,0 +1,94 @@
+import random
+from unittest import TestCase
+
+from extra import graph_utils
+from extra.graph_utils import get_shortest_paths_from_leaves, get_users_closure, \
+    DeadNodesIndex, find_dead_nodes, find_cycle
+
+
+def _recursive_find_cycle(graph):
+    # the former recursive implementation, the reference of the output order
+    visited = set()
+    stack = []
+    on_stack = set()
+
+    def dfs(node):
+        visited.add(node)
+        stack.append(node)
+        on_stack.add(node)
+        for neighbor in graph.get(node, []):
+            if neighbor not in visited:
+                _cycle = dfs(neighbor)
+                if _cycle:
+                    return _cycle
+            elif neighbor in on_stack:
+                return stack[stack.index(neighbor):] + [neighbor]
+        stack.pop()
+        on_stack.remove(node)
+        return None
+
+    for start_node in graph:
+        if start_node not in visited:
+            cycle = dfs(start_node)
+            if cycle:
+                return tuple(cycle)
+    return tuple()
+
+
+class TestGraphUtils(TestCase):
+    def setUp(self):
+        # node -> users
+        self.graph = {
+            'target': {'a', 'b'},
+            'a': {'app'},
+            'b': {'c', 'tool'},
+            'c': {'app'},
+            'app': set(),
+            'tool': set(),
+            'unrelated': set(),
+        }
+
+    def test1_shortest_paths_from_leaves(self):
+        paths = get_shortest_paths_from_leaves(self.graph, 'target', key=str)
+        self.assertListEqual([('app', 'a', 'target'), ('tool', 'b', 'target')],
+                             sorted(paths))
+        self.assertListEqual([('app',)],
+                             get_shortest_paths_from_leaves(self.graph, 'app'))
+
+    def test2_users_closure(self):
+        self.assertSetEqual({'target', 'a', 'b', 'c', 'app', 'tool'},
+                            get_users_closure(self.graph, 'target'))
+        self.assertSetEqual({'c', 'app'}, get_users_closure(self.graph, 'c'))
+
+    def test3_dead_nodes_index(self):
+        index = DeadNodesIndex(self.graph)
+        self.assertSetEqual({'app', 'a', 'c'}, index.find_dead({'app'}))
+        self.assertSetEqual({'app', 'tool', 'a', 'b', 'c', 'target'},
+                            index.find_dead({'app', 'tool'}))
+        # queries do not change the index
+        self.assertSetEqual({'app', 'a', 'c'}, index.find_dead(['app']))
+        self.assertSetEqual(find_dead_nodes(self.graph, {'b', 'tool'}),
+                            index.find_dead({'b', 'tool'}))
+
+    def test4_cycles_like_recursive(self):
+        rnd = random.Random(0)
+        for _ in range(300):
+            size = rnd.randint(1, 12)
+            graph = dict((node, set(rnd.sample(range(size + 2), rnd.randint(0, 2))))
+                         for node in range(size))
+            cycle = find_cycle(graph)
+            self.assertEqual(_recursive_find_cycle(graph), cycle)
+            self.assertEqual(bool(cycle), graph_utils.test_graph_loops(graph))
+
+    def test5_deep_chain(self):
+        size = 100000
+        # deeper than the recursion limit
+        graph = dict((node, {node + 1}) for node in range(size))
+        graph[size] = set()
+        self.assertFalse(graph_utils.test_graph_loops(graph))
+        self.assertEqual(find_cycle(graph), ())
+        graph[size] = {size // 2}
+        self.assertTrue(graph_utils.test_graph_loops(graph))
+        cycle = find_cycle(graph)
+        self.assertEqual(len(cycle), size // 2 + 2)
+        self.assertEqual((cycle[0], cycle[-2], cycle[-1]), (size // 2, size, size // 2))
@@ -0,0 +1,126 @@
+import ast
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+from unittest import TestCase, mock
+
+from extra import importlib_utils
+from extra.import_scan_utils import parse_file_imports, scan_source_tree, \
+    find_unused_leaves, _get_str_literal
+from extra.importlib_utils import get_top_level_names
+from pip_autoremove import list_unused
+from test_utils.fixture_utils import make_site_packages
+
+
+class TestImportScanUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_site_packages(os.path.join(self._tmp.name, 'site'), {
+            'app-framework': {'requires': ['lib-core'], 'top_level': ['framework']},
+            'plugin': {'requires': ['lib-core', 'lib-extra']},
+            'lib-core': {'top_level': ['core']},
+            'lib-extra': {'files': {'lib_extra/__init__.py': '',
+                                    'extra_mod.py': ''}},
+            'unused-tool': {'requires': ['lib-extra']},
+        })
+        self.source = os.path.join(self._tmp.name, 'src')
+        self.__write('main.py', 'import os\nfrom framework.app import App\n'
+                                'from . import local\n')
+        self.__write('pkg/utils.py', 'import importlib\n'
+                                     'importlib.import_module("core.tools")\n')
+        self.__write('pkg/broken.py', 'import plugin\ndef broken(:\n')
+        self.__write('.venv/lib/skipped.py', 'import plugin\n')
+        self.cache_path = os.path.join(self._tmp.name, 'cache', 'imports.json')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def __write(self, name, content):
+        path = os.path.join(self.source, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test1_parse_file_imports(self):
+        self.assertListEqual(['framework', 'os'],
+                             parse_file_imports(os.path.join(self.source, 'main.py')))
+        self.assertListEqual(['core', 'importlib'],
+                             parse_file_imports(os.path.join(self.source, 'pkg/utils.py')))
+        self.assertListEqual([], parse_file_imports(
+            os.path.join(self.source, 'pkg/broken.py')))
+        self.assertListEqual(['extra_mod', 'lib_extra'], get_top_level_names(
+            None, 'lib_extra/__init__.py,,\nextra_mod.py,,\n'
+                  'lib_extra-1.0.dist-info/RECORD,,\n../../bin/tool,,\n'))
+
+    def test2_incremental_cache(self):
+        imported, parsed = scan_source_tree(self.source, cache_path=self.cache_path)
+        self.assertSetEqual({'os', 'framework', 'importlib', 'core'}, imported)
+        self.assertEqual(3, parsed)
+        imported_again, parsed = scan_source_tree(self.source, cache_path=self.cache_path)
+        self.assertSetEqual(imported, imported_again)
+        self.assertEqual(0, parsed)
+        path = self.__write('main.py', 'import json\n')
+        os.utime(path, ns=(1, 1))
+        imported, parsed = scan_source_tree(self.source, cache_path=self.cache_path)
+        self.assertEqual(1, parsed)
+        self.assertSetEqual({'json', 'importlib', 'core'}, imported)
+
+    def test3_find_unused_leaves(self):
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        unused = find_unused_leaves(util, self.source, jobs=1)
+        self.assertListEqual(
+            [('plugin', ['plugin']), ('unused-tool', ['unused-tool'])],
+            [(leaf.name_general, sorted(d.name_general for d in dead))
+             for leaf, dead in unused])
+        self.__write('main.py', 'import os\n')
+        unused = find_unused_leaves(util, self.source, jobs=1)
+        # lib-core is still imported by pkg/utils.py
+        self.assertListEqual(
+            [('app-framework', ['app-framework']), ('plugin', ['plugin']),
+             ('unused-tool', ['unused-tool'])],
+            [(leaf.name_general, sorted(d.name_general for d in dead))
+             for leaf, dead in unused])
+        self.__write('pkg/utils.py', '')
+        unused = dict((leaf.name_general, sorted(d.name_general for d in dead))
+                      for leaf, dead in find_unused_leaves(util, self.source, jobs=1))
+        # lib-core is used by both app-framework and plugin
+        self.assertListEqual(['app-framework'], unused['app-framework'])
+        self.assertListEqual(['plugin'], unused['plugin'])
+        self.assertNotIn('lib-core', unused)
+
+    def test4_dynamic_imports(self):
+        self.assertEqual('core.tools', _get_str_literal(
+            ast.parse('"core.tools"', mode='eval').body))
+        self.assertIsNone(_get_str_literal(ast.parse('1', mode='eval').body))
+        self.assertIsNone(_get_str_literal(ast.parse('name', mode='eval').body))
+        path = self.__write('pkg/dynamic.py', '__import__("plugin.sub")\n'
+                                              'import_module(name)\n'
+                                              'import_module(b"lib_extra")\n'
+                                              'import_module(".relative")\n')
+        self.assertListEqual(['plugin'], parse_file_imports(path))
+
+    def test5_no_import_cache(self):
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        cache_home = os.path.join(self._tmp.name, 'cache-home')
+        out = io.StringIO()
+        with redirect_stdout(out), mock.patch.dict(os.environ, XDG_CACHE_HOME=cache_home):
+            list_unused(self.source, jobs=1, lib=util, use_cache=False)
+        self.assertFalse(os.path.exists(cache_home))
+        self.assertIn('unused-tool', out.getvalue())
+        with redirect_stdout(io.StringIO()), \
+                mock.patch.dict(os.environ, XDG_CACHE_HOME=cache_home):
+            list_unused(self.source, jobs=1, lib=util)
+        self.assertTrue(os.listdir(os.path.join(cache_home, 'pip-autoremove')))
+
+    def test6_missing_source_dir(self):
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        missing = os.path.join(self._tmp.name, 'missing')
+        with self.assertRaises(FileNotFoundError):
+            scan_source_tree(missing)
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            self.assertIsNone(list_unused(missing, jobs=1, lib=util, use_cache=False))
+        self.assertEqual('', out.getvalue())
+        self.assertIn('not found', err.getvalue())
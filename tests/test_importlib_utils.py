@@ -1,11 +1,15 @@
 import logging
+import os
 import sys
+import tempfile
 from unittest import TestCase
 
 from extra import importlib_utils
 from extra.importlib_utils import ImportUtilsPkgResources, ImportUtilsImportlib, \
     ImportUtils
-from test_utils.install_utils import need_dists
+from extra.extra_utils import get_requirements_graph, patch_requirements_graph
+from test_utils.fixture_utils import make_site_packages
+from test_utils.install_utils import need_dists, install_dist, uninstall_dist
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +46,92 @@ class TestImportUtils(TestCase):
         self.assertListEqual(requirements[0], requirements[1])
         pass
 
+    def test3_refresh_known_distributions(self):
+        util = importlib_utils.ImportUtilsFactory.create()
+        try:
+            util.get_distribution('jinja2')
+            uninstall_dist('jinja2')
+            util.refresh_known_distributions()
+        except util.InstalledDependencyNotFound:
+            pass
+        graph = get_requirements_graph(util)
+        kept = util.get_distribution('pip')
+
+        install_dist('jinja2')
+        delta = util.refresh_known_distributions()
+        self.assertIn('jinja2', [d.name_general for d in delta.added])
+        self.assertNotIn('pip', [d.name_general for d in delta.added + delta.changed])
+        self.assertIs(kept, util.get_distribution('pip'))
+        patch_requirements_graph(util, graph, delta)
+        util_full = importlib_utils.ImportUtilsFactory.create()
+        self.assertEqual(_graph_names(get_requirements_graph(util_full)),
+                         _graph_names(graph))
+
+        uninstall_dist('jinja2')
+        delta = util.refresh_known_distributions()
+        self.assertEqual(['jinja2'], [d.name_general for d in delta.removed])
+        self.assertFalse(delta.added)
+        patch_requirements_graph(util, graph, delta)
+        util_full.clear_known_distributions()
+        self.assertEqual(_graph_names(get_requirements_graph(util_full)),
+                         _graph_names(graph))
+
+    def test4_compact_records(self):
+        util1 = importlib_utils.ImportUtilsFactory.create()
+        util2 = importlib_utils.ImportUtilsFactory.create()
+        dist1, dist2 = util1.get_distribution('pip'), util2.get_distribution('PIP')
+        self.assertIsNot(dist1, dist2)
+        self.assertEqual(dist1, dist2)
+        self.assertEqual(hash(dist1), hash(dist2))
+        self.assertFalse(hasattr(dist1, '__dict__'))
+        self.assertEqual(get_requirements_graph(util1), get_requirements_graph(util2))
+
+        frozen = dist1.freeze()
+        self.assertEqual(dist1, frozen)
+        self.assertIs(frozen, frozen.freeze())
+        with self.assertRaises(AttributeError):
+            frozen._version = '0'
+
+    def test5_pkg_resources_requirements(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            site_packages = make_site_packages(os.path.join(tmp, 'site'), {
+                'app': {'requires': ['Lib_A[fast]>=1.0', 'lib-b; extra == "cli"',
+                                     'backport; python_version < "3"', 'absent'],
+                        'extras': ['cli']},
+                'lib-a': {}, 'lib-b': {}, 'backport': {},
+            })
+            try:
+                util1 = ImportUtilsPkgResources([site_packages])
+            except Exception as e:
+                self.skipTest("pkg_resources is not available: %s" % e)
+            util2 = ImportUtilsImportlib([site_packages])
+            requirements = [[(r.name_general, r.enabled_extras, r.condition_extra)
+                             for r in util.get_distribution('app').requirements]
+                            for util in (util1, util2)]
+        self.assertListEqual(
+            [('lib-a', ['fast'], None), ('lib-b', None, 'cli')], requirements[0])
+        self.assertListEqual(requirements[0], requirements[1])
+
+    def test6_pkg_resources_refresh(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            site_packages = make_site_packages(os.path.join(tmp, 'site'), {
+                'app': {'requires': ['lib-a']}, 'lib-a': {},
+            })
+            try:
+                util = ImportUtilsPkgResources([site_packages])
+            except Exception as e:
+                self.skipTest("pkg_resources is not available: %s" % e)
+            self.assertEqual(['app', 'lib-a'],
+                             [d.name_general for d in util.get_installed_distributions()])
+            make_site_packages(site_packages, {'tool': {'requires': ['lib-a']}})
+            delta = util.refresh_known_distributions()
+        self.assertEqual(['tool'], [d.name_general for d in delta.added])
+        self.assertFalse(delta.removed)
+
+
+def _graph_names(graph):
+    return {k.name_general: set(v.name_general for v in vs) for k, vs in graph.items()}
+
 
 def main():
     logging.basicConfig(level=logging.INFO)
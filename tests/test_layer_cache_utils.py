@@ -0,0 +1,86 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.extra_utils import get_requirements_graph
+from extra.layer_cache_utils import LayerCache, is_base_layer
+from test_utils.fixture_utils import make_site_packages, make_dist_info
+
+
+class TestLayerCacheUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self._tmp.name, 'cache')
+        self.base = make_site_packages(os.path.join(self._tmp.name, 'base'), {
+            'requests': {'requires': ['urllib3', 'idna']},
+            'urllib3': {},
+            'idna': {},
+            'six': {'version': '1.0'},
+        })
+        self.venv = make_site_packages(os.path.join(self._tmp.name, 'venv'), {
+            'app': {'requires': ['requests', 'six']},
+            'six': {'version': '2.0'},
+        })
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def __create(self):
+        layer_cache = LayerCache(self.cache_dir, [self.base])
+        lib = importlib_utils.ImportUtilsImportlib([self.venv, self.base], layer_cache)
+        return lib, layer_cache
+
+    @staticmethod
+    def __graph(lib):
+        return dict((dist.name, sorted(user.name for user in users))
+                    for dist, users in get_requirements_graph(lib).items())
+
+    def test1_layers(self):
+        lib, layer_cache = self.__create()
+        expected = {'app': [], 'requests': ['app'], 'six': ['app'],
+                    'urllib3': ['requests'], 'idna': ['requests']}
+        self.assertEqual(self.__graph(lib), expected)
+        # the environment layer has precedence over the base one
+        self.assertEqual(lib.get_distribution('six').version, '2.0')
+        self.assertEqual((layer_cache.hits, layer_cache.misses), (0, 1))
+        self.assertTrue(os.path.isfile(layer_cache.get_cache_path(self.base)))
+
+        # METADATA of the unchanged base layer is not read again
+        lib, layer_cache = self.__create()
+        self.assertEqual(self.__graph(lib), expected)
+        self.assertEqual((layer_cache.hits, layer_cache.misses), (1, 0))
+
+        # METADATA rewritten in place (the layer directory is not modified)
+        stat = os.stat(self.base)
+        make_dist_info(self.base, 'requests', requires=['urllib3', 'idna', 'six'])
+        os.utime(self.base, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        expected['six'] = ['app', 'requests']
+        lib, layer_cache = self.__create()
+        self.assertEqual(self.__graph(lib), expected)
+        self.assertEqual((layer_cache.hits, layer_cache.misses), (0, 1))
+        make_dist_info(self.base, 'requests', requires=['urllib3'])
+        os.utime(self.base, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        # modified layer is indexed again
+        os.utime(self.base, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        lib, layer_cache = self.__create()
+        self.assertEqual(self.__graph(lib)['idna'], [])
+        self.assertEqual((layer_cache.hits, layer_cache.misses), (0, 1))
+
+    def test2_refresh(self):
+        lib, layer_cache = self.__create()
+        lib.get_installed_distributions()
+        make_dist_info(self.venv, 'tool', requires=['idna'])
+        delta = lib.refresh_known_distributions()
+        self.assertEqual([d.name for d in delta.added], ['tool'])
+        self.assertEqual(delta.changed + delta.removed, [])
+        self.assertEqual(self.__graph(lib)['idna'], ['requests', 'tool'])
+        self.assertEqual(layer_cache.misses, 1)
+
+    def test3_read_only_is_not_base_layer(self):
+        os.chmod(self.base, 0o555)
+        try:
+            self.assertFalse(is_base_layer(self.base))
+        finally:
+            os.chmod(self.base, 0o755)
@@ -0,0 +1,76 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stderr
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.binary_graph_utils import write_binary_graph
+from extra.extra_utils import get_requirements_graph
+from extra.graph_utils import get_graph_leaves
+from extra.marker_utils import MarkerEvaluator, make_python_environment
+from extra.snapshot_utils import ImportUtilsSnapshot, make_snapshot
+from pip_autoremove import main
+from test_utils.fixture_utils import make_site_packages
+
+
+class TestMarkerUtils(TestCase):
+    def test1_cache(self):
+        evaluator = MarkerEvaluator()
+        self.assertTrue(evaluator.evaluate_requirement('requests'))
+        self.assertEqual(evaluator.misses, 0)
+        self.assertTrue(evaluator.evaluate_requirement('lib; extra == "cli"', 'cli'))
+        self.assertFalse(evaluator.evaluate_requirement('lib; extra == "cli"'))
+        self.assertTrue(evaluator.evaluate_requirement('other; extra == "cli"', 'cli'))
+        self.assertEqual(evaluator.misses, 2)
+        self.assertEqual(evaluator.hits, 1)
+        with self.assertRaises(ValueError):
+            evaluator.evaluate_requirement('lib; python_version <')
+
+    def test2_target_environment(self):
+        req = 'backport; python_version < "3.8"'
+        self.assertFalse(MarkerEvaluator().evaluate_requirement(req))
+        evaluator = MarkerEvaluator(make_python_environment('3.7'))
+        self.assertTrue(evaluator.evaluate_requirement(req))
+        self.assertEqual(evaluator.environment['python_full_version'], '3.7.0')
+        with self.assertRaises(ValueError):
+            make_python_environment('three')
+
+    def test3_snapshot_for_python_version(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            site_packages = make_site_packages(os.path.join(tmp, 'site'), {
+                'app': {'requires': ['backport; python_version < "3.8"']},
+                'backport': {},
+            })
+            util = importlib_utils.ImportUtilsFactory.create([site_packages])
+            snapshot = make_snapshot(util)
+
+        leaves = get_graph_leaves(get_requirements_graph(ImportUtilsSnapshot(snapshot)))
+        self.assertSetEqual({d.name_general for d in leaves}, {'app', 'backport'})
+        snapshot_util = ImportUtilsSnapshot(snapshot, make_python_environment('3.7'))
+        leaves = get_graph_leaves(get_requirements_graph(snapshot_util))
+        self.assertSetEqual({d.name_general for d in leaves}, {'app'})
+
+    def test4_python_version_with_binary_graph(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            site_packages = make_site_packages(os.path.join(tmp, 'site'), {
+                'app': {'requires': ['backport; python_version < "3.8"']},
+                'backport': {},
+            })
+            util = importlib_utils.ImportUtilsFactory.create([site_packages])
+            graph_path = os.path.join(tmp, 'env.bin')
+            write_binary_graph(util, graph_path)
+            err = io.StringIO()
+            with redirect_stderr(err), self.assertRaises(SystemExit):
+                main(['--snapshot', graph_path, '--python-version', '3.7', '-L'])
+        self.assertIn('--python-version cannot be used with binary graphs', err.getvalue())
+
+    def test5_invalid_python_version(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot_path = os.path.join(tmp, 'env.json')
+            with open(snapshot_path, 'w') as f:
+                f.write('{}')
+            err = io.StringIO()
+            with redirect_stderr(err), self.assertRaises(SystemExit):
+                main(['--snapshot', snapshot_path, '--python-version', '3', '-L'])
+        self.assertIn('--python-version: Invalid python version "3"', err.getvalue())
@@ -0,0 +1,87 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from extra import importlib_utils, metadata_cache_utils
+from extra.extra_utils import get_requirements_graph
+from extra.metadata_cache_utils import MetadataCache
+from test_utils.fixture_utils import make_site_packages
+
+
+class TestMetadataCacheUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self._tmp.name, 'cache')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def __packs(self):
+        return sorted(os.path.join(shard, name)
+                      for shard in os.listdir(self.cache_dir)
+                      for name in os.listdir(os.path.join(self.cache_dir, shard))
+                      if name.endswith('.json'))
+
+    def test1_shared_by_environments(self):
+        shared = {
+            'requests': {'requires': ['urllib3', 'idna; python_version >= "3"'],
+                         'extras': ['socks']},
+            'urllib3': {},
+            'idna': {},
+        }
+        env1 = make_site_packages(os.path.join(self._tmp.name, 'env1'),
+                                  dict(shared, app={'requires': ['requests']}))
+        env2 = make_site_packages(os.path.join(self._tmp.name, 'env2'),
+                                  dict(shared, tool={'requires': ['requests[socks]']}))
+        graphs = list()
+        caches = list()
+        for env in (env1, env2):
+            cache = MetadataCache(self.cache_dir)
+            lib = importlib_utils.ImportUtilsImportlib([env], metadata_cache=cache)
+            graphs.append(dict((d.name, sorted(u.name for u in users))
+                               for d, users in get_requirements_graph(lib).items()))
+            caches.append(cache)
+        self.assertEqual((caches[0].hits, caches[0].misses), (0, 4))
+        # the same METADATA is parsed once for both environments
+        self.assertEqual((caches[1].hits, caches[1].misses), (3, 1))
+        self.assertEqual(graphs[0]['requests'], ['app'])
+        self.assertEqual(graphs[1]['requests'], ['tool'])
+        self.assertEqual(graphs[1]['idna'], ['requests'])
+        lib = importlib_utils.ImportUtilsImportlib([env2])
+        self.assertEqual(lib.get_distribution('requests').available_extras, ['socks'])
+        # one pack per shard of every flush
+        self.assertEqual(len(self.__packs()), 5)
+
+    def test2_merge_packs(self):
+        # digests of one shard
+        for i in range(metadata_cache_utils.MAX_PACKS + 1):
+            cache = MetadataCache(self.cache_dir)
+            cache.put('abc%d' % i, {'index': i})
+            cache.flush()
+        self.assertEqual(self.__packs()[0].split(os.sep)[0], 'ab')
+        self.assertEqual(len(self.__packs()), 1)
+        with open(os.path.join(self.cache_dir, 'ab', 'pack-broken.json'), 'w') as f:
+            f.write('{')
+        cache = MetadataCache(self.cache_dir)
+        self.assertEqual(cache.get('abc0'), {'index': 0})
+        self.assertEqual(cache.get('abc%d' % metadata_cache_utils.MAX_PACKS),
+                         {'index': metadata_cache_utils.MAX_PACKS})
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test3_shards(self):
+        max_entries = metadata_cache_utils.MAX_SHARD_ENTRIES
+        cache = MetadataCache(self.cache_dir)
+        cache.put('fff', {'other': True})
+        for i in range(max_entries * 2):
+            cache.put('abc%d' % i, {'index': i})
+            if i % (max_entries // 2) == 0:
+                cache.flush()
+        cache.flush()
+        cache = MetadataCache(self.cache_dir)
+        # the lookup reads its shard only, the oldest entries are evicted
+        self.assertIsNone(cache.get('abc0'))
+        self.assertLessEqual(cache.loaded, max_entries * 2)
+        self.assertEqual(cache.get('abc%d' % (max_entries * 2 - 1)),
+                         {'index': max_entries * 2 - 1})
+        self.assertEqual(cache.get('fff'), {'other': True})
@@ -0,0 +1,84 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.metrics_utils import AnalysisMetrics
+from pip_autoremove import list_dead, list_leaves
+from test_utils.fixture_utils import make_site_packages
+
+
+class TestMetricsUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_site_packages(os.path.join(self._tmp.name, 'site'), {
+            'app': {'requires': ['lib-a', 'cyc-a']},
+            'cyc-a': {'requires': ['cyc-b']},
+            'cyc-b': {'requires': ['cyc-a']},
+            'lib-a': {'requires': ['shared'], 'files': {'lib_a/__init__.py': 'x = 1\n'}},
+            'tool': {'requires': ['shared']},
+            'shared': {},
+        })
+        self.metrics_file = os.path.join(self._tmp.name, 'pip_autoremove.prom')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def __read_samples(self):
+        samples = dict()
+        with open(self.metrics_file, 'r') as f:
+            for line in f:
+                if not line.startswith('#'):
+                    name, value = line.rsplit(' ', 1)
+                    samples[name] = float(value)
+        return samples
+
+    def test1_format(self):
+        metrics = AnalysisMetrics()
+        metrics.set('leaves', 3, "Leaves.")
+        metrics.set('phase_duration_seconds', 0.5, "Phase.", {'phase': 'scan'})
+        metrics.set('phase_duration_seconds', 1.5, "Phase.", {'phase': 'scan'})
+        metrics.set('cache_hits', 1, "Hits.", {'cache': 'a"b\\c\nd'})
+        metrics.set_cache('marker', 0, 0)
+        self.assertEqual(metrics.format(), (
+            '# HELP pip_autoremove_leaves Leaves.\n'
+            '# TYPE pip_autoremove_leaves gauge\n'
+            'pip_autoremove_leaves 3\n'
+            '# HELP pip_autoremove_phase_duration_seconds Phase.\n'
+            '# TYPE pip_autoremove_phase_duration_seconds gauge\n'
+            'pip_autoremove_phase_duration_seconds{phase="scan"} 1.5\n'
+            '# HELP pip_autoremove_cache_hits Hits.\n'
+            '# TYPE pip_autoremove_cache_hits gauge\n'
+            'pip_autoremove_cache_hits{cache="a\\"b\\\\c\\nd"} 1\n'
+            'pip_autoremove_cache_hits{cache="marker"} 0\n'
+            '# HELP pip_autoremove_cache_misses Lookups missing in the cache.\n'
+            '# TYPE pip_autoremove_cache_misses gauge\n'
+            'pip_autoremove_cache_misses{cache="marker"} 0\n'))
+
+    def test2_list_leaves(self):
+        lib = importlib_utils.ImportUtilsImportlib([self.site_packages])
+        with redirect_stdout(io.StringIO()):
+            list_leaves(lib=lib, metrics_file=self.metrics_file)
+        samples = self.__read_samples()
+        self.assertEqual(samples['pip_autoremove_packages'], 6)
+        self.assertEqual(samples['pip_autoremove_leaves'], 2)
+        self.assertEqual(samples['pip_autoremove_cycle_edges_cut'], 1)
+        self.assertEqual(samples['pip_autoremove_analysis_complete'], 1)
+        for phase in ('scan', 'edges', 'cycles', 'extras'):
+            self.assertGreaterEqual(
+                samples['pip_autoremove_phase_duration_seconds{phase="%s"}' % phase], 0)
+        self.assertIn('pip_autoremove_cache_hits{cache="marker"}', samples)
+        self.assertNotIn('pip_autoremove_reclaimable_packages', samples)
+        # the temporary file is renamed
+        self.assertEqual(sorted(os.listdir(self._tmp.name)), ['pip_autoremove.prom', 'site'])
+
+    def test3_list_dead(self):
+        lib = importlib_utils.ImportUtilsImportlib([self.site_packages])
+        with redirect_stdout(io.StringIO()):
+            dead = list_dead(['app'], lib=lib, metrics_file=self.metrics_file)
+        self.assertEqual(sorted(d.name for d in dead), ['app', 'cyc-a', 'cyc-b', 'lib-a'])
+        samples = self.__read_samples()
+        self.assertEqual(samples['pip_autoremove_reclaimable_packages'], 4)
+        self.assertGreater(samples['pip_autoremove_reclaimable_bytes'], 0)
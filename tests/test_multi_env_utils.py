@@ -0,0 +1,102 @@
+import io
+import json
+import os
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import TestCase, mock
+
+from extra.importlib_utils import ImportUtilsFactory, ImportUtilsPkgResources
+from extra.marker_utils import get_current_environment
+from extra.multi_env_utils import analyze_environments, get_environment_paths, \
+    get_environment_layout
+from pip_autoremove import main
+from test_utils.fixture_utils import make_site_packages
+
+
+class TestMultiEnvUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.env1 = make_site_packages(self._tmp.name + '/env1', {
+            'app': {'requires': ['lib-a', 'lib-b[fast]>=1.0']},
+            'lib-a': {'requires': ['lib-b']},
+            'lib-b': {},
+        })
+        self.env2 = make_site_packages(self._tmp.name + '/env2', {
+            'tool': {},
+            'orphan': {'requires': ['missing-dist']},
+        })
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test1_analyze_environments(self):
+        results = analyze_environments([self.env1, self.env2], jobs=2)
+        self.assertEqual([self.env1, self.env2],
+                         [r['environment'] for r in results])
+        self.assertEqual(['app'], [leaf['name'] for leaf in results[0]['leaves']])
+        self.assertEqual(3, results[0]['distributions_count'])
+        self.assertEqual(['orphan', 'tool'],
+                         [leaf['name'] for leaf in results[1]['leaves']])
+
+    def test2_bad_environment(self):
+        results = analyze_environments([self._tmp.name + '/missing'])
+        self.assertIsNotNone(results[0]['error'])
+        self.assertEqual([], results[0]['leaves'])
+
+    def test3_interpreter_paths(self):
+        paths = get_environment_paths(sys.executable)
+        self.assertTrue(any('site-packages' in path for path in paths))
+        self.assertEqual(get_current_environment(), get_environment_layout(sys.executable)[2])
+
+    def test4_incompatible_options(self):
+        for argv, message in ((['--env', self.env1, 'app'], 'packages cannot be given: app'),
+                              (['--env', self.env1, '-l', '-y'], 'combined with -l, -y')):
+            err = io.StringIO()
+            with redirect_stderr(err), self.assertRaises(SystemExit):
+                main(argv)
+            self.assertIn(message, err.getvalue())
+        out = io.StringIO()
+        with redirect_stdout(out):
+            main(['--env', self.env1, '-f', '--no-layer-cache', '--no-metadata-cache'])
+        self.assertEqual(out.getvalue(), '# %s\napp==1.0\n' % self.env1)
+
+    def __make_interpreter(self, python_version):
+        # reports env1 as its sys.path and markers of another python version
+        markers = get_current_environment()
+        markers['python_version'] = python_version
+        markers['python_full_version'] = python_version + '.0'
+        path = os.path.join(self._tmp.name, 'python%s' % python_version)
+        with open(path, 'w') as f:
+            f.write("#!/bin/sh\necho '%s'\n" % json.dumps(
+                [[self.env1], self._tmp.name, self._tmp.name, markers]))
+        os.chmod(path, 0o755)
+        return path
+
+    def test5_interpreter_markers(self):
+        # markers are evaluated for the python version of the interpreter
+        make_site_packages(self.env1, {
+            'tool': {'requires': ['backport; python_version < "3"']},
+            'backport': {},
+        })
+        python2 = self.__make_interpreter('2.7')
+        python3 = self.__make_interpreter('3.8')
+        results = analyze_environments([python2, python3, self.env1], jobs=1)
+        self.assertEqual([None] * 3, [r['error'] for r in results])
+        self.assertEqual([['app', 'tool'], ['app', 'backport', 'tool'],
+                          ['app', 'backport', 'tool']],
+                         [[leaf['name'] for leaf in r['leaves']] for r in results])
+
+    def test6_pkg_resources_interpreter(self):
+        python = self.__make_interpreter('2.7')
+        try:
+            ImportUtilsPkgResources([self.env1])
+        except Exception as e:
+            self.skipTest("pkg_resources is not available: %s" % e)
+
+        def create(paths, *args):
+            return ImportUtilsPkgResources(paths)
+
+        with mock.patch.object(ImportUtilsFactory, 'create', side_effect=create):
+            results = analyze_environments([python], jobs=1)
+        self.assertIn('pkg_resources backend cannot evaluate', results[0]['error'])
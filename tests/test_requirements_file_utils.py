@@ -0,0 +1,89 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+from unittest import TestCase, mock
+
+from extra import importlib_utils
+from extra.requirements_file_utils import iter_requirements_file, \
+    load_requirements_file
+import pip_autoremove
+from test_utils.fixture_utils import make_site_packages
+
+
+class TestRequirementsFileUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_site_packages(os.path.join(self._tmp.name, 'site'), {
+            'app': {}, 'Lib_A': {}, 'lib-b': {}, 'tool': {}, 'editable-pkg': {},
+        })
+        self.requirements = self.__write('requirements.txt', [
+            '# purge list',
+            'app>=1.0  # inline comment',
+            '',
+            '--index-url https://example.org/simple',
+            'lib.a[fast] ; python_version >= "3"',
+            'backport; python_version < "3"',
+            'lib-b==1.0 \\',
+            '    --hash=sha256:0000',
+            'https://example.org/archive.zip',
+            '-e git+https://example.org/repo.git#egg=editable-pkg',
+            '-r nested/more.txt',
+            'not-installed',
+        ])
+        self.__write('nested/more.txt', [
+            'tool', 'app', '--requirement ../requirements.txt', 'missing-too'])
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def __write(self, name, lines):
+        path = os.path.join(self._tmp.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def test1_iter_requirements_file(self):
+        self.assertListEqual([
+            'app>=1.0', 'lib.a[fast] ; python_version >= "3"',
+            'backport; python_version < "3"', 'lib-b==1.0', 'editable-pkg',
+            'tool', 'app', 'missing-too', 'not-installed',
+        ], list(iter_requirements_file(self.requirements)))
+
+    def test2_load_requirements_file(self):
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        dists, missing = load_requirements_file(util, self.requirements)
+        self.assertListEqual(['app', 'Lib_A', 'lib-b', 'editable-pkg', 'tool'],
+                             [d.name for d in dists])
+        self.assertListEqual(['missing-too', 'not-installed'], missing)
+
+    def test3_unsupported_option(self):
+        path = self.__write('bad.txt', ['app', '--unknown-option'])
+        with self.assertRaises(ValueError):
+            list(iter_requirements_file(path))
+
+    def test4_main(self):
+        make_site_packages(self.site_packages, {
+            'zope.interface': {}, 'zope.deps': {'requires': ['zope.interface']}})
+        path = self.__write('zope.txt', ['zope.deps'])
+        missing_nested = self.__write('missing.txt', ['app', '-r missing-nested.txt'])
+        saved = pip_autoremove._import_utils_lib
+        pip_autoremove._import_utils_lib = \
+            importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        out, err = io.StringIO(), io.StringIO()
+        try:
+            with redirect_stdout(out), redirect_stderr(err), \
+                    mock.patch.object(pip_autoremove, 'confirm', return_value=False):
+                pip_autoremove.main(['-r', path])
+                pip_autoremove.main(['-r', missing_nested])
+        finally:
+            pip_autoremove._import_utils_lib = saved
+        lines = out.getvalue().splitlines()
+        # resolved distributions are not looked up by name again
+        self.assertEqual(lines[:2], [
+            'zope.deps 1.0 (%s)' % self.site_packages,
+            '    zope.interface 1.0 (%s)' % self.site_packages])
+        self.assertEqual(err.getvalue(), '')
+        self.assertEqual(lines[2], 'File \'%s\' not found!' % os.path.join(
+            self._tmp.name, 'missing-nested.txt'))
@@ -0,0 +1,121 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.extra_utils import get_requirements_graph
+from extra.graph_utils import get_graph_leaves
+from extra.snapshot_utils import ImportUtilsSnapshot, export_snapshot, make_snapshot
+from pip_autoremove import show_tree, main
+from test_utils.fixture_utils import make_site_packages
+
+
+def _graph_names(graph):
+    return {k.name_general: set(v.name_general for v in vs) for k, vs in graph.items()}
+
+
+class TestSnapshotUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_site_packages(self._tmp.name + '/site', {
+            'app': {'requires': ['lib-a', 'Lib_B[fast]>=1.0'], 'extras': ['cli']},
+            'lib-a': {'requires': ['lib-b', 'click; extra == "cli"']},
+            'lib-b': {'version': '2.0'},
+            'click': {},
+        })
+        self.snapshot_path = os.path.join(self._tmp.name, 'snapshot.json')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test1_round_trip(self):
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        export_snapshot(util, self.snapshot_path)
+        snapshot_util = ImportUtilsSnapshot(self.snapshot_path)
+
+        self.assertEqual(
+            [(d.name, d.version) for d in util.get_installed_distributions()],
+            [(d.name, d.version) for d in snapshot_util.get_installed_distributions()])
+        for dist in util.get_installed_distributions():
+            self.assertListEqual(
+                dist.requirements,
+                snapshot_util.get_distribution(dist.name).requirements)
+        for extras in (False, True):
+            self.assertEqual(_graph_names(get_requirements_graph(util, extras)),
+                             _graph_names(get_requirements_graph(snapshot_util, extras)))
+        leaves = get_graph_leaves(get_requirements_graph(snapshot_util))
+        self.assertEqual({'app', 'click'}, set(d.name_general for d in leaves))
+
+    def test2_not_a_snapshot(self):
+        with open(self.snapshot_path, 'w') as f:
+            f.write('{}')
+        with self.assertRaises(ValueError):
+            ImportUtilsSnapshot(self.snapshot_path)
+        with open(self.snapshot_path, 'w') as f:
+            f.write('app==1.0\n')
+        with self.assertRaisesRegex(ValueError, 'is not a pip-autoremove snapshot'):
+            ImportUtilsSnapshot(self.snapshot_path)
+        missing_path = os.path.join(self._tmp.name, 'missing.json')
+        for path in (self.snapshot_path, missing_path):
+            out, err = io.StringIO(), io.StringIO()
+            with redirect_stdout(out), redirect_stderr(err):
+                main(['--snapshot', path, '-L'])
+            self.assertEqual('', out.getvalue())
+            self.assertIn(path, err.getvalue())
+
+    def test3_show_deep_chain(self):
+        size = 5000
+        snapshot = make_snapshot(importlib_utils.ImportUtilsFactory.create([self.site_packages]))
+        # the chain of requirements is deeper than the recursion limit
+        snapshot['distributions'] = [{
+            'name': 'pkg%d' % i, 'version': '1.0', 'location': None, 'extras': [],
+            'requires': None,
+            'requirements': [{'name': 'pkg%d' % (i + 1), 'enabled_extras': [],
+                              'condition_extra': None}] if i + 1 < size else [],
+        } for i in range(size)]
+        lib = ImportUtilsSnapshot(snapshot)
+        dists = lib.get_installed_distributions()
+        dead = set(d for d in dists if d.name != 'pkg%d' % (size - 1))
+        out = io.StringIO()
+        with redirect_stdout(out):
+            show_tree(lib.get_distribution('pkg0'), dead, dists, lib=lib)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), size - 1)
+        self.assertEqual(lines[-1], ' ' * 4 * (size - 2) + 'pkg%d 1.0 (None)' % (size - 2))
+
+    def test4_malformed_requirements(self):
+        snapshot = make_snapshot(importlib_utils.ImportUtilsFactory.create([self.site_packages]))
+        app = [d for d in snapshot['distributions'] if d['name'] == 'app'][0]
+        app['requirements'] = [
+            {'name': 'lib-a', 'enabled_extras': [], 'condition_extra': None},
+            {'name': 'lib-b', 'enabled_extras': [], 'condition_extra': ''},
+            {'name': 'click', 'enabled_extras': []},
+            {'enabled_extras': [], 'condition_extra': None},
+        ]
+        lib = ImportUtilsSnapshot(snapshot)
+        self.assertEqual(['lib-a'], [r.name for r in lib.get_distribution('app').requirements])
+        self.assertEqual(3, len(lib.malformed_requirements))
+        graph = _graph_names(get_requirements_graph(lib))
+        self.assertSetEqual({'lib-a'}, graph['lib-b'])
+        self.assertSetEqual(set(), graph['click'])
+
+    def test5_snapshot_queries(self):
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        export_snapshot(util, self.snapshot_path)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            main(['--snapshot', self.snapshot_path, '--impact'])
+        # count, size, name, version and location
+        self.assertEqual([['3', 'app'], ['1', 'click'], ['1', 'lib-a'], ['1', 'lib-b']],
+                         [line.split()[0:3:2] for line in out.getvalue().splitlines()])
+        out = io.StringIO()
+        with redirect_stdout(out):
+            main(['--snapshot', self.snapshot_path, '--why', 'lib-b'])
+        self.assertEqual('app 1.0 -> lib-b 2.0\n', out.getvalue())
+        for argv in (['-y', 'app'], ['--watch'], ['--export-graph', 'env.bin']):
+            err = io.StringIO()
+            with redirect_stderr(err), self.assertRaises(SystemExit):
+                main(['--snapshot', self.snapshot_path] + argv)
+            self.assertIn('--snapshot cannot be combined with %s' % argv[0], err.getvalue())
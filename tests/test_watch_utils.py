@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from extra import importlib_utils
+from extra.extra_utils import get_requirements_graph, patch_requirements_graph
+from extra.graph_utils import find_dead_nodes, get_graph_leaves
+from extra.watch_utils import iter_watch_events
+from pip_autoremove import find_all_dead
+from test_utils.fixture_utils import make_site_packages, make_dist_info
+
+
+class TestWatchUtils(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site_packages = make_site_packages(os.path.join(self._tmp.name, 'site'), {
+            'app': {'requires': ['lib-a', 'shared']},
+            'tool': {'requires': ['shared']},
+            'lib-a': {'requires': ['lib-b']},
+            'lib-b': {},
+            'shared': {},
+        })
+        self.changes = list()
+        self.mtime = 1
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def __sleep(self, interval):
+        # applies the next change of the environment instead of sleeping
+        if self.changes:
+            self.changes.pop(0)()
+        self.mtime += 1
+        os.utime(self.site_packages, ns=(self.mtime, self.mtime))
+
+    def __uninstall(self, name):
+        def change():
+            shutil.rmtree(os.path.join(self.site_packages, '%s-1.0.dist-info' % name))
+        return change
+
+    def test1_find_dead_nodes(self):
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        graph = get_requirements_graph(util)
+        for dist in graph:
+            self.assertSetEqual(find_all_dead(graph, {dist}), find_dead_nodes(graph, [dist]))
+
+    def test2_watch_events(self):
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        self.changes = [
+            lambda: None,
+            self.__uninstall('app'),
+            lambda: make_dist_info(self.site_packages, 'new-tool'),
+            self.__uninstall('tool'),
+        ]
+        events = [[(key, sorted(d.name_general for d in getattr(event, key)))
+                   for key in ('new_leaves', 'orphaned', 'dead')]
+                  for event in iter_watch_events(util, ticks=5, sleep=self.__sleep)]
+        self.assertListEqual([
+            [('new_leaves', ['lib-a']), ('orphaned', ['lib-a']), ('dead', ['lib-b'])],
+            [('new_leaves', ['new-tool']), ('orphaned', []), ('dead', [])],
+            [('new_leaves', ['shared']), ('orphaned', ['shared']), ('dead', [])],
+        ], events)
+
+    def test3_watch_events_with_extras(self):
+        make_dist_info(self.site_packages, 'cli-app', requires=['shared; extra == "cli"'],
+                       extras=['cli'])
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        self.changes = [self.__uninstall('tool'), self.__uninstall('app')]
+        events = [[(key, sorted(d.name_general for d in getattr(event, key)))
+                   for key in ('new_leaves', 'orphaned', 'dead')]
+                  for event in iter_watch_events(util, include_extras=True, ticks=2,
+                                                 sleep=self.__sleep)]
+        # shared is kept by the extra of cli-app after removal of its last users
+        self.assertListEqual([
+            [('new_leaves', ['lib-a']), ('orphaned', ['lib-a']), ('dead', ['lib-b'])],
+        ], events)
+
+    def test4_patch_with_extras(self):
+        make_dist_info(self.site_packages, 'cli-app', requires=['shared; extra == "cli"'],
+                       extras=['cli'])
+        util = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+        graph = get_requirements_graph(util, True)
+        for name in ('tool', 'app'):
+            self.__uninstall(name)()
+            patch_requirements_graph(util, graph, util.refresh_known_distributions(), True)
+            util_full = importlib_utils.ImportUtilsFactory.create([self.site_packages])
+            self.assertEqual(
+                sorted(d.name_general for d in get_graph_leaves(graph)),
+                sorted(d.name_general for d in get_graph_leaves(
+                    get_requirements_graph(util_full, True))))